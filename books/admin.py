@@ -1,7 +1,39 @@
 from django.contrib import admin
-from .models import Author, Genre, Publisher, Book
+from .models import Author, Genre, Publisher, Book, BookCopy, DeletionJob
+from .utils import schedule_deletion
 
-admin.site.register(Author)
+
+class ScheduledDeletionAdmin(admin.ModelAdmin):
+    """Deletes in background (see `DeletionJob`) instead of inside the request."""
+
+    def delete_model(self, request, obj):
+        schedule_deletion(obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            schedule_deletion(obj)
+
+
+class DeletionJobAdmin(admin.ModelAdmin):
+    list_display = [
+        'object_repr', 'content_type', 'status', 'progress', 'total_books',
+        'deleted_books', 'deleted_reservations', 'deleted_favorites',
+        'deleted_notifications', 'created_at', 'finished_at'
+    ]
+    list_filter = ['status', 'content_type']
+    readonly_fields = [field.name for field in DeletionJob._meta.fields]
+
+
+class BookCopyAdmin(admin.ModelAdmin):
+    list_display = ['book', 'number', 'is_active', 'created_at']
+    list_filter = ['is_active']
+    search_fields = ['book__title', 'book__slug']
+    raw_id_fields = ['book']
+
+
+admin.site.register(Author, ScheduledDeletionAdmin)
 admin.site.register(Genre)
-admin.site.register(Publisher)
-admin.site.register(Book)
+admin.site.register(Publisher, ScheduledDeletionAdmin)
+admin.site.register(Book, ScheduledDeletionAdmin)
+admin.site.register(BookCopy, BookCopyAdmin)
+admin.site.register(DeletionJob, DeletionJobAdmin)
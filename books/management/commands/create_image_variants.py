@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from books.models import Author, Book
+from books.tasks import create_book_cover_variants, create_author_picture_variants
+
+
+class Command(BaseCommand):
+    help = 'Generate the resized copies of the existing book covers and author pictures.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sync', action='store_true',
+            help='Generate the copies in this process instead of enqueue Celery tasks.')
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Regenerate also the copies of images that already have them.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Amount of rows fetched per query.')
+
+    def handle(self, *args, **options):
+        targets = [
+            (Book, 'cover', 'cover_variants', create_book_cover_variants),
+            (Author, 'picture', 'picture_variants', create_author_picture_variants),
+        ]
+
+        for model, field, variants_field, task in targets:
+            queryset = model.objects.exclude(**{field: ''})
+            if not options['all']:
+                queryset = queryset.filter(**{variants_field: {}})
+
+            amount = 0
+            for pk in queryset.values_list('pk', flat=True).iterator(chunk_size=options['chunk_size']):
+                if options['sync']:
+                    task(pk)
+                else:
+                    task.delay(pk)
+                amount += 1
+
+            action = 'generated' if options['sync'] else 'enqueued'
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural.capitalize()}: {amount} {action}.'))
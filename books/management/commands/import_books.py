@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from books.utils import CatalogueImporter, read_catalogue_rows
+
+
+class Command(BaseCommand):
+    help = 'Import a catalogue of books from a CSV or JSONL file in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path of the CSV/JSONL file.')
+        parser.add_argument(
+            '--format', choices=['csv', 'jsonl'], default=None,
+            help='Format of the file, by default is taken from the extension.')
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Amount of rows inserted per query.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or (
+            'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size must be bigger than 0.')
+
+        importer = CatalogueImporter(batch_size=options['batch_size'])
+        try:
+            with open(path, newline='', encoding='utf-8') as stream:
+                result = importer.run(read_catalogue_rows(stream, file_format))
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for error in result['errors']:
+            self.stderr.write(f"Line {error['line']}: {error['error']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['created']} books created from {result['processed']} rows "
+            f"({result['failed']} failed) in {result['elapsed']}s, "
+            f"{result['rows_per_second']} rows/sec."
+        ))
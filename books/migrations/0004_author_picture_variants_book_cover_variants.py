@@ -0,0 +1,23 @@
+# Generated by Django 4.2.9 on 2026-10-19 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0003_alter_book_author'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='picture_variants',
+            field=models.JSONField(blank=True, default=dict, help_text='Paths of the resized copies of the picture, by size and format.'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='cover_variants',
+            field=models.JSONField(blank=True, default=dict, help_text='Paths of the resized copies of the cover, by size and format.'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.9 on 2026-10-19 07:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('books', '0004_author_picture_variants_book_cover_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Date of deletion'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Date of deletion'),
+        ),
+        migrations.AddField(
+            model_name='publisher',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Date of deletion'),
+        ),
+        migrations.CreateModel(
+            name='DeletionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('object_repr', models.CharField(max_length=250)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('total_books', models.PositiveIntegerField(default=0)),
+                ('deleted_books', models.PositiveIntegerField(default=0)),
+                ('deleted_reservations', models.PositiveIntegerField(default=0)),
+                ('deleted_favorites', models.PositiveIntegerField(default=0)),
+                ('deleted_notifications', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.9 on 2026-10-19 07:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_author_deleted_at_book_deleted_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='genre_ref',
+            field=models.ForeignKey(blank=True, editable=False, help_text='Integer key replacing `genre`.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='books.genre'),
+        ),
+    ]
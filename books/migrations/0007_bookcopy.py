@@ -0,0 +1,47 @@
+# Generated by Django 4.2.9 on 2026-10-19 09:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+CHUNK_SIZE = 1000
+
+
+def create_first_copies(apps, schema_editor):
+    """Every existing book had exactly one copy."""
+    Book = apps.get_model('books', 'Book')
+    BookCopy = apps.get_model('books', 'BookCopy')
+
+    book_ids = list(Book.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(book_ids), CHUNK_SIZE):
+        BookCopy.objects.bulk_create([
+            BookCopy(book_id=book_id, number=1)
+            for book_id in book_ids[start:start + CHUNK_SIZE]
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0006_book_genre_ref'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookCopy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField(default=1)),
+                ('is_active', models.BooleanField(default=True, help_text='Inactive copies (lost, damaged) are not reserved.')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='copies', to='books.book')),
+            ],
+            options={
+                'verbose_name': 'Book copy',
+                'verbose_name_plural': 'Book copies',
+                'ordering': ['book', 'number'],
+                'unique_together': {('book', 'number')},
+            },
+        ),
+        migrations.RunPython(create_first_copies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.9 on 2026-10-19 10:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0007_bookcopy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deletionjob',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, help_text='Failed runs, retried until `DELETION_MAX_ATTEMPTS`.'),
+        ),
+    ]
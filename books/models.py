@@ -1,7 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils.text import slugify
+from django.contrib.contenttypes.models import ContentType
 
-from core.models import DatesRecordsBaseModel
+from core.models import (
+    DatesRecordsBaseModel, DirtyFieldsMixin, TombstoneBaseModel, IntegerKeyDualWriteMixin
+)
 
 
 def create_authors_pic_path(instance, filename):
@@ -18,7 +21,7 @@ def create_books_cover_path(instance, filename):
     return f'books/{title}.{ext}'
 
 
-class Author(models.Model):
+class Author(DirtyFieldsMixin, TombstoneBaseModel):
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
     nationality = models.CharField(max_length=50, null=True, blank=True)
@@ -26,6 +29,9 @@ class Author(models.Model):
     death_date = models.DateField(null=True, blank=True)
     biography = models.TextField()
     picture = models.ImageField(upload_to=create_authors_pic_path)
+    picture_variants = models.JSONField(
+        default=dict, blank=True,
+        help_text="Paths of the resized copies of the picture, by size and format.")
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -35,18 +41,29 @@ class Author(models.Model):
         verbose_name = 'Author'
         verbose_name_plural = 'Authors'
 
+    def save(self, *args, **kwargs):
+        picture_changed = self.picture and (
+            self._state.adding or self.has_changed('picture'))
+
+        super().save(*args, **kwargs)
+
+        if picture_changed:
+            from .tasks import create_author_picture_variants
+            transaction.on_commit(
+                lambda: create_author_picture_variants.delay(self.pk))
+
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
 
-class Genre(models.Model):
+class Genre(DirtyFieldsMixin, models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
     slug = models.SlugField(max_length=160, blank=True, null=True, unique=True)
 
     def save(self, *args, **kwargs):
         if self.name:
-            if not self.slug or self.name != self._meta.model.objects.get(pk=self.pk).name:
+            if not self.slug or self.has_changed('name'):
                 self.slug = slugify(self.name)
 
         super().save(*args, **kwargs)
@@ -55,7 +72,7 @@ class Genre(models.Model):
         return self.name
 
 
-class Publisher(models.Model):
+class Publisher(TombstoneBaseModel):
     name = models.CharField(max_length=200, unique=True)
     country = models.CharField(max_length=100)
 
@@ -63,26 +80,112 @@ class Publisher(models.Model):
         return self.name
 
 
-class Book(DatesRecordsBaseModel):
+class Book(IntegerKeyDualWriteMixin, DirtyFieldsMixin, TombstoneBaseModel, DatesRecordsBaseModel):
     title = models.CharField(max_length=200)
     author = models.ForeignKey(
         Author, on_delete=models.CASCADE, null=True, blank=True)
     language = models.CharField(max_length=50)
     genre = models.ForeignKey(Genre, to_field='slug', on_delete=models.CASCADE)
+    genre_ref = models.ForeignKey(
+        Genre, null=True, blank=True, editable=False, related_name='+',
+        on_delete=models.CASCADE, help_text="Integer key replacing `genre`.")
     publisher = models.ForeignKey(
         Publisher, on_delete=models.CASCADE, null=True, blank=True)
     edition = models.PositiveIntegerField(default=1)
     amount_pages = models.PositiveIntegerField(default=1)
     cover = models.ImageField(upload_to=create_books_cover_path)
+    cover_variants = models.JSONField(
+        default=dict, blank=True,
+        help_text="Paths of the resized copies of the cover, by size and format.")
     publication_date = models.DateField()
     slug = models.SlugField(max_length=250, blank=True, null=True, unique=True)
 
+    integer_keys = {'genre_ref': 'genre'}
+
     def save(self, *args, **kwargs):
         if self.title:
-            if not self.slug or self.title != self._meta.model.objects.get(pk=self.pk).title:
+            if not self.slug or self.has_changed('title'):
                 self.slug = slugify(self.title)
+                # Deleted books keep their slug until removed in background.
+                if Book.all_objects.filter(
+                        slug=self.slug, deleted_at__isnull=False).exclude(pk=self.pk).exists():
+                    from .utils import unique_slugs
+                    self.slug = unique_slugs(Book, [self.title])[0]
+
+        cover_changed = self.cover and (
+            self._state.adding or self.has_changed('cover'))
+        adding = self._state.adding
 
         super().save(*args, **kwargs)
 
+        if adding:
+            BookCopy.objects.create(book=self, number=1)
+
+        if cover_changed:
+            from .tasks import create_book_cover_variants
+            transaction.on_commit(
+                lambda: create_book_cover_variants.delay(self.pk))
+
     def __str__(self):
         return self.title
+
+
+class BookCopy(models.Model):
+    """
+    A physical copy of a book. Every book starts with one, a book can be
+    reserved by as many users at the same time as active copies it has.
+    """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='copies')
+    number = models.PositiveIntegerField(default=1)
+    is_active = models.BooleanField(
+        default=True, help_text="Inactive copies (lost, damaged) are not reserved.")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['book', 'number']
+        ordering = ['book', 'number']
+        verbose_name = 'Book copy'
+        verbose_name_plural = 'Book copies'
+
+    def __str__(self):
+        return f'{self.book} #{self.number}'
+
+
+class DeletionJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveBigIntegerField()
+    object_repr = models.CharField(max_length=250)
+
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default='pending')
+    total_books = models.PositiveIntegerField(default=0)
+    deleted_books = models.PositiveIntegerField(default=0)
+    deleted_reservations = models.PositiveIntegerField(default=0)
+    deleted_favorites = models.PositiveIntegerField(default=0)
+    deleted_notifications = models.PositiveIntegerField(default=0)
+    error = models.TextField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(
+        default=0, help_text="Failed runs, retried until `DELETION_MAX_ATTEMPTS`.")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    @property
+    def progress(self):
+        if not self.total_books:
+            return 100 if self.status == 'completed' else 0
+        return round(self.deleted_books * 100 / self.total_books, 2)
+
+    def __str__(self):
+        return f'Deletion of {self.content_type.model} {self.object_repr}: {self.status}.'
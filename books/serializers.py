@@ -3,12 +3,13 @@ from datetime import date
 from rest_framework import serializers
 
 from .models import Author, Genre, Publisher, Book
+from .utils import image_thumbnail_url, image_variants_urls, revive_deleted
 
 
 class BaseAuthorSerializer (serializers.ModelSerializer):
     class Meta:
         model = Author
-        exclude = ['created_at', 'updated_at']
+        exclude = ['created_at', 'updated_at', 'picture_variants']
 
 
 class ListAuthorSerializer (BaseAuthorSerializer):
@@ -18,7 +19,9 @@ class ListAuthorSerializer (BaseAuthorSerializer):
             'id': instance.id,
             'name': f'{instance.first_name.capitalize()} {instance.last_name.capitalize()}',
             'biography': instance.biography,
-            'picture': instance.picture.url,
+            'picture': instance.picture.url if instance.picture else None,
+            'picture_thumbnail': image_thumbnail_url(instance.picture, instance.picture_variants),
+            'picture_variants': image_variants_urls(instance.picture_variants),
             'nationality': instance.nationality,
             'birth_date': instance.birth_date,
             'death_date': instance.death_date,
@@ -52,6 +55,18 @@ class CreateAuthorSerializer (BaseAuthorSerializer):
             )
         return super().validate(data)
 
+    def create(self, validated_data):
+        # A deleted author keeps its name until removed, it is brought back.
+        revived = revive_deleted(Author, Author.all_objects.filter(
+            first_name=validated_data['first_name'],
+            last_name=validated_data['last_name'],
+            deleted_at__isnull=False
+        ))
+        if revived:
+            return self.update(revived[0], validated_data)
+
+        return super().create(validated_data)
+
 
 class UpdateAuthorSerializer(BaseAuthorSerializer):
 
@@ -62,6 +77,16 @@ class UpdateAuthorSerializer(BaseAuthorSerializer):
 
         return super().to_internal_value(data_new)
 
+    def validate(self, data):
+        if Author.all_objects.filter(
+            first_name=data['first_name'], last_name=data['last_name'],
+            deleted_at__isnull=False
+        ).exists():
+            raise serializers.ValidationError(
+                {"first_name": "An author with this name is being deleted."}
+            )
+        return super().validate(data)
+
     def update(self, instance, validated_data):
         return super().update(instance, validated_data)
 
@@ -86,6 +111,15 @@ class BasePublisherSerializer(serializers.ModelSerializer):
         model = Publisher
         fields = '__all__'
 
+    def create(self, validated_data):
+        # A deleted publisher keeps its name until removed, it is brought back.
+        revived = revive_deleted(Publisher, Publisher.all_objects.filter(
+            name=validated_data['name'], deleted_at__isnull=False))
+        if revived:
+            return self.update(revived[0], validated_data)
+
+        return super().create(validated_data)
+
 
 class GenericPublisherSerializer(serializers.ModelSerializer):
 
@@ -93,6 +127,12 @@ class GenericPublisherSerializer(serializers.ModelSerializer):
         model = Publisher
         exclude = ['id']
 
+    def validate_name(self, value):
+        if self.instance and Publisher.all_objects.filter(
+                name=value, deleted_at__isnull=False).exists():
+            raise serializers.ValidationError('A publisher with this name is being deleted.')
+        return value
+
 
 class BaseBookSerializer(serializers.ModelSerializer):
 
@@ -150,6 +190,10 @@ class ListBookSerializer(BaseBookSerializer):
         base_representation['author'] = author_representation
         base_representation['genre'] = genre_representation
         base_representation['publisher'] = publisher_representation
+        base_representation['cover_thumbnail'] = image_thumbnail_url(
+            instance.cover, instance.cover_variants)
+        base_representation['cover_variants'] = image_variants_urls(
+            instance.cover_variants)
 
         return base_representation
 
@@ -182,3 +226,28 @@ class UpdateBookSerializer(CreateBookSerializer):
         instance.save()
 
         return instance
+
+
+class ImportBooksSerializer(serializers.Serializer):
+    file = serializers.FileField(required=True)
+    format = serializers.ChoiceField(
+        choices=['csv', 'jsonl'], required=False, default=None, allow_null=True)
+    batch_size = serializers.IntegerField(
+        required=False, default=500, min_value=1, max_value=5000)
+
+    def validate(self, attrs):
+        if not attrs.get('format'):
+            name = attrs['file'].name or ''
+            attrs['format'] = 'jsonl' if name.endswith(
+                ('.jsonl', '.ndjson')) else 'csv'
+
+        return attrs
+
+
+class ImportBooksResultSerializer(serializers.Serializer):
+    processed = serializers.IntegerField()
+    created = serializers.IntegerField()
+    failed = serializers.IntegerField()
+    errors = serializers.ListField(child=serializers.DictField())
+    elapsed = serializers.FloatField()
+    rows_per_second = serializers.FloatField()
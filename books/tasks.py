@@ -0,0 +1,91 @@
+from celery import shared_task
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Author, Book, DeletionJob
+from .utils import (
+    build_image_variants, drain_deletion_chunks,
+    DELETION_CHUNK_SIZE, DELETION_CHUNKS_PER_RUN, DELETION_MAX_ATTEMPTS
+)
+
+
+@shared_task
+def create_book_cover_variants(book_id):
+    try:
+        book = Book.objects.only('cover', 'cover_variants').get(pk=book_id)
+        if not book.cover:
+            return 'Book without cover. Task completed successfully.'
+
+        # Variants are content addressed and may be shared with other books,
+        # the previous ones are not deleted.
+        variants = build_image_variants(book.cover)
+        # update() does not re-trigger the save hook that enqueues this task.
+        Book.objects.filter(pk=book_id).update(cover_variants=variants)
+
+        return 'Task completed successfully.'
+    except Exception as e:
+        return f"Task Fail : {str(e)}"
+
+
+@shared_task
+def create_author_picture_variants(author_id):
+    try:
+        author = Author.objects.only('picture', 'picture_variants').get(pk=author_id)
+        if not author.picture:
+            return 'Author without picture. Task completed successfully.'
+
+        variants = build_image_variants(author.picture)
+        Author.objects.filter(pk=author_id).update(picture_variants=variants)
+
+        return 'Task completed successfully.'
+    except Exception as e:
+        return f"Task Fail : {str(e)}"
+
+
+@shared_task
+def drain_deletion_job(job_id):
+    """
+    Delete a bounded amount of chunks of the job and enqueue itself again
+    while rows are left, so a big subtree never holds a worker (or locks) for long.
+    """
+    job = DeletionJob.objects.select_related('content_type').filter(pk=job_id).first()
+    if not job or job.status in ['completed', 'failed']:
+        return 'No pending job. Task completed successfully.'
+
+    DeletionJob.objects.filter(pk=job_id).update(status='running')
+    try:
+        finished = drain_deletion_chunks(
+            job, chunk_size=DELETION_CHUNK_SIZE, max_chunks=DELETION_CHUNKS_PER_RUN)
+    except Exception as e:
+        DeletionJob.objects.filter(pk=job_id).update(
+            status='failed', error=str(e), attempts=F('attempts') + 1)
+        return f"Task Fail : {str(e)}"
+
+    if finished:
+        DeletionJob.objects.filter(pk=job_id).update(
+            status='completed', finished_at=timezone.now())
+        return 'Task completed successfully.'
+
+    drain_deletion_job.delay(job_id)
+    return 'Chunks deleted, job enqueued again.'
+
+
+@shared_task
+def retry_failed_deletion_jobs():
+    """
+    Enqueue again the failed jobs, the chunks already deleted are not redone.
+    After `DELETION_MAX_ATTEMPTS` failures a job is left for an admin.
+    """
+    try:
+        jobs = list(DeletionJob.objects.filter(
+            status='failed', attempts__lt=DELETION_MAX_ATTEMPTS
+        ).values_list('pk', flat=True))
+        DeletionJob.objects.filter(pk__in=jobs).update(status='pending')
+
+        for job_id in jobs:
+            drain_deletion_job.delay(job_id)
+
+        return f'Task completed successfully. {len(jobs)} deletion jobs retried.'
+    except Exception as e:
+        return f"Task Fail : {str(e)}"
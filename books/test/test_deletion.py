@@ -0,0 +1,165 @@
+import datetime
+from unittest import mock
+
+from django.urls import reverse
+from rest_framework import status
+
+from core.test.test_setup import AdminUserAPITest
+from management.models import Favorite, Reservation, Strike, Notification
+from management.test.factories import ReservationFactory
+from management.utils import create_notification, create_strike
+
+from ..models import Author, Publisher, Book, DeletionJob
+from ..tasks import drain_deletion_job, retry_failed_deletion_jobs
+from ..utils import CatalogueImporter, schedule_deletion, drain_deletion_chunks
+
+
+class ScheduledDeletionTest(AdminUserAPITest, ReservationFactory):
+    def create_subtree(self, amount_books=3):
+        author = self.author()
+        publisher = self.publisher()
+        books = []
+        for _ in range(amount_books):
+            book = self.book()
+            book.author = author
+            book.publisher = publisher
+            book.save()
+            books.append(book)
+
+            reservation = Reservation.objects.create(
+                user=self.user, book=book,
+                start_date=datetime.date.today(),
+                end_date=datetime.date.today() + datetime.timedelta(days=3),
+            )
+            strike = create_strike(res=reservation, reason='Late.')
+            create_notification(user=self.user, title='Strike', obj=strike)
+            create_notification(user=self.user, title='Available', obj=reservation)
+            Favorite.objects.create(user=self.user, book=book)
+
+        return author, publisher, books
+
+    def test_delete_author_tombstones_subtree(self):
+        author, _, books = self.create_subtree()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.delete(
+                reverse('author-detail', kwargs={'pk': author.id}))
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(Author.objects.filter(pk=author.pk).exists())
+        self.assertTrue(Author.all_objects.filter(pk=author.pk).exists())
+        self.assertFalse(Book.objects.filter(author=author).exists())
+        self.assertEqual(Reservation.objects.count(), 3)
+
+        job = DeletionJob.objects.get()
+        self.assertEqual(job.total_books, 3)
+        self.assertEqual(job.status, 'pending')
+
+    def test_book_list_hides_deleted(self):
+        _, publisher, books = self.create_subtree(amount_books=2)
+
+        schedule_deletion(publisher)
+
+        response = self.client.get(reverse('book-list'))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_drain_deletes_in_chunks(self):
+        author, _, _ = self.create_subtree()
+        job = schedule_deletion(author)
+
+        finished = drain_deletion_chunks(job, chunk_size=2, max_chunks=1)
+        self.assertFalse(finished)
+        job.refresh_from_db()
+        self.assertEqual(job.deleted_reservations, 2)
+        self.assertEqual(Reservation.objects.count(), 1)
+
+        finished = drain_deletion_chunks(job, chunk_size=2)
+        self.assertTrue(finished)
+
+        job.refresh_from_db()
+        self.assertEqual(job.deleted_reservations, 3)
+        self.assertEqual(job.deleted_favorites, 3)
+        self.assertEqual(job.deleted_books, 3)
+        self.assertEqual(job.deleted_notifications, 6)
+        self.assertFalse(Author.all_objects.filter(pk=author.pk).exists())
+        self.assertFalse(Book.all_objects.exists())
+        self.assertFalse(Strike.objects.exists())
+        self.assertFalse(Notification.objects.exists())
+
+    def test_drain_single_book(self):
+        _, publisher, books = self.create_subtree(amount_books=2)
+        job = schedule_deletion(books[0])
+
+        self.assertTrue(drain_deletion_chunks(job))
+
+        self.assertFalse(Book.all_objects.filter(pk=books[0].pk).exists())
+        self.assertTrue(Book.objects.filter(pk=books[1].pk).exists())
+        self.assertTrue(Publisher.objects.filter(pk=publisher.pk).exists())
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_create_deleted_publisher_revives_it(self):
+        _, publisher, books = self.create_subtree(amount_books=2)
+        job = schedule_deletion(publisher)
+
+        response = self.client.post(
+            reverse('publisher-list'), {'name': publisher.name, 'country': 'AR'})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Publisher.objects.filter(pk=publisher.pk).exists())
+        self.assertEqual(Publisher.all_objects.filter(name=publisher.name).count(), 1)
+
+        # The books deleted with it are still removed, the publisher is kept.
+        book = self.book()
+        book.publisher = publisher
+        book.save()
+        self.assertTrue(drain_deletion_chunks(job))
+        self.assertTrue(Publisher.objects.filter(pk=publisher.pk).exists())
+        self.assertEqual(list(Book.all_objects.filter(publisher=publisher)), [book])
+
+    def test_import_deleted_author_revives_it(self):
+        author, _, _ = self.create_subtree(amount_books=1)
+        # Names are stored in lower case, as the API does.
+        Author.objects.filter(pk=author.pk).update(
+            first_name=author.first_name.lower(), last_name=author.last_name.lower())
+        schedule_deletion(author)
+
+        result = CatalogueImporter().run([{
+            'title': 'Revived', 'language': 'en', 'genre': 'Drama',
+            'publication_date': '2001-01-01',
+            'author_first_name': author.first_name, 'author_last_name': author.last_name,
+        }])
+
+        self.assertEqual(result['created'], 1)
+        self.assertEqual(Book.objects.get(title='Revived').author_id, author.pk)
+        self.assertTrue(Author.objects.filter(pk=author.pk).exists())
+
+    def test_book_title_of_deleted_book(self):
+        _, _, books = self.create_subtree(amount_books=1)
+        schedule_deletion(books[0])
+
+        book = self.book()
+        book.title = books[0].title
+        book.save()
+
+        self.assertNotEqual(book.slug, books[0].slug)
+        self.assertTrue(book.slug.startswith(books[0].slug))
+
+    def test_retry_failed_jobs(self):
+        author, _, _ = self.create_subtree(amount_books=1)
+        job = schedule_deletion(author)
+        DeletionJob.objects.filter(pk=job.pk).update(status='failed', attempts=1)
+        exhausted = DeletionJob.objects.create(
+            content_type=job.content_type, object_id=0, object_repr='Gone',
+            status='failed', attempts=5)
+
+        with mock.patch.object(drain_deletion_job, 'delay') as delay:
+            self.assertIn('1 deletion jobs retried', retry_failed_deletion_jobs())
+        delay.assert_called_once_with(job.pk)
+
+        drain_deletion_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+        self.assertFalse(Author.all_objects.filter(pk=author.pk).exists())
+        exhausted.refresh_from_db()
+        self.assertEqual(exhausted.status, 'failed')
@@ -0,0 +1,100 @@
+import io
+import shutil
+import tempfile
+
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from rest_framework import status
+from PIL import Image
+
+from .factories import BookFactory
+from ..models import Book
+from ..tasks import create_book_cover_variants, create_author_picture_variants
+from ..utils import IMAGE_VARIANT_SIZES
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ImageVariantsTaskTest(TestCase, BookFactory):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def create_book(self):
+        return Book.objects.create(
+            title=self.title(), language=self.language(), genre=self.genre(),
+            publication_date=self.publication_date(), cover=self.cover()
+        )
+
+    def test_cover_variants_created(self):
+        book = self.create_book()
+
+        create_book_cover_variants(book.pk)
+
+        book.refresh_from_db()
+        self.assertEqual(set(book.cover_variants.keys()),
+                         {str(size) for size in IMAGE_VARIANT_SIZES})
+        for size in IMAGE_VARIANT_SIZES:
+            for extension in ['webp', 'jpeg']:
+                path = book.cover_variants[str(size)][extension]
+                with default_storage.open(path) as f:
+                    image = Image.open(f)
+                    self.assertLessEqual(max(image.size), size)
+                    self.assertEqual(image.format, extension.upper())
+
+    def test_picture_variants_created(self):
+        author = self.author()
+
+        create_author_picture_variants(author.pk)
+
+        author.refresh_from_db()
+        self.assertIn('96', author.picture_variants)
+
+    def test_save_enqueues_variants_only_when_cover_changes(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            book = self.create_book()
+        self.assertEqual(len(callbacks), 1)
+
+        book = Book.objects.get(pk=book.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            book.edition = 3
+            book.save()
+        self.assertEqual(len(callbacks), 0)
+
+    def test_backfill_command(self):
+        book = self.create_book()
+        out = io.StringIO()
+
+        call_command('create_image_variants', '--sync', stdout=out)
+
+        book.refresh_from_db()
+        self.assertNotEqual(book.cover_variants, {})
+        self.assertIn('Books: 1 generated.', out.getvalue())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class AnyListBooksThumbnailAPITest(APITestCase, BookFactory):
+    def test_list_books_thumbnail_fallback_and_variant(self):
+        book = Book.objects.create(
+            title=self.title(), language=self.language(), genre=self.genre(),
+            publication_date=self.publication_date(), cover=self.cover()
+        )
+
+        url = reverse('book-list')
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['cover_thumbnail'], book.cover.url)
+
+        create_book_cover_variants(book.pk)
+        response = self.client.get(url)
+
+        self.assertTrue(response.data['results'][0]['cover_thumbnail'].endswith('.webp'))
+        self.assertNotEqual(response.data['results'][0]['cover_thumbnail'], book.cover.url)
+        self.assertIn('640', response.data['results'][0]['cover_variants'])
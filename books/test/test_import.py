@@ -0,0 +1,167 @@
+import io
+import json
+import tempfile
+
+from django.urls import reverse
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework import status
+
+from core.test.test_setup import AdminUserAPITest, RegularUserAPITest
+
+from .factories import BookFactory
+from ..models import Author, Genre, Publisher, Book, BookCopy
+from ..utils import CatalogueImporter, unique_slugs
+
+
+CSV_HEADER = 'title,language,genre,publication_date,author_first_name,author_last_name,author_birth_date,publisher,publisher_country,amount_pages\n'
+
+
+class CatalogueImporterTest(AdminUserAPITest, BookFactory):
+    def test_import_creates_missing_relations(self):
+        rows = [
+            {'title': 'Dune', 'language': 'en', 'genre': 'Science Fiction',
+             'publication_date': '1965-08-01', 'author_first_name': 'Frank',
+             'author_last_name': 'Herbert', 'author_birth_date': '1920-10-08',
+             'publisher': 'Chilton', 'publisher_country': 'USA'},
+            {'title': 'Dune Messiah', 'language': 'en', 'genre': 'Science Fiction',
+             'publication_date': '1969-10-15', 'author_first_name': 'Frank',
+             'author_last_name': 'Herbert', 'publisher': 'Chilton'},
+        ]
+
+        result = CatalogueImporter(batch_size=10).run(rows)
+
+        self.assertEqual(result['created'], 2)
+        self.assertEqual(result['failed'], 0)
+        self.assertEqual(Author.objects.filter(
+            first_name='frank', last_name='herbert').count(), 1)
+        self.assertEqual(Genre.objects.get(
+            name='Science Fiction').slug, 'science-fiction')
+        self.assertEqual(Publisher.objects.filter(name='Chilton').count(), 1)
+        self.assertEqual(Book.objects.get(slug='dune-messiah').author.last_name, 'herbert')
+
+    def test_import_uses_existing_relations(self):
+        genre = self.genre()
+        publisher = self.publisher()
+        rows = [{'title': 'Existing', 'language': 'es', 'genre': genre.name,
+                 'publication_date': '2000-01-01', 'publisher': publisher.name}]
+
+        result = CatalogueImporter().run(rows)
+
+        self.assertEqual(result['created'], 1)
+        self.assertEqual(Genre.objects.count(), 1)
+        self.assertEqual(Publisher.objects.count(), 1)
+        self.assertEqual(Book.objects.get(slug='existing').genre, genre)
+
+    def test_import_slug_collisions(self):
+        Genre.objects.create(name='Drama')
+        Book.objects.bulk_create([
+            Book(title='Same', language='en', genre_id='drama',
+                 publication_date='2000-01-01', slug='same'),
+        ])
+        rows = [{'title': 'Same', 'language': 'en', 'genre': 'Drama',
+                 'publication_date': '2001-01-01'} for _ in range(3)]
+
+        result = CatalogueImporter().run(rows)
+
+        self.assertEqual(result['created'], 3)
+        self.assertEqual(
+            set(Book.objects.values_list('slug', flat=True)),
+            {'same', 'same-2', 'same-3', 'same-4'}
+        )
+
+    def test_unique_slugs_one_query(self):
+        with self.assertNumQueries(1):
+            slugs = unique_slugs(Book, ['A title', 'A title', 'Other'])
+
+        self.assertEqual(slugs, ['a-title', 'a-title-2', 'other'])
+
+    def test_import_batches_query_count(self):
+        Genre.objects.create(name='Drama')
+        rows = [{'title': f'Book {i}', 'language': 'en', 'genre': 'Drama',
+                 'publication_date': '2001-01-01'} for i in range(20)]
+
+        # Per batch: savepoint, genres, slugs, insert, book ids, copies and
+        # release savepoint.
+        with self.assertNumQueries(14):
+            result = CatalogueImporter(batch_size=10).run(rows)
+
+        self.assertEqual(result['created'], 20)
+        self.assertEqual(BookCopy.objects.count(), 20)
+
+    def test_import_invalid_rows_reported(self):
+        rows = [
+            {'title': '', 'language': 'en', 'genre': 'Drama', 'publication_date': '2001-01-01'},
+            {'title': 'Future', 'language': 'en', 'genre': 'Drama', 'publication_date': '2999-01-01'},
+            {'title': 'No Author', 'language': 'en', 'genre': 'Drama', 'publication_date': '2001-01-01',
+             'author_first_name': 'Nobody', 'author_last_name': 'Known'},
+        ]
+
+        result = CatalogueImporter().run(rows)
+
+        self.assertEqual(result['created'], 0)
+        self.assertEqual([error['line'] for error in result['errors']], [1, 2, 3])
+
+    def test_import_command(self):
+        content = CSV_HEADER + \
+            'Ficciones,es,Fiction,1944-01-01,Jorge Luis,Borges,1899-08-24,Sur,Argentina,200\n'
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write(content)
+
+        out = io.StringIO()
+        call_command('import_books', f.name, '--batch-size', '2', stdout=out)
+
+        self.assertIn('rows/sec', out.getvalue())
+        self.assertTrue(Book.objects.filter(slug='ficciones').exists())
+
+
+class AdminImportBooksAPITest(AdminUserAPITest):
+    def test_import_books_jsonl(self):
+        lines = [
+            {'title': 'Rayuela', 'language': 'es', 'genre': 'Novel',
+             'publication_date': '1963-06-28'},
+            {'title': 'Rayuela', 'language': 'es', 'genre': 'Novel',
+             'publication_date': '1963-06-28', 'edition': 2},
+        ]
+        file = SimpleUploadedFile(
+            'catalogue.jsonl',
+            '\n'.join(json.dumps(line) for line in lines).encode(),
+            content_type='application/octet-stream'
+        )
+
+        url = reverse('book-import')
+        response = self.client.post(url, {'file': file})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+        self.assertIn('rows_per_second', response.data)
+        self.assertTrue(Book.objects.filter(slug='rayuela-2').exists())
+
+    def test_import_books_csv(self):
+        file = SimpleUploadedFile(
+            'catalogue.csv',
+            (CSV_HEADER + 'Facundo,es,Essay,1845-01-01,,,,,,\n').encode(),
+            content_type='text/csv'
+        )
+
+        url = reverse('book-import')
+        response = self.client.post(url, {'file': file})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 1)
+
+    def test_import_books_fail_without_file(self):
+        url = reverse('book-import')
+        response = self.client.post(url, {})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('file', response.data.keys())
+
+
+class UserImportBooksAPITest(RegularUserAPITest):
+    def test_import_books_fail_not_admin(self):
+        url = reverse('book-import')
+        response = self.client.post(url, {})
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,473 @@
+import csv
+import json
+import os
+import time
+from datetime import date
+from io import BytesIO
+from itertools import islice
+
+from PIL import Image, ImageOps
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q, F
+from django.utils import timezone
+from django.utils.text import slugify
+
+from management.models import Favorite, Reservation, Strike, Notification
+from .models import Author, Genre, Publisher, Book, BookCopy, DeletionJob
+
+
+def read_catalogue_rows(stream, file_format='csv'):
+    """
+    Yield one dict per row of a CSV (with header) or JSONL text stream,
+    without loading the whole file in memory.
+    """
+    if file_format == 'csv':
+        for row in csv.DictReader(stream):
+            yield row
+    elif file_format == 'jsonl':
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    else:
+        raise ValueError(f'Unsupported format: {file_format}.')
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def unique_slugs(model, names, slug_field='slug'):
+    """
+    Compute a unique slug for every name with a single query: existing slugs
+    sharing the base (`base` or `base-N`) are fetched at once and the names
+    received are given the next free suffix, also among themselves.
+    """
+    bases = [slugify(name) for name in names]
+    wanted = set(bases)
+    if not wanted:
+        return []
+
+    lookup = Q()
+    for base in wanted:
+        lookup |= Q(**{slug_field: base}) | Q(**{f'{slug_field}__startswith': f'{base}-'})
+
+    # The base manager also sees the rows marked as deleted, that keep their slug.
+    taken = set(model._base_manager.filter(lookup).values_list(slug_field, flat=True))
+
+    slugs = []
+    for base in bases:
+        slug, counter = base, 2
+        while slug in taken:
+            slug = f'{base}-{counter}'
+            counter += 1
+        taken.add(slug)
+        slugs.append(slug)
+
+    return slugs
+
+
+class CatalogueImporter:
+    """
+    Bulk importer of books.
+
+    Rows are processed in batches of `batch_size`: authors, genres and
+    publishers of the batch are resolved with one query each (the missing
+    ones are created with `bulk_create`), book slugs are computed with one
+    query and the books are inserted with `bulk_create`, with their first
+    copy.
+
+    Row keys:
+        - `title`, `language`, `genre`, `publication_date` (YYYY-mm-dd): required.
+        - `author_first_name`, `author_last_name`, `author_birth_date`: optional,
+          the birth date is only required when the author must be created.
+        - `publisher`, `publisher_country`, `edition`, `amount_pages`, `cover`: optional.
+    """
+
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+        self.created = 0
+        self.processed = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        if not self.elapsed:
+            return 0.0
+        return round(self.processed / self.elapsed, 2)
+
+    def summary(self):
+        return {
+            'processed': self.processed,
+            'created': self.created,
+            'failed': len(self.errors),
+            'errors': self.errors,
+            'elapsed': round(self.elapsed, 3),
+            'rows_per_second': self.rows_per_second,
+        }
+
+    def run(self, rows):
+        start = time.perf_counter()
+        line = 0
+        for batch in chunked(rows, self.batch_size):
+            numbered = list(enumerate(batch, start=line + 1))
+            line += len(batch)
+            self.import_batch(numbered)
+            self.processed += len(batch)
+        self.elapsed = time.perf_counter() - start
+
+        return self.summary()
+
+    def clean_row(self, row):
+        row = {key: (value.strip() if isinstance(value, str) else value)
+               for key, value in row.items() if key}
+
+        for field in ['title', 'language', 'genre', 'publication_date']:
+            if not row.get(field):
+                raise ValueError(f'{field}: This field is required.')
+
+        row['publication_date'] = date.fromisoformat(
+            str(row['publication_date']))
+        if row['publication_date'] > date.today():
+            raise ValueError(
+                'publication_date: Publication date must be on or before today.')
+
+        for field in ['edition', 'amount_pages']:
+            value = row.get(field)
+            row[field] = int(value) if value not in (None, '') else 1
+            if row[field] <= 0:
+                raise ValueError(f'{field}: Must be a positive integer.')
+
+        if row.get('author_first_name') or row.get('author_last_name'):
+            if not (row.get('author_first_name') and row.get('author_last_name')):
+                raise ValueError(
+                    'author: author_first_name and author_last_name are required together.')
+            row['author_key'] = (row['author_first_name'].lower(),
+                                 row['author_last_name'].lower())
+        else:
+            row['author_key'] = None
+
+        if row.get('author_birth_date'):
+            row['author_birth_date'] = date.fromisoformat(
+                str(row['author_birth_date']))
+
+        return row
+
+    def import_batch(self, numbered_rows):
+        rows = []
+        for line, row in numbered_rows:
+            try:
+                rows.append((line, self.clean_row(row)))
+            except (ValueError, TypeError, AttributeError) as e:
+                self.errors.append({'line': line, 'error': str(e)})
+
+        if not rows:
+            return
+
+        with transaction.atomic():
+            authors = self.resolve_authors(rows)
+            genres = self.resolve_genres(rows)
+            publishers = self.resolve_publishers(rows)
+
+            books = []
+            for line, row in rows:
+                author = None
+                if row['author_key']:
+                    author = authors.get(row['author_key'])
+                    if author is None:
+                        self.errors.append({
+                            'line': line,
+                            'error': 'author: Not found and author_birth_date not provided.'
+                        })
+                        continue
+
+                books.append(Book(
+                    title=row['title'],
+                    author=author,
+                    language=row['language'],
+                    genre=genres[row['genre']],
+                    genre_ref=genres[row['genre']],
+                    publisher=publishers.get(row.get('publisher')),
+                    edition=row['edition'],
+                    amount_pages=row['amount_pages'],
+                    cover=row.get('cover') or '',
+                    publication_date=row['publication_date'],
+                ))
+
+            for book, slug in zip(books, unique_slugs(Book, [book.title for book in books])):
+                book.slug = slug
+
+            Book.objects.bulk_create(books, batch_size=self.batch_size)
+            # Not every backend returns the pks on bulk_create.
+            book_ids = Book.objects.filter(
+                slug__in=[book.slug for book in books]).values_list('pk', flat=True)
+            BookCopy.objects.bulk_create(
+                [BookCopy(book_id=book_id, number=1) for book_id in book_ids],
+                batch_size=self.batch_size)
+            self.created += len(books)
+
+    def resolve_authors(self, rows):
+        keys = {row['author_key'] for _, row in rows if row['author_key']}
+        if not keys:
+            return {}
+
+        lookup = Q()
+        for first_name, last_name in keys:
+            lookup |= Q(first_name=first_name, last_name=last_name)
+
+        authors = {
+            (author.first_name, author.last_name): author
+            for author in revive_deleted(Author, Author.all_objects.filter(lookup))
+        }
+
+        missing = {}
+        for _, row in rows:
+            key = row['author_key']
+            if key and key not in authors and key not in missing and row.get('author_birth_date'):
+                missing[key] = Author(
+                    first_name=key[0],
+                    last_name=key[1],
+                    nationality=row.get('author_nationality') or None,
+                    birth_date=row['author_birth_date'],
+                    biography=row.get('author_biography') or '',
+                )
+
+        if missing:
+            Author.objects.bulk_create(missing.values())
+            # Not every backend returns the pks on bulk_create.
+            lookup = Q()
+            for first_name, last_name in missing:
+                lookup |= Q(first_name=first_name, last_name=last_name)
+            authors.update({
+                (author.first_name, author.last_name): author
+                for author in Author.objects.filter(lookup)
+            })
+
+        return authors
+
+    def resolve_genres(self, rows):
+        names = {row['genre'] for _, row in rows}
+        genres = {genre.name: genre for genre in Genre.objects.filter(name__in=names)}
+
+        missing = [name for name in names if name not in genres]
+        if missing:
+            Genre.objects.bulk_create([
+                Genre(name=name, slug=slug)
+                for name, slug in zip(missing, unique_slugs(Genre, missing))
+            ])
+            genres.update({
+                genre.name: genre for genre in Genre.objects.filter(name__in=missing)
+            })
+
+        return genres
+
+    def resolve_publishers(self, rows):
+        countries = {}
+        for _, row in rows:
+            if row.get('publisher'):
+                countries.setdefault(row['publisher'], row.get('publisher_country') or '')
+        if not countries:
+            return {}
+
+        publishers = {
+            publisher.name: publisher
+            for publisher in revive_deleted(
+                Publisher, Publisher.all_objects.filter(name__in=countries.keys()))
+        }
+
+        missing = [name for name in countries if name not in publishers]
+        if missing:
+            Publisher.objects.bulk_create([
+                Publisher(name=name, country=countries[name]) for name in missing
+            ])
+            publishers.update({
+                publisher.name: publisher
+                for publisher in Publisher.objects.filter(name__in=missing)
+            })
+
+        return publishers
+
+
+IMAGE_VARIANT_SIZES = (96, 256, 640)
+IMAGE_VARIANT_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+THUMBNAIL_SIZE = 256
+
+
+def build_image_variants(field_file, sizes=IMAGE_VARIANT_SIZES):
+    """
+    Create resized and re-encoded copies (WebP + JPEG) of an uploaded image and
+    return their storage paths as `{"<size>": {"webp": path, "jpeg": path}}`.
+    Images are never upscaled.
+    """
+    # Copies are stored under `<upload_to root>/variants/`.
+    directory = field_file.name.split('/')[0]
+    stem = os.path.splitext(os.path.basename(field_file.name))[0]
+
+    with field_file.open('rb') as f:
+        original = ImageOps.exif_transpose(Image.open(f))
+        original.load()
+
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'A' in original.getbands() else 'RGB')
+
+    variants = {}
+    for size in sizes:
+        image = original.copy()
+        image.thumbnail((size, size), Image.LANCZOS)
+
+        variants[str(size)] = {}
+        for extension, image_format in IMAGE_VARIANT_FORMATS.items():
+            stream = BytesIO()
+            if image_format == 'JPEG':
+                image.convert('RGB').save(stream, format=image_format, quality=82,
+                                          optimize=True, progressive=True)
+            else:
+                image.save(stream, format=image_format, quality=80, method=4)
+
+            path = os.path.join(directory, 'variants', f'{stem}-{size}.{extension}')
+            variants[str(size)][extension] = default_storage.save(
+                path, ContentFile(stream.getvalue()))
+
+    return variants
+
+
+def image_variants_urls(variants):
+    return {
+        size: {extension: default_storage.url(path) for extension, path in formats.items()}
+        for size, formats in (variants or {}).items()
+    }
+
+
+def image_thumbnail_url(field_file, variants, size=THUMBNAIL_SIZE, extension='webp'):
+    """
+    URL of the variant of `size`, falling back to the original while the
+    variants are not generated yet.
+    """
+    try:
+        return default_storage.url(variants[str(size)][extension])
+    except (KeyError, TypeError):
+        return field_file.url if field_file else None
+
+
+DELETION_CHUNK_SIZE = 500
+DELETION_CHUNKS_PER_RUN = 20
+DELETION_MAX_ATTEMPTS = 5
+
+
+def schedule_deletion(instance):
+    """
+    Mark an Author, Publisher or Book (and the books of the first two) as
+    deleted, hiding them at once, and enqueue the task that removes the
+    rows and their dependents in chunks.
+    """
+    model = type(instance)
+    now = timezone.now()
+
+    with transaction.atomic():
+        model.all_objects.filter(pk=instance.pk).update(deleted_at=now)
+
+        if model is Book:
+            total_books = 1
+        else:
+            books = Book.all_objects.filter(**{model.__name__.lower(): instance.pk})
+            total_books = books.update(deleted_at=now)
+
+        job = DeletionJob.objects.create(
+            content_type=ContentType.objects.get_for_model(model),
+            object_id=instance.pk,
+            object_repr=str(instance)[:250],
+            total_books=total_books,
+        )
+
+        from .tasks import drain_deletion_job
+        transaction.on_commit(lambda: drain_deletion_job.delay(job.pk))
+
+    instance.deleted_at = now
+    return job
+
+
+def revive_deleted(model, rows):
+    """
+    Bring back the rows (of an Author or Publisher queryset through
+    `all_objects`) that are marked as deleted: they keep their unique name
+    until removed, so the name can only be created again by reviving them.
+    Their pending `DeletionJob` still removes the books deleted with them.
+    Returns the rows.
+    """
+    rows = list(rows)
+    deleted = [row.pk for row in rows if row.deleted_at]
+    if deleted:
+        model.all_objects.filter(pk__in=deleted).update(deleted_at=None)
+        for row in rows:
+            row.deleted_at = None
+    return rows
+
+
+def _delete_notifications_of(model, ids):
+    return Notification.objects.filter(
+        content_type=ContentType.objects.get_for_model(model),
+        object_id__in=ids
+    ).delete()[0]
+
+
+def drain_deletion_chunks(job, chunk_size=DELETION_CHUNK_SIZE, max_chunks=None):
+    """
+    Delete up to `max_chunks` chunks (all when None) of the subtree of the job,
+    each one of `chunk_size` rows in its own short transaction: reservations
+    (with their strikes and notifications), favorites, books and finally the
+    deleted object. Returns True when nothing is left.
+    """
+    model = job.content_type.model_class()
+    # Only the rows still marked as deleted, an author or publisher may have
+    # been revived (see `revive_deleted`) and given new books meanwhile.
+    if model is Book:
+        books = Book.all_objects.filter(pk=job.object_id, deleted_at__isnull=False)
+    else:
+        books = Book.all_objects.filter(
+            **{model.__name__.lower(): job.object_id}, deleted_at__isnull=False)
+    book_slugs = books.values('slug')
+
+    steps = [
+        (Reservation, Reservation.objects.filter(book__in=book_slugs), 'deleted_reservations'),
+        (Favorite, Favorite.objects.filter(book__in=book_slugs), 'deleted_favorites'),
+        (Book, books, 'deleted_books'),
+    ]
+
+    chunks = 0
+    for step_model, queryset, counter in steps:
+        while max_chunks is None or chunks < max_chunks:
+            ids = list(queryset.values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                break
+
+            with transaction.atomic():
+                notifications = 0
+                if step_model is Reservation:
+                    strikes = list(Strike.objects.filter(
+                        reservation__in=ids).values_list('pk', flat=True))
+                    notifications += _delete_notifications_of(Reservation, ids)
+                    notifications += _delete_notifications_of(Strike, strikes)
+
+                step_model._base_manager.filter(pk__in=ids).delete()
+
+                DeletionJob.objects.filter(pk=job.pk).update(**{
+                    counter: F(counter) + len(ids),
+                    'deleted_notifications': F('deleted_notifications') + notifications,
+                })
+            chunks += 1
+
+        if max_chunks is not None and chunks >= max_chunks:
+            return False
+
+    model.all_objects.filter(pk=job.object_id, deleted_at__isnull=False).delete()
+    return True
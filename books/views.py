@@ -1,3 +1,4 @@
+import io
 import operator
 from functools import reduce
 
@@ -18,9 +19,10 @@ from .serializers import (
     ListAuthorSerializer, CreateAuthorSerializer, UpdateAuthorSerializer,
     BaseGenreSerializer, GenericGenreSerializer, BasePublisherSerializer,
     GenericPublisherSerializer, BaseBookSerializer, CreateBookSerializer, ListBookSerializer,
-    UpdateBookSerializer
+    UpdateBookSerializer, ImportBooksSerializer, ImportBooksResultSerializer
 )
 from .models import Author, Genre, Publisher, Book
+from .utils import CatalogueImporter, read_catalogue_rows, schedule_deletion
 
 
 class AuthorViewSet(viewsets.ModelViewSet):
@@ -89,6 +91,8 @@ class AuthorViewSet(viewsets.ModelViewSet):
                     - `name` (str): Author First name + Last name.\n
                     - `biography` (str): Author Biography.\n
                     - `picture` (str): Path where is store the Author picture .\n
+                    - `picture_thumbnail` (str): Path of the 256px WebP copy of the picture (the original while it is not generated).\n
+                    - `picture_variants` (object): Paths of the copies of the picture by size (96, 256, 640) and format (webp, jpeg).\n
                     - `nationality` (str): ISO 3166-1 (alpha-2 code) of the Nationality.\n
                     - `birth_date` (str): Date of birth in format YYYY-mm-dd.\n
                     - `death_date` (str)(null): Date of death in the YYYY-mm-dd format. Otherwise, if is alive just leave it hanging in the void of null 😅.\n\n
@@ -163,6 +167,8 @@ class AuthorViewSet(viewsets.ModelViewSet):
                 - `name` (str): Author First name + Last name.\n
                 - `biography` (str): Author Biography.\n
                 - `picture` (str): Path where is store the Author picture .\n
+                - `picture_thumbnail` (str): Path of the 256px WebP copy of the picture (the original while it is not generated).\n
+                - `picture_variants` (object): Paths of the copies of the picture by size (96, 256, 640) and format (webp, jpeg).\n
                 - `nationality` (str): ISO 3166-1 (alpha-2 code) of the Nationality.\n
                 - `birth_date` (str): Date of birth in format YYYY-mm-dd.\n
                 - `death_date` (str)(null): Date of death in the YYYY-mm-dd format. Otherwise, if is alive just leave it hanging in the void of null 😅.\n\n
@@ -252,7 +258,7 @@ class AuthorViewSet(viewsets.ModelViewSet):
             - `id` (int):
                 The id of the author to get.\n\n
             ### Response(Success):\n
-            - `204 Create` : Author be deleted.\n\n
+            - `204 Create` : Author be deleted. It is hidden at once and removed, with its Books, in background.\n\n
 
             ### Response(Failure):\n
             - `400 BAD REQUEST`: 
@@ -270,7 +276,8 @@ class AuthorViewSet(viewsets.ModelViewSet):
                 return Response({'detail': 'Pk parameter must be of base 10.'}, status=status.HTTP_400_BAD_REQUEST)
 
             if author:
-                author.delete()
+                # Books and their reservations are removed in background.
+                schedule_deletion(author)
                 return Response({}, status=status.HTTP_204_NO_CONTENT)
             else:
                 return Response({'detail': 'Author not found.'}, status=status.HTTP_404_NOT_FOUND)
@@ -654,7 +661,7 @@ class PublisherViewSet(viewsets.ModelViewSet):
             - `id` (int):
                 The id of the Publisher to get.\n\n
             ### Response(Success):\n
-            - `204 Create` : Publisher be deleted.\n\n
+            - `204 Create` : Publisher be deleted. It is hidden at once and removed, with its Books, in background.\n\n
 
             ### Response(Failure):\n
             - `400 BAD REQUEST`: 
@@ -666,6 +673,10 @@ class PublisherViewSet(viewsets.ModelViewSet):
         """
         return super().destroy(request, *args, **kwargs)
 
+    def perform_destroy(self, instance):
+        # Books and their reservations are removed in background.
+        schedule_deletion(instance)
+
 
 class BookViewSet(viewsets.ModelViewSet):
     serializer_class = BaseBookSerializer
@@ -679,6 +690,8 @@ class BookViewSet(viewsets.ModelViewSet):
             return ListBookSerializer
         elif self.action == 'partial_update':
             return UpdateBookSerializer
+        elif self.action == 'import_books':
+            return ImportBooksSerializer
 
         return super().get_serializer_class()
 
@@ -718,7 +731,7 @@ class BookViewSet(viewsets.ModelViewSet):
         return Book.objects.select_related('author', 'publisher', 'genre').all().order_by('-title', '-publication_date')
 
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'import_books']:
             return [IsAdminUser(), ]
         else:
             return [AllowAny(), ]
@@ -788,6 +801,8 @@ class BookViewSet(viewsets.ModelViewSet):
                     - `edition` (int): Number of edition.\n
                     - `amount_pages` (int): Number of pages the book has.\n
                     - `cover` (file): Binary forCover of the book.\n
+                    - `cover_thumbnail` (str): Path of the 256px WebP copy of the cover (the original while it is not generated).\n
+                    - `cover_variants` (object): Paths of the copies of the cover by size (96, 256, 640) and format (webp, jpeg).\n
                     - `publication_date` (str): Date when it was published in YYYY-mm-dd format.\n
                     - `slug` (str): Slug of the book, that we use as identifier.\n
                     - `genre` (object): Genre.\n
@@ -803,6 +818,8 @@ class BookViewSet(viewsets.ModelViewSet):
                         - `name` (str): Author First name + Last name.\n
                         - `biography` (str): Author Biography.\n
                         - `picture` (str): Path where is store the Author picture .\n
+                        - `picture_thumbnail` (str): Path of the 256px WebP copy of the picture (the original while it is not generated).\n
+                        - `picture_variants` (object): Paths of the copies of the picture by size (96, 256, 640) and format (webp, jpeg).\n
                         - `nationality` (str): ISO 3166-1 (alpha-2 code) of the Nationality.\n
                         - `birth_date` (str): Date of birth in format YYYY-mm-dd.\n
                         - `death_date` (str)(null): Date of death in the YYYY-mm-dd format. Otherwise, if is alive just be null.\n\n
@@ -841,6 +858,8 @@ class BookViewSet(viewsets.ModelViewSet):
                 - `edition` (int): Number of edition.\n
                 - `amount_pages` (int): Number of pages the book has.\n
                 - `cover` (file): Binary forCover of the book.\n
+                - `cover_thumbnail` (str): Path of the 256px WebP copy of the cover (the original while it is not generated).\n
+                - `cover_variants` (object): Paths of the copies of the cover by size (96, 256, 640) and format (webp, jpeg).\n
                 - `publication_date` (str): Date when it was published in YYYY-mm-dd format.\n
                 - `slug` (str): Slug of the book, that we use as identifier.\n
                 - `genre` (object): Genre.\n
@@ -856,6 +875,8 @@ class BookViewSet(viewsets.ModelViewSet):
                     - `name` (str): Author First name + Last name.\n
                     - `biography` (str): Author Biography.\n
                     - `picture` (str): Path where is store the Author picture .\n
+                    - `picture_thumbnail` (str): Path of the 256px WebP copy of the picture (the original while it is not generated).\n
+                    - `picture_variants` (object): Paths of the copies of the picture by size (96, 256, 640) and format (webp, jpeg).\n
                     - `nationality` (str): ISO 3166-1 (alpha-2 code) of the Nationality.\n
                     - `birth_date` (str): Date of birth in format YYYY-mm-dd.\n
                     - `death_date` (str)(null): Date of death in the YYYY-mm-dd format. Otherwise, if is alive just be null.\n\n
@@ -928,7 +949,7 @@ class BookViewSet(viewsets.ModelViewSet):
             - `slug` (str):
                 The slug of the Book to get.\n\n
             ### Response(Success):\n
-            - `204 Create` : Book be deleted.\n\n
+            - `204 Create` : Book be deleted. It is hidden at once and removed, with its Reservations, in background.\n\n
 
             ### Response(Failure):\n
             - `400 BAD REQUEST`: 
@@ -942,7 +963,7 @@ class BookViewSet(viewsets.ModelViewSet):
         if slug:
             book = self.get_queryset(lookup=slug)
             if book:
-                book.delete()
+                schedule_deletion(book)
                 return Response(status=status.HTTP_204_NO_CONTENT)
 
             else:
@@ -1162,3 +1183,57 @@ class BookViewSet(viewsets.ModelViewSet):
                 return Response({'detail': "Books of the author received, not found."}, status=status.HTTP_404_NOT_FOUND)
         else:
             return Response({'detail': 'Invalid pk.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    @extend_schema(
+        request={'multipart/form-data': ImportBooksSerializer},
+        responses={201: ImportBooksResultSerializer},
+    )
+    @action(methods=['POST'], detail=False, url_path='import', url_name='import')
+    def import_books(self, request, *args, **kwargs):
+        """
+            Bulk import of Books from a CSV/JSONL file (Only Users with Admin Range).\n
+            Authors, genres and publishers are looked up in batches and the missing ones are created.\n
+
+            ### Request Body :\n
+            - `file` (File): CSV (with header) or JSONL file, one book per row/line.\n
+                - `title` (str): Book Title.\n
+                - `language` (str): Language of the Book.\n
+                - `genre` (str): Name of the Genre.\n
+                - `publication_date` (str): Date of publication in format YYYY-mm-dd.\n
+                - `author_first_name` / `author_last_name` (str)(optional): Author of the Book.\n
+                - `author_birth_date` (str)(optional): Required only if the Author not exists.\n
+                - `publisher` / `publisher_country` (str)(optional): Publisher of the Book.\n
+                - `edition` / `amount_pages` (int)(optional): Default 1.\n
+            - `format` (str)(optional): `csv` or `jsonl`, by default is taken from the file extension.\n
+            - `batch_size` (int)(optional): Amount of rows inserted per query (max 5000).\n\n
+
+            ### Response(Success):\n
+            - `201 Created` :\n
+                - `processed` (int): Amount of rows read.\n
+                - `created` (int): Amount of Books created.\n
+                - `failed` (int): Amount of rows rejected.\n
+                - `errors` (array): `line` and `error` of each rejected row.\n
+                - `elapsed` (float): Seconds taken.\n
+                - `rows_per_second` (float): Throughput of the import.\n\n
+
+            ### Response(Failure):\n
+            - `400 BAD REQUEST`:
+            Invalid input data. Check the response for details.\n
+            - `401 Unauthorized`:
+            If the user is not authenticated.\n
+        """
+        import_serializer = self.get_serializer_class()(data=request.data)
+        if import_serializer.is_valid():
+            importer = CatalogueImporter(
+                batch_size=import_serializer.validated_data['batch_size'])
+            stream = io.TextIOWrapper(
+                import_serializer.validated_data['file'].file, encoding='utf-8', newline='')
+            try:
+                result = importer.run(read_catalogue_rows(
+                    stream, import_serializer.validated_data['format']))
+            except (ValueError, UnicodeDecodeError) as e:
+                return Response({'file': f'Invalid file: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+
+            return Response(ImportBooksResultSerializer(result).data, status=status.HTTP_201_CREATED)
+        else:
+            return Response(import_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,15 @@
+import pytest
+from django.core.cache import cache
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # The local memory cache outlives the rolled back test transactions,
+    # whose row ids are given again to the next test.
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def local_notification_pubsub(settings):
+    # Streams are woken in process, without the redis pub/sub.
+    settings.NOTIFICATIONS_PUBSUB_URL = ''
@@ -1,7 +1,15 @@
 from django.contrib import admin
 from django.contrib.contenttypes.models import ContentType
 
+from .models import OutboxEvent
+
 
 admin.site.register(ContentType)
 
 # Register your models here.
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'created_at', 'dispatched_at', 'consumed_at', 'attempts']
+    list_filter = ['kind']
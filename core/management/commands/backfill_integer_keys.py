@@ -0,0 +1,89 @@
+"""
+Staged migration of the varchar foreign keys (`to_field='username'` and
+`to_field='slug'`) to integer keys, without downtime:
+
+    1. Add the nullable `<name>_ref` integer keys (migrations
+       books.0006 and management.0015).
+    2. Dual-write: `IntegerKeyDualWriteMixin` fills them on every save.
+    3. Backfill the old rows in chunks: `manage.py backfill_integer_keys`.
+    4. Verify nothing is missing: `manage.py backfill_integer_keys --verify`.
+    5. Switch reads: `INTEGER_KEY_READS=1` (see `core.utils.by_user`).
+    6. Drop the varchar keys and rename `<name>_ref` in a later release.
+"""
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min, OuterRef, Subquery
+
+from core.models import IntegerKeyDualWriteMixin
+
+
+class Command(BaseCommand):
+    help = 'Fill the integer keys (<name>_ref) from the varchar foreign keys in chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Amount of primary keys covered per UPDATE.')
+        parser.add_argument(
+            '--sleep', type=float, default=0.0,
+            help='Seconds to wait between chunks, to leave room to the live traffic.')
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Only count the rows that still miss the integer key.')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] <= 0:
+            raise CommandError('--chunk-size must be bigger than 0.')
+
+        pending = 0
+        for model in apps.get_models():
+            if not issubclass(model, IntegerKeyDualWriteMixin):
+                continue
+
+            for ref_name, fk_name in model.integer_keys.items():
+                if options['verify']:
+                    missing = self.missing(model, ref_name, fk_name).count()
+                    pending += missing
+                    self.stdout.write(f'{model.__name__}.{ref_name}: {missing} missing.')
+                else:
+                    updated = self.backfill(model, ref_name, fk_name, options)
+                    self.stdout.write(self.style.SUCCESS(
+                        f'{model.__name__}.{ref_name}: {updated} rows filled.'))
+
+        if options['verify']:
+            if pending:
+                raise CommandError(f'{pending} rows miss their integer key, run the backfill.')
+            self.stdout.write(self.style.SUCCESS('All integer keys are filled, reads can be switched.'))
+
+    def missing(self, model, ref_name, fk_name):
+        return model._base_manager.filter(**{
+            f'{ref_name}__isnull': True,
+            f'{fk_name}__isnull': False,
+        })
+
+    def backfill(self, model, ref_name, fk_name, options):
+        fk = model._meta.get_field(fk_name)
+        related = fk.remote_field.model
+        related_pk = related._base_manager.filter(
+            **{fk.to_fields[0]: OuterRef(fk.attname)}).values('pk')[:1]
+
+        bounds = self.missing(model, ref_name, fk_name).aggregate(
+            start=Min('pk'), end=Max('pk'))
+        if bounds['start'] is None:
+            return 0
+
+        updated = 0
+        start = bounds['start']
+        while start <= bounds['end']:
+            end = start + options['chunk_size']
+            # Each chunk is one short UPDATE on a pk range, in autocommit.
+            updated += self.missing(model, ref_name, fk_name).filter(
+                pk__gte=start, pk__lt=end
+            ).update(**{ref_name: Subquery(related_pk)})
+            start = end
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        return updated
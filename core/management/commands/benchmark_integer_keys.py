@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from management.models import Favorite, Reservation
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Compare the join-heavy queries on the varchar foreign keys against the integer keys (<name>_ref).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=50,
+            help='Amount of users sampled.')
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Times each query is executed per user.')
+
+    def handle(self, *args, **options):
+        users = list(User.objects.filter(
+            reservation__isnull=False).distinct().order_by('pk')[:options['users']])
+        if not users:
+            raise CommandError('There are no reservations to benchmark.')
+
+        queries = {
+            'Reservations of user': (
+                lambda user: Reservation.objects.filter(user=user).select_related('book'),
+                lambda user: Reservation.objects.filter(user_ref=user).select_related('book_ref'),
+            ),
+            'Reservations by user email': (
+                lambda user: Reservation.objects.filter(user__email=user.email),
+                lambda user: Reservation.objects.filter(user_ref__email=user.email),
+            ),
+            'Favorites with book and genre': (
+                lambda user: Favorite.objects.filter(user=user).select_related('book__genre'),
+                lambda user: Favorite.objects.filter(user_ref=user).select_related('book_ref__genre'),
+            ),
+        }
+
+        for name, (varchar_query, integer_query) in queries.items():
+            varchar_ms = self.measure(varchar_query, users, options['repeat'])
+            integer_ms = self.measure(integer_query, users, options['repeat'])
+            speedup = varchar_ms / integer_ms if integer_ms else 0
+            self.stdout.write(
+                f'{name}: varchar {varchar_ms:.3f} ms, integer {integer_ms:.3f} ms '
+                f'({speedup:.2f}x).')
+
+    def measure(self, query, users, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for user in users:
+                list(query(user))
+        elapsed = time.perf_counter() - start
+        return elapsed * 1000 / (repeat * len(users))
@@ -0,0 +1,76 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from books.models import Author, Book
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Rename the existing media files by the hash of their content and update the fields in bulk.'
+
+    targets = [
+        (Book, 'cover'),
+        (Author, 'picture'),
+        (User, 'profile_img'),
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Amount of rows updated per query.')
+        parser.add_argument(
+            '--delete-old', action='store_true',
+            help='Delete the files with the old names once the rows are updated.')
+
+    def handle(self, *args, **options):
+        if not hasattr(default_storage, 'hashed_name'):
+            raise CommandError(
+                'The default storage must be core.storage.ContentAddressedStorage.')
+
+        for model, field in self.targets:
+            renamed = missing = 0
+            rows = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}) \
+                .only('pk', field).order_by('pk')
+
+            chunk, old_names = [], []
+            for instance in rows.iterator(chunk_size=options['chunk_size']):
+                file = getattr(instance, field)
+                if default_storage.is_hashed_name(file.name):
+                    continue
+                if not default_storage.exists(file.name):
+                    missing += 1
+                    self.stderr.write(f'{model.__name__} {instance.pk}: {file.name} not found.')
+                    continue
+
+                with default_storage.open(file.name) as content:
+                    new_name = default_storage.save(file.name, content)
+
+                old_names.append(file.name)
+                file.name = new_name
+                chunk.append(instance)
+
+                if len(chunk) >= options['chunk_size']:
+                    renamed += self.flush(model, field, chunk)
+                    chunk = []
+
+            renamed += self.flush(model, field, chunk)
+
+            # Deleted only when every row is updated, an old name may be shared.
+            if options['delete_old']:
+                for name in set(old_names):
+                    if default_storage.exists(name):
+                        default_storage.delete(name)
+
+            self.stdout.write(self.style.SUCCESS(
+                f'{model.__name__}.{field}: {renamed} renamed, {missing} not found.'))
+
+    def flush(self, model, field, chunk):
+        if not chunk:
+            return 0
+
+        with transaction.atomic():
+            # bulk_update() skips save(), so no variants are enqueued again.
+            model.objects.bulk_update(chunk, [field])
+
+        return len(chunk)
@@ -8,3 +8,187 @@ class DatesRecordsBaseModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class LiveManager(models.Manager):
+    """Manager that hides the rows marked as deleted (tombstoned)."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+class TombstoneBaseModel(models.Model):
+    """
+    Rows are marked as deleted first (hidden by `objects`) and removed later in
+    background; `all_objects` still sees them.
+    """
+    deleted_at = models.DateTimeField(
+        null=True, blank=True, db_index=True, verbose_name=_('Date of deletion'))
+
+    objects = LiveManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        abstract = True
+
+
+class DirtyFieldsMixin:
+    """
+    Keep a snapshot of the values loaded from the database so changes can be
+    detected in memory, and make `save()` on existing rows write only the
+    columns that changed (through `update_fields`).
+
+    Must be placed before `models.Model` (or any model base) in the bases.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_loaded_values()
+        return instance
+
+    def _tracked_fields(self):
+        deferred = self.get_deferred_fields()
+        return [
+            field for field in self._meta.concrete_fields
+            if not field.primary_key and field.attname not in deferred
+        ]
+
+    def _tracked_value(self, field):
+        value = getattr(self, field.attname)
+        if isinstance(field, models.FileField):
+            return value.name if value else None
+        return value
+
+    def _snapshot_loaded_values(self, fields=None):
+        values = {
+            field.attname: self._tracked_value(field)
+            for field in self._tracked_fields()
+            if fields is None or field.name in fields or field.attname in fields
+        }
+        if fields is None or getattr(self, '_loaded_values', None) is None:
+            self._loaded_values = values
+        else:
+            self._loaded_values.update(values)
+
+    def has_changed(self, field_name):
+        """
+        True if the field was loaded from the database and its value changed.
+        New instances never report changes.
+        """
+        loaded_values = getattr(self, '_loaded_values', None)
+        if self._state.adding or not loaded_values:
+            return False
+
+        field = self._meta.get_field(field_name)
+        if field.attname not in loaded_values:
+            return False
+
+        return loaded_values[field.attname] != self._tracked_value(field)
+
+    def get_dirty_fields(self):
+        """
+        Names of the fields whose value differs from the loaded one. Fields not
+        loaded (deferred at load time but assigned afterwards) count as dirty.
+        """
+        loaded_values = getattr(self, '_loaded_values', {})
+        return [
+            field.name for field in self._tracked_fields()
+            if field.attname not in loaded_values
+            or loaded_values[field.attname] != self._tracked_value(field)
+        ]
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self._snapshot_loaded_values(fields=fields)
+
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        if (update_fields is None and not force_insert and not self._state.adding
+                and getattr(self, '_loaded_values', None) is not None):
+            dirty_fields = self.get_dirty_fields()
+            if dirty_fields:
+                # auto_now fields are set on pre_save, they must be written too.
+                dirty_fields += [
+                    field.name for field in self._meta.concrete_fields
+                    if getattr(field, 'auto_now', False) and field.name not in dirty_fields
+                ]
+            update_fields = dirty_fields
+
+        super().save(
+            force_insert=force_insert, force_update=force_update,
+            using=using, update_fields=update_fields
+        )
+        self._snapshot_loaded_values()
+
+
+class IntegerKeyDualWriteMixin:
+    """
+    Keep integer foreign keys (`<name>_ref`) in sync with the legacy varchar
+    ones (`to_field='username'`/`'slug'`) while both exist.
+
+    `integer_keys` maps the integer field to the legacy field, e.g.
+    `{'user_ref': 'user'}`. The pk is taken from the related object when it is
+    already cached, otherwise it is looked up only if the legacy key changed.
+    Rows written with `update()`/`bulk_create()` are filled by the
+    `backfill_integer_keys` command.
+    """
+    integer_keys = {}
+
+    def sync_integer_keys(self):
+        synced = []
+        for ref_name, fk_name in self.integer_keys.items():
+            fk = self._meta.get_field(fk_name)
+            ref = self._meta.get_field(ref_name)
+            value = getattr(self, fk.attname)
+
+            if value is None:
+                new_pk = None
+            elif fk.is_cached(self) and getattr(self, fk_name) is not None:
+                new_pk = getattr(self, fk_name).pk
+            elif getattr(self, ref.attname) is None or (
+                    hasattr(self, 'has_changed') and self.has_changed(fk_name)):
+                new_pk = fk.remote_field.model._base_manager.filter(
+                    **{fk.to_fields[0]: value}).values_list('pk', flat=True).first()
+            else:
+                continue
+
+            if getattr(self, ref.attname) != new_pk:
+                setattr(self, ref.attname, new_pk)
+                synced.append(ref_name)
+
+        return synced
+
+    def save(self, *args, **kwargs):
+        synced = self.sync_integer_keys()
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and synced:
+            kwargs['update_fields'] = list(update_fields) + [
+                name for name in synced if name not in update_fields]
+
+        super().save(*args, **kwargs)
+
+
+class OutboxEvent(models.Model):
+    """
+    Side effect (a notification to create, a task to enqueue) written in the
+    same transaction as the state change that causes it, and carried out later
+    by `core.tasks.dispatch_outbox_events`.
+    """
+    KIND_CHOICES = [
+        ('notification', 'Notification'),
+        ('task', 'Task'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    payload = models.JSONField(default=dict)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    consumed_at = models.DateTimeField(
+        null=True, blank=True, help_text="When the task that received it applied it.")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+
+    def __str__(self):
+        return f'{self.kind} {self.payload.get("task", self.payload.get("title", ""))}.'
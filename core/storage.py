@@ -0,0 +1,51 @@
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+HASHED_NAME_RE = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{64}(\.[\w]+)?$')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that names every file by the SHA-256 of its content:
+    `<upload_to directory>/<first 2 hex>/<sha256>.<ext>`.
+
+    The same content always gets the same name, so identical uploads are stored
+    once and a name never changes its content (it can be cached forever).
+    """
+
+    def hashed_name(self, name, content):
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+
+        hexdigest = digest.hexdigest()
+        return os.path.join(directory, hexdigest[:2], f'{hexdigest}{extension}').replace('\\', '/')
+
+    def is_hashed_name(self, name):
+        return bool(name and HASHED_NAME_RE.search(name))
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+
+        # On a race between two equal uploads the second one gets a suffixed
+        # copy from get_available_name(), never a wrong content.
+        return super().save(name, content, max_length=max_length)
@@ -0,0 +1,23 @@
+from celery import shared_task
+
+from .utils import dispatch_outbox, purge_dispatched_outbox
+
+
+@shared_task
+def dispatch_outbox_events():
+    try:
+        dispatched = dispatch_outbox()
+
+        return f'Task completed successfully. {dispatched} events dispatched.'
+    except Exception as e:
+        return f"Task Fail : {str(e)}"
+
+
+@shared_task
+def purge_outbox_events():
+    try:
+        deleted = purge_dispatched_outbox()
+
+        return f'Task completed successfully. {deleted} events deleted.'
+    except Exception as e:
+        return f"Task Fail : {str(e)}"
@@ -0,0 +1,71 @@
+import datetime
+
+from django.test import TestCase
+
+from library.celery import app
+from management.models import Reservation
+from management.tasks import notifications_as_read, reconcile_reservation_transitions
+from management.test.factories import ReservationFactory
+from users.models import User
+from users.tasks import send_email
+
+
+class TaskRoutingTest(TestCase):
+    def queue_of(self, task_name):
+        return app.amqp.router.route({}, task_name)['queue'].name
+
+    def test_routes(self):
+        self.assertEqual(self.queue_of('management.tasks.notifications_as_read'), 'interactive')
+        self.assertEqual(self.queue_of('management.tasks.apply_credits'), 'interactive')
+        self.assertEqual(self.queue_of('users.tasks.send_email'), 'email')
+        self.assertEqual(self.queue_of('management.tasks.reconcile_reservation_transitions'), 'batch')
+        self.assertEqual(self.queue_of('books.tasks.create_book_cover_variants'), 'batch')
+
+    def test_messages_published_to_their_queue(self):
+        with app.connection_for_write('memory://') as connection:
+            # No result backend is reachable here, only the broker is used.
+            notifications_as_read.apply_async(
+                args=['someone', [1]], connection=connection, ignore_result=True)
+            send_email.apply_async(
+                args=['example.com', True, 'someone', 'someone@example.com', 'Subject', 'mail.html'],
+                connection=connection, ignore_result=True)
+
+            interactive = connection.SimpleQueue('interactive')
+            email = connection.SimpleQueue('email')
+            try:
+                message = interactive.get(timeout=1)
+                self.assertEqual(message.headers['task'], 'management.tasks.notifications_as_read')
+                message.ack()
+
+                message = email.get(timeout=1)
+                self.assertEqual(message.headers['task'], 'users.tasks.send_email')
+                message.ack()
+            finally:
+                interactive.close()
+                email.close()
+
+
+class ChunkedNightlyTaskTest(TestCase, ReservationFactory):
+    def setUp(self):
+        app.conf.task_always_eager = True
+        self.user = User.objects.create_user(
+            first_name='Ana', last_name='Lopez', username='analopez',
+            email='ana@example.com', password='testpassword', is_active=True
+        )
+
+    def tearDown(self):
+        app.conf.task_always_eager = False
+
+    def test_reconcile_goes_through_every_chunk(self):
+        today = datetime.date.today()
+        for _ in range(3):
+            Reservation.objects.create(
+                user=self.user, book=self.book(), start_date=today,
+                end_date=today + datetime.timedelta(days=3), initial_price=10.00
+            )
+        Reservation.objects.update(next_transition_at=None)
+
+        reconcile_reservation_transitions.delay(chunk_size=1)
+
+        self.assertEqual(
+            list(Reservation.objects.values_list('status', flat=True)), ['available'] * 3)
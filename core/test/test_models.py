@@ -0,0 +1,85 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from books.models import Genre, Book
+from books.test.factories import BookFactory
+
+
+class DirtyFieldsMixinTest(TestCase, BookFactory):
+    def setUp(self):
+        self.genre = Genre.objects.create(
+            name='Science Fiction', description='Space.')
+
+    def test_new_instance_not_changed(self):
+        genre = Genre(name='Drama')
+
+        self.assertFalse(genre.has_changed('name'))
+
+    def test_loaded_instance_tracks_changes(self):
+        genre = Genre.objects.get(pk=self.genre.pk)
+        self.assertEqual(genre.get_dirty_fields(), [])
+
+        genre.description = 'Other description.'
+
+        self.assertTrue(genre.has_changed('description'))
+        self.assertFalse(genre.has_changed('name'))
+        self.assertEqual(genre.get_dirty_fields(), ['description'])
+
+    def test_save_writes_only_changed_columns(self):
+        genre = Genre.objects.get(pk=self.genre.pk)
+        genre.description = 'Other description.'
+
+        with CaptureQueriesContext(connection) as queries:
+            genre.save()
+
+        self.assertEqual(len(queries), 1)
+        self.assertIn('UPDATE', queries[0]['sql'])
+        self.assertIn('description', queries[0]['sql'])
+        self.assertNotIn('"name"', queries[0]['sql'])
+        self.assertEqual(genre.get_dirty_fields(), [])
+
+    def test_save_without_changes_skips_query(self):
+        genre = Genre.objects.get(pk=self.genre.pk)
+
+        with self.assertNumQueries(0):
+            genre.save()
+
+    def test_slug_regenerated_without_extra_query(self):
+        genre = Genre.objects.get(pk=self.genre.pk)
+        genre.name = 'Hard Science Fiction'
+
+        with self.assertNumQueries(1):
+            genre.save()
+
+        genre.refresh_from_db()
+        self.assertEqual(genre.slug, 'hard-science-fiction')
+
+    def test_book_slug_kept_when_title_not_changed(self):
+        cover = self.cover()
+        book = Book.objects.create(
+            title='Dune', language='en', genre=self.genre,
+            publication_date='1965-08-01', cover=cover
+        )
+        book = Book.objects.get(pk=book.pk)
+        book.edition = 2
+
+        with CaptureQueriesContext(connection) as queries:
+            book.save()
+
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"title"', queries[0]['sql'])
+        self.assertEqual(book.slug, 'dune')
+
+        book.title = 'Dune Messiah'
+        book.save()
+        self.assertEqual(Book.objects.get(pk=book.pk).slug, 'dune-messiah')
+
+    def test_refresh_from_db_resets_snapshot(self):
+        genre = Genre.objects.get(pk=self.genre.pk)
+        Genre.objects.filter(pk=genre.pk).update(description='Changed.')
+
+        genre.refresh_from_db()
+
+        self.assertEqual(genre.get_dirty_fields(), [])
+        self.assertEqual(genre.description, 'Changed.')
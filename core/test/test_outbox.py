@@ -0,0 +1,155 @@
+import datetime
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from management.models import Reservation, Notification, Credit
+from management.tasks import apply_credits
+from management.test.factories import ReservationFactory
+from management.utils import outbox_notification
+from users.models import User
+from users.test.factories import UserFactory
+
+from ..models import OutboxEvent
+from ..utils import OUTBOX_MAX_ATTEMPTS, consume_outbox_event, dispatch_outbox, outbox_task
+
+
+class OutboxTest(TestCase, ReservationFactory):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            first_name='Ana', last_name='Lopez', username='analopez',
+            email='ana@example.com', password='testpassword', is_active=True
+        )
+        today = datetime.date.today()
+        self.reservation = Reservation.objects.create(
+            user=self.user, book=self.book(), start_date=today,
+            end_date=today + datetime.timedelta(days=3), initial_price=10.00
+        )
+
+    def test_rolled_back_change_leaves_no_event(self):
+        try:
+            with transaction.atomic():
+                outbox_notification(user=self.user, title='Available', obj=self.reservation)
+                raise ValueError
+        except ValueError:
+            pass
+
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_dispatch_bulk_inserts_notifications(self):
+        for i in range(5):
+            outbox_notification(user=self.user, title=f'Title {i}', obj=self.reservation)
+
+        # Per batch: savepoint, claim, bulk insert, mark dispatched, release;
+        # then the empty claim that ends it.
+        with self.assertNumQueries(8):
+            self.assertEqual(dispatch_outbox(), 5)
+
+        self.assertEqual(Notification.objects.filter(
+            user=self.user, user_ref=self.user, object_id=self.reservation.pk).count(), 5)
+        self.assertFalse(OutboxEvent.objects.filter(dispatched_at__isnull=True).exists())
+
+        self.assertEqual(dispatch_outbox(), 0)
+        self.assertEqual(Notification.objects.count(), 5)
+
+    def test_dispatch_sends_tasks_with_event_id(self):
+        event = outbox_task('management.tasks.apply_credits',
+                            reservation_id=self.reservation.pk)
+
+        with mock.patch('core.utils.current_app.send_task') as send_task:
+            dispatch_outbox()
+
+        send_task.assert_called_once_with(
+            'management.tasks.apply_credits',
+            kwargs={'reservation_id': self.reservation.pk, 'outbox_event_id': event.pk})
+
+    def test_dispatch_failure_is_retried(self):
+        event = outbox_task('management.tasks.apply_credits',
+                            reservation_id=self.reservation.pk)
+
+        with mock.patch('core.utils.current_app.send_task', side_effect=ConnectionError('down')):
+            self.assertEqual(dispatch_outbox(), 0)
+
+        event.refresh_from_db()
+        self.assertIsNone(event.dispatched_at)
+        self.assertEqual(event.attempts, 1)
+        self.assertEqual(event.last_error, 'down')
+
+        with mock.patch('core.utils.current_app.send_task'):
+            self.assertEqual(dispatch_outbox(), 1)
+
+    def test_dispatch_logs_abandoned_event(self):
+        event = outbox_task('management.tasks.apply_credits',
+                            reservation_id=self.reservation.pk)
+        OutboxEvent.objects.filter(pk=event.pk).update(attempts=OUTBOX_MAX_ATTEMPTS - 1)
+
+        with mock.patch('core.utils.current_app.send_task', side_effect=ConnectionError('down')), \
+                self.assertLogs('core.utils', level='ERROR') as logs:
+            dispatch_outbox()
+
+        self.assertIn(f'Outbox event {event.pk}', logs.output[0])
+        self.assertIn('abandoned after 10 attempts: down', logs.output[0])
+
+        with mock.patch('core.utils.current_app.send_task') as send_task:
+            dispatch_outbox()
+        send_task.assert_not_called()
+
+    def test_consume_once(self):
+        event = outbox_task('management.tasks.apply_credits',
+                            reservation_id=self.reservation.pk)
+
+        self.assertTrue(consume_outbox_event(event.pk))
+        self.assertFalse(consume_outbox_event(event.pk))
+
+    def test_apply_credits_redelivered_applies_once(self):
+        event = outbox_task('management.tasks.apply_credits',
+                            reservation_id=self.reservation.pk)
+
+        apply_credits(self.reservation.pk, outbox_event_id=event.pk)
+        apply_credits(self.reservation.pk, outbox_event_id=event.pk)
+
+        self.assertEqual(Credit.objects.get(user=self.user).amount, 4)
+        self.assertEqual(Reservation.objects.get(pk=self.reservation.pk).status,
+                         'canceled_system')
+
+        dispatch_outbox()
+        self.assertEqual(Notification.objects.filter(user=self.user).count(), 1)
+
+    def test_apply_credits_failure_raises_for_retry(self):
+        event = outbox_task('management.tasks.apply_credits',
+                            reservation_id=self.reservation.pk)
+
+        with mock.patch('management.tasks.grant_credits', side_effect=ValueError('boom')):
+            with self.assertRaises(ValueError):
+                apply_credits(self.reservation.pk, outbox_event_id=event.pk)
+
+        event.refresh_from_db()
+        self.assertIsNone(event.consumed_at)
+        self.assertEqual(Reservation.objects.get(pk=self.reservation.pk).status,
+                         self.reservation.status)
+
+        # The retry applies it.
+        apply_credits(self.reservation.pk, outbox_event_id=event.pk)
+        self.assertEqual(Credit.objects.get(user=self.user).amount, 4)
+
+
+class SignupOutboxTest(APITestCase, UserFactory):
+    def test_signup_writes_email_event(self):
+        username = self.username()
+        response = self.client.post(reverse('users-list'), {
+            'password': 'Belgrano1905',
+            'password2': 'Belgrano1905',
+            'first_name': self.first_name(),
+            'last_name': self.last_name(),
+            'username': username,
+            'email': self.email(),
+        })
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.payload['task'], 'users.tasks.send_email')
+        self.assertEqual(event.payload['kwargs']['username'], username)
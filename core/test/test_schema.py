@@ -0,0 +1,78 @@
+import json
+import tempfile
+from pathlib import Path
+
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ..views import cached_schema
+
+
+SCHEMA = b"""openapi: 3.0.3
+info:
+  title: Library
+  version: 1.0.0
+paths: {}
+"""
+
+
+class CachedSchemaAPITest(APITestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        schema_file = Path(directory.name) / 'schema.yml'
+        schema_file.write_bytes(SCHEMA)
+
+        settings = override_settings(SCHEMA_FILE=schema_file)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        cached_schema.cache_clear()
+        self.addCleanup(cached_schema.cache_clear)
+
+    def test_schema_served_from_file(self):
+        response = self.client.get(reverse('schema'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, SCHEMA)
+        self.assertTrue(response['Content-Type'].startswith('application/vnd.oai.openapi'))
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_schema_json(self):
+        response = self.client.get(reverse('schema'), HTTP_ACCEPT='application/json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(response.content)['info']['title'], 'Library')
+        self.assertNotEqual(response['ETag'], self.client.get(reverse('schema'))['ETag'])
+
+    def test_schema_not_modified(self):
+        etag = self.client.get(reverse('schema'))['ETag']
+
+        response = self.client.get(reverse('schema'), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    def test_schema_read_once(self):
+        self.client.get(reverse('schema'))
+        self.client.get(reverse('schema'))
+
+        self.assertEqual(cached_schema.cache_info().misses, 1)
+
+    @override_settings(DEBUG=True)
+    def test_schema_generated_live_in_debug(self):
+        response = self.client.get(reverse('schema'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(b'/reservation/', response.content)
+        self.assertEqual(cached_schema.cache_info().misses, 0)
+
+    def test_docs_point_at_schema(self):
+        response = self.client.get(reverse('docs'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(reverse('schema').encode(), response.content)
@@ -0,0 +1,70 @@
+import io
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from books.models import Book
+from books.test.factories import BookFactory, faker
+from core.storage import ContentAddressedStorage
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ContentAddressedStorageTest(TestCase, BookFactory):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.storage = ContentAddressedStorage()
+
+    def test_name_by_content_hash(self):
+        name = self.storage.save('books/Some Title.JPG', ContentFile(b'content'))
+
+        self.assertTrue(name.startswith('books/ed/'))
+        self.assertTrue(name.endswith('.jpg'))
+        self.assertTrue(self.storage.is_hashed_name(name))
+
+    def test_identical_uploads_deduplicated(self):
+        first = self.storage.save('books/one.jpg', ContentFile(b'same'))
+        second = self.storage.save('books/two.jpg', ContentFile(b'same'))
+        other = self.storage.save('books/three.jpg', ContentFile(b'other'))
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(len(self.storage.listdir('books/' + first.split('/')[1])[1]), 1)
+
+    def test_same_title_editions_not_collide(self):
+        genre = self.genre()
+        first = Book.objects.create(
+            title='Dune', language='en', genre=genre,
+            publication_date='1965-08-01', cover=self.cover(), slug='dune')
+        second = Book.objects.create(
+            title='Dune', language='en', genre=genre, edition=2,
+            publication_date='1965-08-01', cover=faker.image(width=320), slug='dune-2')
+
+        self.assertNotEqual(first.cover.name, second.cover.name)
+
+    def test_rehash_media_command(self):
+        legacy_storage = FileSystemStorage()
+        legacy_name = legacy_storage.save('books/Legacy.jpg', self.cover())
+        book = Book.objects.create(
+            title='Legacy', language='en', genre=self.genre(),
+            publication_date='1965-08-01', cover=self.cover())
+        Book.objects.filter(pk=book.pk).update(cover=legacy_name)
+
+        out = io.StringIO()
+        call_command('rehash_media', '--delete-old', stdout=out)
+
+        book.refresh_from_db()
+        self.assertTrue(self.storage.is_hashed_name(book.cover.name))
+        self.assertTrue(self.storage.exists(book.cover.name))
+        self.assertFalse(self.storage.exists(legacy_name))
+        self.assertIn('Book.cover: 1 renamed', out.getvalue())
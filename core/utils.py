@@ -1,7 +1,140 @@
+import logging
+from datetime import timedelta
+
+from celery import current_app
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from rest_framework.pagination import PageNumberPagination
 
+from .models import OutboxEvent
+
+
+logger = logging.getLogger(__name__)
+
 
 class GenericPagination(PageNumberPagination):
     page_size = 3
     page_size_query_param = 'page_size'
     max_page_size = 30
+
+
+def by_user(user, prefix=''):
+    """
+    Filter kwargs for the rows of `user`. Once INTEGER_KEY_READS is on, the
+    lookup goes through the integer key (`user_ref`) instead of the username.
+    """
+    field = 'user_ref' if settings.INTEGER_KEY_READS else 'user'
+    return {f'{prefix}{field}': user}
+
+
+OUTBOX_BATCH_SIZE = 500
+OUTBOX_MAX_ATTEMPTS = 10
+# Options of the tasks sent by `dispatch_outbox`: one that raises has not
+# consumed its event, so Celery runs it again.
+OUTBOX_TASK_OPTIONS = {
+    'autoretry_for': (Exception,),
+    'retry_backoff': True,
+    'max_retries': OUTBOX_MAX_ATTEMPTS,
+}
+
+
+def outbox_task(task_name, **kwargs):
+    """
+    Write an event to run `task_name` with `kwargs` (ids and plain values
+    only). It is only a row of the current transaction: once committed,
+    `dispatch_outbox` (beat, every few seconds) sends the task. The task also
+    receives `outbox_event_id`, to apply its effects once with
+    `consume_outbox_event`, and is declared with `OUTBOX_TASK_OPTIONS`.
+    """
+    return OutboxEvent.objects.create(
+        kind='task', payload={'task': task_name, 'kwargs': kwargs})
+
+
+def outbox_tasks(task_name, kwargs_list):
+    """`outbox_task` for many calls of `task_name`, with one insert."""
+    return OutboxEvent.objects.bulk_create([
+        OutboxEvent(kind='task', payload={'task': task_name, 'kwargs': kwargs})
+        for kwargs in kwargs_list
+    ])
+
+
+def consume_outbox_event(event_id):
+    """
+    Mark the event as applied. False if it was already, then the caller
+    must not apply it again. Call it inside the transaction of the effects.
+    """
+    return OutboxEvent.objects.filter(
+        pk=event_id, consumed_at__isnull=True).update(consumed_at=timezone.now()) == 1
+
+
+def dispatch_outbox(batch_size=OUTBOX_BATCH_SIZE, max_batches=None):
+    """
+    Carry out the pending events in batches. The notifications of a batch are
+    bulk inserted in the transaction that marks their events as dispatched;
+    the tasks are sent to the broker with ids only.
+    """
+    from management.models import Notification
+    from management.signals import notifications_created
+
+    dispatched = batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            events = list(OutboxEvent.objects.select_for_update(skip_locked=True).filter(
+                dispatched_at__isnull=True, attempts__lt=OUTBOX_MAX_ATTEMPTS
+            ).order_by('pk')[:batch_size])
+            if not events:
+                break
+            batches += 1
+
+            done, failed = [], []
+            notifications = []
+            for event in events:
+                if event.kind == 'notification':
+                    notifications.append(Notification(**event.payload))
+                    done.append(event.pk)
+                    continue
+
+                try:
+                    current_app.send_task(
+                        event.payload['task'],
+                        kwargs={**event.payload['kwargs'], 'outbox_event_id': event.pk})
+                    done.append(event.pk)
+                except Exception as e:
+                    event.attempts += 1
+                    event.last_error = str(e)
+                    failed.append(event)
+                    if event.attempts >= OUTBOX_MAX_ATTEMPTS:
+                        logger.error(
+                            'Outbox event %s (%s) abandoned after %s attempts: %s',
+                            event.pk, event.payload['task'], event.attempts, event.last_error)
+
+            Notification.objects.bulk_create(notifications)
+            if notifications:
+                user_ids = {notification.user_ref_id for notification in notifications}
+                transaction.on_commit(lambda user_ids=user_ids: notifications_created.send(
+                    sender=Notification, user_ids=list(user_ids)))
+            OutboxEvent.objects.filter(pk__in=done).update(dispatched_at=timezone.now())
+            OutboxEvent.objects.bulk_update(failed, ['attempts', 'last_error'])
+            dispatched += len(done)
+
+            if failed:
+                # The broker is failing, the next run tries again.
+                break
+
+    return dispatched
+
+
+OUTBOX_RETENTION_DAYS = 7
+
+
+def purge_dispatched_outbox(days=OUTBOX_RETENTION_DAYS, chunk_size=5000):
+    """Delete, in chunks, the events dispatched more than `days` ago."""
+    limit = timezone.now() - timedelta(days=days)
+    deleted = 0
+    while True:
+        ids = list(OutboxEvent.objects.filter(
+            dispatched_at__lt=limit).values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        deleted += OutboxEvent.objects.filter(pk__in=ids).delete()[0]
@@ -1 +1,51 @@
-from django.shortcuts import render
+import hashlib
+from functools import lru_cache
+
+import yaml
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, quote_etag
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+
+
+@lru_cache
+def cached_schema(renderer_class):
+    """
+    `settings.SCHEMA_FILE`, generated by `manage.py spectacular`, rendered once
+    per process by `renderer_class`. Returns the content and its ETag.
+    """
+    with open(settings.SCHEMA_FILE, 'rb') as schema_file:
+        content = schema_file.read()
+
+    if renderer_class.format != 'yaml':
+        content = renderer_class().render(yaml.safe_load(content))
+
+    return content, quote_etag(hashlib.sha256(content).hexdigest())
+
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+    """
+    OpenAPI schema served from the pre-generated artifact instead of
+    introspecting every viewset on each request. With DEBUG on, it is
+    generated live, so the docs follow the code under development.
+    """
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        if settings.DEBUG:
+            return super().get(request, *args, **kwargs)
+
+        renderer, media_type = self.perform_content_negotiation(request)
+        content, etag = cached_schema(type(renderer))
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            content_type = renderer.media_type
+            if renderer.charset:
+                content_type = f'{content_type}; charset={renderer.charset}'
+            response = HttpResponse(content, content_type=content_type)
+            response['Content-Disposition'] = f'inline; filename="{self._get_filename(request, None)}"'
+
+        response['ETag'] = etag
+        return response
@@ -11,9 +11,15 @@ then
     echo "MySQL started"
 fi
 
+echo "Check the deployment settings"
+python3 manage.py check --deploy --fail-level ERROR || exit 1
+
 echo "Apply DB migrations"
 python3 manage.py migrate
 python3 manage.py createsuperifnone
 
+echo "Generate the OpenAPI schema"
+python3 manage.py spectacular --file schema.yml
+
 exec "$@"
 
@@ -13,4 +13,19 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'library.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once the apps are loaded by `get_asgi_application`.
+from management.streams import notification_stream  # noqa: E402
+
+
+NOTIFICATIONS_STREAM_PATH = '/notification/stream/'
+
+
+async def application(scope, receive, send):
+    # The notifications stream skips the Django request cycle, an idle
+    # connection only waits for its user's next notification.
+    if scope['type'] == 'http' and scope['path'] == NOTIFICATIONS_STREAM_PATH:
+        return await notification_stream(scope, receive, send)
+
+    return await django_application(scope, receive, send)
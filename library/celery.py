@@ -14,21 +14,74 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 
 # Celery Beat settings
 app.conf.beat_schedule = {
-    'reservation_retired_to_expire': {
-        'task': 'management.tasks.reservation_retired_to_expire',
-        'schedule': crontab(hour=00, minute=00),
+    # Side effects written with the state changes (see `core.OutboxEvent`).
+    'dispatch_outbox_events': {
+        'task': 'core.tasks.dispatch_outbox_events',
+        'schedule': 5.0,
     },
-    'reservation_confirm_to_available': {
-        'task': 'management.tasks.reservation_confirm_to_available',
-        'schedule': crontab(hour=00, minute=10),
+    'purge_outbox_events': {
+        'task': 'core.tasks.purge_outbox_events',
+        'schedule': crontab(hour=3, minute=30),
     },
-    'reservation_end_and_never_pickup': {
-        'task': 'management.tasks.reservation_end_and_never_pickup',
-        'schedule': crontab(hour=00, minute=20),
+    # Reservation and penalty transitions run per object when due, see
+    # `next_transition_at`; the nightly sweep only catches lost timers.
+    'dispatch_due_transitions': {
+        'task': 'management.tasks.dispatch_due_transitions',
+        'schedule': crontab(minute='*'),
     },
-    'reservation_end_and_never_pickup': {
-        'task': 'management.tasks.completed_penalization',
-        'schedule': crontab(hour=00, minute=30),
+    'reconcile_reservation_transitions': {
+        'task': 'management.tasks.reconcile_reservation_transitions',
+        'schedule': crontab(hour=1, minute=00),
+    },
+    'reconcile_penalty_transitions': {
+        'task': 'management.tasks.reconcile_penalty_transitions',
+        'schedule': crontab(hour=1, minute=10),
+    },
+    # Running penalties of the books not returned, one statement each night.
+    'accrue_expired_penalties': {
+        'task': 'management.tasks.accrue_expired_penalties',
+        'schedule': crontab(hour=1, minute=20),
+    },
+    'bill_waiting_payment_reservations': {
+        'task': 'management.tasks.bill_waiting_payment_reservations',
+        'schedule': crontab(hour=1, minute=30),
+    },
+    # Retries of the emails that failed, the new ones are sent on arrival.
+    'send_queued_emails': {
+        'task': 'users.tasks.send_queued_emails',
+        'schedule': crontab(minute='*'),
+    },
+    'purge_sent_emails': {
+        'task': 'users.tasks.purge_sent_emails',
+        'schedule': crontab(hour=3, minute=15),
+    },
+    'send_notification_digests': {
+        'task': 'management.tasks.send_notification_digests',
+        'schedule': crontab(hour=8, minute=00),
+    },
+    'archive_reservations': {
+        'task': 'management.tasks.archive_reservations',
+        'schedule': crontab(hour=2, minute=00),
+    },
+    'archive_notifications': {
+        'task': 'management.tasks.archive_notifications',
+        'schedule': crontab(hour=2, minute=20),
+    },
+    'retry_failed_deletion_jobs': {
+        'task': 'books.tasks.retry_failed_deletion_jobs',
+        'schedule': crontab(minute='*/15'),
+    },
+    'purge_expired_jwt_tokens': {
+        'task': 'users.tasks.purge_expired_jwt_tokens',
+        'schedule': crontab(hour=3, minute=00),
+    },
+    'rebuild_blacklist_bloom_filter': {
+        'task': 'users.tasks.rebuild_blacklist_bloom_filter',
+        'schedule': crontab(minute='*/10'),
+    },
+    'rebuild_taken_logins_bloom_filter': {
+        'task': 'users.tasks.rebuild_taken_logins_bloom_filter',
+        'schedule': crontab(minute='*/10'),
     },
 
 }
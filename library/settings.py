@@ -101,14 +101,54 @@ DATABASES = {
     }
 }
 
+# Cache
+# Shared between the api and celery processes, so that the invalidations done
+# by one of them are seen by all. Without CACHE_URL each process keeps its own,
+# only fit for development: `check --deploy` (run by entrypoint.sh) fails.
+CACHE_URL = os.environ.get('CACHE_URL')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+    } if CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Notifications stream (see management/streams.py). Its redis pub/sub URL,
+# `NOTIFICATIONS_PUBSUB_URL`, is set with the celery settings.
+# Seconds between the comments sent on an idle stream. Without the pub/sub, or
+# while its subscription is down, the stream also looks for new notifications
+# then.
+NOTIFICATIONS_STREAM_HEARTBEAT = float(os.environ.get('NOTIFICATIONS_STREAM_HEARTBEAT', 20))
+# Milliseconds that the browser waits before reconnecting.
+NOTIFICATIONS_STREAM_RETRY_MS = 5000
+
+# Days that read notifications, and completed or canceled reservations, stay
+# in their tables before being moved to the archive ones (see
+# `management.tasks.archive_notifications` and `archive_reservations`).
+NOTIFICATION_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_RETENTION_DAYS', 90))
+RESERVATION_RETENTION_DAYS = int(os.environ.get('RESERVATION_RETENTION_DAYS', 365))
+
+# Staged migration of the varchar foreign keys (username/slug) to integer keys
+# (`<name>_ref`). Turn on only once `backfill_integer_keys --verify` reports no
+# missing rows; see core/management/commands/backfill_integer_keys.py.
+INTEGER_KEY_READS = bool(int(os.environ.get('INTEGER_KEY_READS', 0)))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 AUTH_USER_MODEL = 'users.User'
 AUTHENTICATION_BACKENDS = [
-    'django.contrib.auth.backends.ModelBackend',
     'users.authbackends.MyUserBackend',
 ]
 
+# Seconds that a login without an active user is remembered as missing.
+AUTH_MISSING_LOGIN_TIMEOUT = int(os.environ.get('AUTH_MISSING_LOGIN_TIMEOUT', 60))
+
+# Seconds that the user resolved from an access token is kept in the cache.
+AUTH_USER_CACHE_TIMEOUT = int(os.environ.get('AUTH_USER_CACHE_TIMEOUT', 300))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -147,6 +187,17 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "mediafiles"
 
+# Media files are named by the hash of their content, so nginx can serve them
+# with a far-future "immutable" Cache-Control.
+STORAGES = {
+    "default": {
+        "BACKEND": "core.storage.ContentAddressedStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -168,7 +219,7 @@ REST_FRAMEWORK = {
 
     'DEFAULT_AUTHENTICATION_CLASSES': (
 
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
@@ -208,7 +259,7 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
 
     "TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainPairSerializer",
-    "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "users.serializers.CustomTokenRefreshSerializer",
     "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
     "TOKEN_BLACKLIST_SERIALIZER": "rest_framework_simplejwt.serializers.TokenBlacklistSerializer",
     "SLIDING_TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainSlidingSerializer",
@@ -222,10 +273,33 @@ CORS_ORIGIN_WHITELIST = list(os.environ.get(
 CSRF_TRUSTED_ORIGINS = list(os.environ.get('CSRF_TRUSTED_ORIGINS').split(','))
 
 # -----CELERY SETTINGS---------------
-CELERY_BROKER_URL = 'redis://redis:6379/0'
-CELERY_RESULT_BACKEND = 'redis://redis:6379/0'
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://redis:6379/0')
+CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'redis://redis:6379/0')
 CELERY_ACCEPT_CONTENT = ['application/json',]
 
+# The redis pub/sub that wakes the notification streams of every ASGI process,
+# the broker one unless given. Set it empty to only wake the streams of the
+# process that created the notification (development and tests).
+NOTIFICATIONS_PUBSUB_URL = os.environ.get('NOTIFICATIONS_PUBSUB_URL', CELERY_BROKER_URL)
+
+# Queues: `interactive` for the work a user is waiting for, `email` for the
+# mails and `batch` (default) for the scheduled and bulk jobs. Each queue has
+# its own worker, with its own concurrency (see docker-compose.yml), so a long
+# nightly run never delays an activation email.
+CELERY_TASK_DEFAULT_QUEUE = 'batch'
+CELERY_TASK_ROUTES = {
+    'core.tasks.dispatch_outbox_events': {'queue': 'interactive'},
+    'management.tasks.notifications_as_read': {'queue': 'interactive'},
+    'management.tasks.apply_credits': {'queue': 'interactive'},
+    'management.tasks.promote_waitlist': {'queue': 'interactive'},
+    'users.tasks.send_email': {'queue': 'email'},
+    'users.tasks.send_queued_emails': {'queue': 'email'},
+    'management.tasks.send_notification_digests': {'queue': 'email'},
+}
+# Reserve one message per process at a time, so a worker busy with a long
+# task does not hold messages that an idle one could run.
+CELERY_WORKER_PREFETCH_MULTIPLIER = int(os.environ.get('CELERY_WORKER_PREFETCH_MULTIPLIER', 1))
+
 CELERY_TIME_ZONE = 'America/Argentina/Cordoba'
 
 # CELERY BEAT Settings
@@ -233,6 +307,10 @@ CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
 
 # DRF Spectacular
 
+# Served by `schema/` (and so `docs/`) unless DEBUG. Regenerated on startup
+# by `entrypoint.sh` with `manage.py spectacular --file schema.yml`.
+SCHEMA_FILE = BASE_DIR / 'schema.yml'
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Library Management System RESTful API',
     'DESCRIPTION': """
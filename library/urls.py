@@ -19,7 +19,9 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+from drf_spectacular.views import SpectacularSwaggerView
+
+from core.views import CachedSpectacularAPIView
 
 
 urlpatterns = [
@@ -28,7 +30,7 @@ urlpatterns = [
     path('', include('users.routers')),
     path('', include('books.routers')),
     path('', include('management.routers')),
-    path('schema/', SpectacularAPIView.as_view(), name='schema'),
+    path('schema/', CachedSpectacularAPIView.as_view(), name='schema'),
     path('docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='docs')
 
 ]
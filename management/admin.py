@@ -1,5 +1,24 @@
 from django.contrib import admin
-from .models import Reservation, Credit, Strike, Penalty, StrikeGroup, Notification
+from .models import (
+    Reservation, Credit, Strike, Penalty, StrikeGroup, Notification, NotificationWatermark,
+    ArchivedReservation, ArchivedNotification, WaitlistEntry, CreditTransaction
+)
+
+
+class CreditTransactionAdmin(admin.ModelAdmin):
+    """Written only with the balance (`grant_credits`, `spend_credits`)."""
+    list_display = ['user', 'amount', 'reason', 'reservation_id', 'created_at']
+    list_filter = ['reason']
+    readonly_fields = [field.name for field in CreditTransaction._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 
 admin.site.register(Reservation)
@@ -8,3 +27,8 @@ admin.site.register(Strike)
 admin.site.register(Penalty)
 admin.site.register(StrikeGroup)
 admin.site.register(Notification)
+admin.site.register(NotificationWatermark)
+admin.site.register(ArchivedReservation)
+admin.site.register(ArchivedNotification)
+admin.site.register(WaitlistEntry)
+admin.site.register(CreditTransaction, CreditTransactionAdmin)
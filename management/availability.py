@@ -0,0 +1,181 @@
+"""
+Availability of the copies of a book.
+
+A book can be reserved for a period while, on every day of it, the active
+reservations of the book are fewer than its active copies. Periods include
+both dates, so a sweep line over the events `(start_date, +1)` and
+`(end_date + 1 day, -1)` of the reservations gives the occupancy of every day
+with one query and a sort, whatever the length of the periods.
+
+Each reservation holds a concrete copy, assigned when it is booked. When no
+copy is free for the whole period but the sweep shows there is room, the
+confirmed reservations (their copy is still on the shelf) are moved between
+copies to make it fit.
+"""
+from datetime import date, timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from books.models import BookCopy
+
+from .models import Reservation
+
+
+ACTIVE_RESERVATION_STATUSES = Reservation.ACTIVE_STATUSES
+# The copy of these was handed to (or prepared for) the reader, it can not change.
+PINNED_RESERVATION_STATUSES = ['available', 'retired', 'expired']
+
+
+def active_reservations(book, start_date=None, end_date=None):
+    reservations = Reservation.objects.filter(
+        book=book, status__in=ACTIVE_RESERVATION_STATUSES)
+    if start_date:
+        reservations = reservations.filter(end_date__gte=start_date)
+    if end_date:
+        reservations = reservations.filter(start_date__lte=end_date)
+    return reservations
+
+
+def active_copies(book):
+    return list(BookCopy.objects.filter(book_id=book.pk, is_active=True)
+                .order_by('number').values_list('pk', flat=True))
+
+
+def occupancy(periods):
+    """
+    Sweep line over `(start_date, end_date)` periods: yield `(day, amount)`
+    on every day the amount of overlapping periods changes, in order.
+    """
+    events = []
+    for start_date, end_date in periods:
+        events.append((start_date, 1))
+        events.append((end_date + timedelta(days=1), -1))
+    # Sorted by day only, the changes of a day are summed before yielding.
+    events.sort(key=itemgetter(0))
+
+    amount = 0
+    for day, changes in groupby(events, key=itemgetter(0)):
+        amount += sum(change for _, change in changes)
+        yield day, amount
+
+
+def fully_booked_periods(periods, capacity):
+    """Merged `(start_date, end_date)` spans in which every copy is taken."""
+    spans = []
+    span_start = None
+    for day, amount in occupancy(periods):
+        if amount >= capacity and span_start is None:
+            span_start = day
+        elif amount < capacity and span_start is not None:
+            spans.append((span_start, day - timedelta(days=1)))
+            span_start = None
+    return spans
+
+
+def _clip(periods, start_date, end_date):
+    return [(max(start, start_date), min(end, end_date)) for start, end in periods]
+
+
+def is_available(book, start_date, end_date):
+    """If a copy of `book` can be reserved from `start_date` to `end_date`."""
+    capacity = BookCopy.objects.filter(book_id=book.pk, is_active=True).count()
+    if not capacity:
+        return False
+
+    periods = list(active_reservations(book, start_date, end_date)
+                   .values_list('start_date', 'end_date'))
+    if len(periods) < capacity:
+        return True
+
+    return not fully_booked_periods(_clip(periods, start_date, end_date), capacity)
+
+
+def unavailable_periods(book, start_date=None):
+    """
+    Spans, from `start_date` (today by default) on, in which every copy of
+    `book` is reserved. A book without active copies is unavailable forever.
+    """
+    start_date = start_date or date.today()
+    capacity = BookCopy.objects.filter(book_id=book.pk, is_active=True).count()
+    if not capacity:
+        return [(start_date, date.max)]
+
+    periods = active_reservations(book, start_date).values_list('start_date', 'end_date')
+    return fully_booked_periods(_clip(periods, start_date, date.max), capacity)
+
+
+def _plan(reservations, copies):
+    """
+    Assign a copy to every reservation, as `{reservation id: copy id}`, or
+    return None if they do not fit. Pinned reservations keep their copy, the
+    others are placed in order of start date (greedy interval partitioning),
+    keeping their copy while it is free.
+    """
+    busy = {copy_id: [] for copy_id in copies}
+    plan = {}
+
+    def is_pinned(reservation):
+        return (reservation['status'] in PINNED_RESERVATION_STATUSES
+                and reservation['copy_id'] in busy)
+
+    def is_free(copy_id, reservation):
+        return all(end < reservation['start_date'] or start > reservation['end_date']
+                   for start, end in busy[copy_id])
+
+    movable = []
+    for reservation in reservations:
+        if is_pinned(reservation):
+            plan[reservation['id']] = reservation['copy_id']
+            busy[reservation['copy_id']].append(
+                (reservation['start_date'], reservation['end_date']))
+        else:
+            movable.append(reservation)
+
+    for reservation in sorted(movable, key=itemgetter('start_date', 'end_date')):
+        free = [copy_id for copy_id in copies if is_free(copy_id, reservation)]
+        if not free:
+            return None
+
+        copy_id = reservation['copy_id'] if reservation['copy_id'] in free else free[0]
+        plan[reservation['id']] = copy_id
+        busy[copy_id].append((reservation['start_date'], reservation['end_date']))
+
+    return plan
+
+
+def allocate_copy(book, start_date, end_date):
+    """
+    Pick the copy of `book` for a new reservation from `start_date` to
+    `end_date`, moving confirmed reservations to other copies if needed.
+    Returns its pk, or None if the book is not available in the period.
+
+    Must run under the lock of the book (see `lock_book`).
+    """
+    copies = active_copies(book)
+    if not copies:
+        return None
+
+    overlapping = list(active_reservations(book, start_date, end_date).values('copy_id'))
+    taken = {reservation['copy_id'] for reservation in overlapping}
+    if None not in taken:
+        for copy_id in copies:
+            if copy_id not in taken:
+                return copy_id
+
+    # Every reservation that can still be moved takes part in the new plan.
+    reservations = list(active_reservations(book, min(start_date, date.today())).values(
+        'id', 'start_date', 'end_date', 'status', 'copy_id'))
+    plan = _plan(reservations + [{
+        'id': None, 'start_date': start_date, 'end_date': end_date,
+        'status': 'confirmed', 'copy_id': None,
+    }], copies)
+    if plan is None:
+        return None
+
+    moved = [
+        Reservation(id=reservation['id'], copy_id=plan[reservation['id']])
+        for reservation in reservations if plan[reservation['id']] != reservation['copy_id']
+    ]
+    Reservation.objects.bulk_update(moved, ['copy'])
+
+    return plan[None]
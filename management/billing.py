@@ -0,0 +1,102 @@
+"""
+Prices of the reservations computed by the database, many rows per statement.
+
+The same rules as `calculate_initial_price` and `calculate_penalty_price`
+(`PRICE_PER_DAY` for each day of the period, both included, and
+`PENALTY_PER_DAY` for each day returned late), written as SQL expressions
+over the columns so a batch is one `UPDATE`, with `DECIMAL` arithmetic.
+"""
+from datetime import date
+
+from django.db.models import DecimalField, F, Func, IntegerField, Q, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Reservation
+from .utils_models import PENALTY_PER_DAY, PRICE_PER_DAY
+
+
+PRICE_FIELD = DecimalField(max_digits=10, decimal_places=2)
+
+
+class DaysBetween(Func):
+    """Whole days from the `start` date to the `end` date, `end - start`."""
+    output_field = IntegerField()
+
+    def __init__(self, end, start, **extra):
+        super().__init__(end, start, **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, template='(%(expressions)s)',
+                              arg_joiner=' - ', **extra_context)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function='DATEDIFF', **extra_context)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection, template='CAST(julianday(%(expressions)s) AS INTEGER)',
+            arg_joiner=') - julianday(', **extra_context)
+
+
+def _price(days, per_day):
+    return Func(days, Value(per_day, output_field=PRICE_FIELD), template='(%(expressions)s)',
+                arg_joiner=' * ', output_field=PRICE_FIELD)
+
+
+def initial_price_expression():
+    return _price(DaysBetween(F('end_date'), F('start_date')) + 1, PRICE_PER_DAY)
+
+
+def penalty_price_expression(until=None):
+    """
+    Penalty of returning on `returned_date` or, for the books still out, on
+    `until` (by default, they pay none yet).
+    """
+    returned_date = F('returned_date') if until is None else \
+        Coalesce(F('returned_date'), Value(until))
+    late_days = Greatest(DaysBetween(returned_date, F('end_date')), Value(0))
+    return Coalesce(_price(late_days, PENALTY_PER_DAY), Value(0, output_field=PRICE_FIELD),
+                    output_field=PRICE_FIELD)
+
+
+def bill_reservations(queryset):
+    """
+    Recompute the initial, penalty and final prices of the reservations of
+    `queryset`, in one statement. Returns the amount of rows billed.
+    """
+    initial_price = initial_price_expression()
+    penalty_price = penalty_price_expression()
+
+    # The final price repeats the expressions, the columns referenced in a
+    # SET do not hold the new values on every backend.
+    return queryset.update(
+        initial_price=initial_price,
+        penalty_price=penalty_price,
+        final_price=initial_price_expression() + penalty_price_expression(),
+    )
+
+
+def bill_waiting_payment():
+    """
+    Bill the `waiting_payment` reservations without a final price yet. The
+    billed ones stay in that status, and their prices (maybe corrected by an
+    admin) are not computed again.
+    """
+    return bill_reservations(Reservation.objects.filter(
+        status='waiting_payment', final_price__isnull=True))
+
+
+def accrue_penalties(today=None):
+    """
+    Running penalty of the `expired` reservations, as if their book was
+    returned `today`, in one statement. Returns the amount of rows updated.
+    """
+    today = today or date.today()
+    penalty_price = penalty_price_expression(until=today)
+
+    return Reservation.objects.filter(
+        Q(status='expired') & Q(end_date__lt=today)
+    ).update(
+        penalty_price=penalty_price,
+        final_price=F('initial_price') + penalty_price_expression(until=today),
+    )
@@ -0,0 +1,106 @@
+import datetime
+import random
+import threading
+import time
+import uuid
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+
+from books.models import Book, Genre
+from users.models import User
+
+from ...availability import fully_booked_periods
+from ...models import Reservation
+from ...utils import book_reservation
+
+
+class Command(BaseCommand):
+    help = 'Book the same periods of a few throwaway books from parallel threads, ' \
+        'report the throughput and check that no period was booked twice.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads', type=int, default=8,
+            help='Parallel clients.')
+        parser.add_argument(
+            '--attempts', type=int, default=200,
+            help='Booking attempts, split between the threads.')
+        parser.add_argument(
+            '--books', type=int, default=2,
+            help='Books competed for.')
+
+    def handle(self, *args, **options):
+        if min(options['threads'], options['attempts'], options['books']) <= 0:
+            raise CommandError('--threads, --attempts and --books must be bigger than 0.')
+
+        handle = uuid.uuid4().hex[:12]
+        user = User.objects.create_user(
+            first_name='Benchmark', last_name='Booking', username=f'bench-{handle}',
+            email=f'bench-{handle}@example.com', password=uuid.uuid4().hex, is_active=True
+        )
+        genre = Genre.objects.create(name=f'Benchmark {handle}')
+        books = [
+            Book.objects.create(
+                title=f'Benchmark {handle} {i}', language='en', genre=genre,
+                publication_date=datetime.date(2000, 1, 1))
+            for i in range(options['books'])
+        ]
+
+        try:
+            self.run(user, books, options['threads'], options['attempts'])
+        finally:
+            Book.all_objects.filter(pk__in=[book.pk for book in books]).delete()
+            genre.delete()
+            user.delete()
+
+    def run(self, user, books, threads, attempts):
+        first_day = datetime.date.today() + datetime.timedelta(days=1)
+        # Few overlapping periods, so most attempts compete for the same rows.
+        periods = [
+            (first_day + datetime.timedelta(days=start), first_day + datetime.timedelta(days=start + 3))
+            for start in range(0, 20, 2)
+        ]
+        counts = {'booked': 0, 'conflict': 0, 'error': 0}
+        lock = threading.Lock()
+
+        def client(amount):
+            try:
+                for _ in range(amount):
+                    start_date, end_date = random.choice(periods)
+                    try:
+                        book_reservation(user, random.choice(books), start_date, end_date)
+                        outcome = 'booked'
+                    except ValidationError:
+                        outcome = 'conflict'
+                    except DatabaseError:
+                        outcome = 'error'
+                    with lock:
+                        counts[outcome] += 1
+            finally:
+                connection.close()
+
+        workers = [
+            threading.Thread(target=client, args=(attempts // threads + (i < attempts % threads),))
+            for i in range(threads)
+        ]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        # Periods in which a book has more reservations than copies.
+        double_bookings = 0
+        for book in books:
+            capacity = book.copies.filter(is_active=True).count()
+            periods = Reservation.objects.filter(book=book).values_list('start_date', 'end_date')
+            double_bookings += len(fully_booked_periods(periods, capacity + 1))
+
+        self.stdout.write(
+            f'{attempts} attempts from {threads} threads in {elapsed:.2f}s: '
+            f'{attempts / elapsed:.1f} bookings/sec, {counts["booked"]} booked, '
+            f'{counts["conflict"]} conflicts, {counts["error"]} errors, '
+            f'{double_bookings} double bookings.')
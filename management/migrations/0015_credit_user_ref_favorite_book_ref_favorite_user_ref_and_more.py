@@ -0,0 +1,57 @@
+# Generated by Django 4.2.9 on 2026-10-19 07:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0006_book_genre_ref'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('management', '0014_alter_credit_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='credit',
+            name='user_ref',
+            field=models.ForeignKey(blank=True, editable=False, help_text='Integer key replacing `user`.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='favorite',
+            name='book_ref',
+            field=models.ForeignKey(blank=True, editable=False, help_text='Integer key replacing `book`.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='books.book'),
+        ),
+        migrations.AddField(
+            model_name='favorite',
+            name='user_ref',
+            field=models.ForeignKey(blank=True, editable=False, help_text='Integer key replacing `user`.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='user_ref',
+            field=models.ForeignKey(blank=True, editable=False, help_text='Integer key replacing `user`.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='penalty',
+            name='user_ref',
+            field=models.ForeignKey(blank=True, editable=False, help_text='Integer key replacing `user`.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='book_ref',
+            field=models.ForeignKey(blank=True, editable=False, help_text='Integer key replacing `book`.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='books.book'),
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='user_ref',
+            field=models.ForeignKey(blank=True, editable=False, help_text='Integer key replacing `user`.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='strikegroup',
+            name='user_ref',
+            field=models.ForeignKey(blank=True, editable=False, help_text='Integer key replacing `user`.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.9 on 2026-10-19 08:18
+
+from datetime import datetime, time, timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def start_of_day(day, days_after=0):
+    return timezone.make_aware(datetime.combine(day + timedelta(days=days_after), time.min))
+
+
+def fill_next_transition_at(apps, schema_editor):
+    Reservation = apps.get_model('management', 'Reservation')
+    Penalty = apps.get_model('management', 'Penalty')
+
+    timers = [
+        (Reservation.objects.filter(status='confirmed'), 'start_date', 0),
+        (Reservation.objects.filter(status='available'), 'end_date', 0),
+        (Reservation.objects.filter(status='retired'), 'end_date', 1),
+        (Penalty.objects.filter(complete=False, end_date__isnull=False), 'end_date', 1),
+    ]
+    for rows, field, days_after in timers:
+        chunk = []
+        for row in rows.only('pk', field).iterator(chunk_size=1000):
+            row.next_transition_at = start_of_day(getattr(row, field), days_after)
+            chunk.append(row)
+            if len(chunk) == 1000:
+                rows.model.objects.bulk_update(chunk, ['next_transition_at'])
+                chunk = []
+        rows.model.objects.bulk_update(chunk, ['next_transition_at'])
+
+
+def remove_nightly_sweeps(apps, schema_editor):
+    # The DatabaseScheduler keeps the entries removed from the beat schedule.
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+    PeriodicTask.objects.filter(name__in=[
+        'reservation_retired_to_expire',
+        'reservation_confirm_to_available',
+        'reservation_end_and_never_pickup',
+    ]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0015_credit_user_ref_favorite_book_ref_favorite_user_ref_and_more'),
+        ('django_celery_beat', '0018_improve_crontab_helptext'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='penalty',
+            name='next_transition_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, help_text='When the penalty must be completed, polled by `dispatch_due_transitions`.', null=True),
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='next_transition_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, help_text='When the status must advance, polled by `dispatch_due_transitions`.', null=True),
+        ),
+        migrations.RunPython(fill_next_transition_at, migrations.RunPython.noop),
+        migrations.RunPython(remove_nightly_sweeps, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.9 on 2026-10-19 09:04
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max, Min, Q
+import django.db.models.deletion
+
+
+CHUNK_SIZE = 1000
+
+
+def fill_watermarks(apps, schema_editor):
+    """
+    The watermark of each user is just under its oldest unread notification
+    (ids of other users in between do not matter), or its last notification
+    if every one is read. The `is_read` flags above it stay as overrides.
+    """
+    Notification = apps.get_model('management', 'Notification')
+    NotificationWatermark = apps.get_model('management', 'NotificationWatermark')
+    User = apps.get_model('users', 'User')
+
+    rows = list(Notification.objects.order_by().values('user_id').annotate(
+        last_id=Max('id'), first_unread_id=Min('id', filter=Q(is_read=False))))
+
+    for start in range(0, len(rows), CHUNK_SIZE):
+        chunk = rows[start:start + CHUNK_SIZE]
+        user_pks = dict(User.objects.filter(
+            username__in=[row['user_id'] for row in chunk]).values_list('username', 'pk'))
+
+        NotificationWatermark.objects.bulk_create([
+            NotificationWatermark(
+                user_id=user_pks[row['user_id']],
+                last_read_id=row['first_unread_id'] - 1 if row['first_unread_id'] else row['last_id'],
+            ) for row in chunk
+        ])
+
+
+def restore_is_read(apps, schema_editor):
+    Notification = apps.get_model('management', 'Notification')
+    NotificationWatermark = apps.get_model('management', 'NotificationWatermark')
+
+    for watermark in NotificationWatermark.objects.select_related('user').iterator():
+        Notification.objects.filter(
+            user_id=watermark.user.username, id__lte=watermark.last_read_id
+        ).update(is_read=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('management', '0016_reservation_penalty_next_transition_at'),
+        ('users', '0004_user_notification_digest'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='notification',
+            options={'ordering': ['-id']},
+        ),
+        migrations.CreateModel(
+            name='NotificationWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_id', models.PositiveBigIntegerField(default=0)),
+                ('last_read_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='notification_watermark', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(fill_watermarks, restore_is_read),
+    ]
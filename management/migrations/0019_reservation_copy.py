@@ -0,0 +1,34 @@
+# Generated by Django 4.2.9 on 2026-10-19 09:33
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def assign_first_copies(apps, schema_editor):
+    """Active reservations hold the only copy their book had."""
+    Reservation = apps.get_model('management', 'Reservation')
+    BookCopy = apps.get_model('books', 'BookCopy')
+
+    Reservation.objects.filter(
+        status__in=['confirmed', 'available', 'retired', 'expired']
+    ).update(copy=Subquery(
+        BookCopy.objects.filter(book__slug=OuterRef('book_id'), number=1).values('pk')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0007_bookcopy'),
+        ('management', '0018_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservation',
+            name='copy',
+            field=models.ForeignKey(blank=True, help_text='Copy assigned when the book was reserved.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reservations', to='books.bookcopy'),
+        ),
+        migrations.RunPython(assign_first_copies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.9 on 2026-10-19 10:07
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+CHUNK_SIZE = 1000
+
+
+def open_ledgers(apps, schema_editor):
+    """One `opening` entry per balance, so every ledger adds up to its balance."""
+    Credit = apps.get_model('management', 'Credit')
+    CreditTransaction = apps.get_model('management', 'CreditTransaction')
+
+    rows = list(Credit.objects.filter(amount__gt=0).values_list('user__pk', 'amount'))
+    for start in range(0, len(rows), CHUNK_SIZE):
+        CreditTransaction.objects.bulk_create([
+            CreditTransaction(user_id=user_id, amount=amount, reason='opening')
+            for user_id, amount in rows[start:start + CHUNK_SIZE]
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('management', '0020_waitlist'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CreditTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField()),
+                ('reason', models.CharField(choices=[('opening', 'Balance before the ledger'), ('compensation', 'Compensation for a canceled reservation'), ('spent', 'Spent')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('reservation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='management.reservation')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credit_transactions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.RunPython(open_ledgers, migrations.RunPython.noop),
+    ]
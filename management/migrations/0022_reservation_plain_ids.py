@@ -0,0 +1,52 @@
+# Generated by Django 4.2.9 on 2026-10-19 16:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    """
+    `CreditTransaction.reservation` and `WaitlistEntry.reservation` become
+    plain ids (`reservation_id`), so archiving a reservation no longer sets
+    them to NULL. The columns and their indexes stay, only the foreign key
+    constraints are dropped.
+    """
+
+    dependencies = [
+        ('management', '0021_credit_ledger'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='credittransaction',
+            name='reservation',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='management.reservation'),
+        ),
+        migrations.AlterField(
+            model_name='waitlistentry',
+            name='reservation',
+            field=models.OneToOneField(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='waitlist_entry', to='management.reservation'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveField(
+                    model_name='credittransaction',
+                    name='reservation',
+                ),
+                migrations.AddField(
+                    model_name='credittransaction',
+                    name='reservation_id',
+                    field=models.BigIntegerField(blank=True, db_index=True, null=True),
+                ),
+                migrations.RemoveField(
+                    model_name='waitlistentry',
+                    name='reservation',
+                ),
+                migrations.AddField(
+                    model_name='waitlistentry',
+                    name='reservation_id',
+                    field=models.BigIntegerField(blank=True, null=True, unique=True),
+                ),
+            ],
+        ),
+    ]
@@ -1,27 +1,53 @@
 from datetime import date
 
-from django.db import models
+from django.db import models, transaction
 from django.core.exceptions import ValidationError
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 
+from core.models import DirtyFieldsMixin, IntegerKeyDualWriteMixin
 from users.models import User
-from books.models import Book
+from books.models import Book, BookCopy
 
-from .utils_models import calculate_initial_price
+from .signals import reservation_released
+from .utils_models import calculate_initial_price, start_of_day
 
 
-class Favorite(models.Model):
+def schedule_transition(instance, fields, save_kwargs):
+    """
+    Recompute `next_transition_at` of a new instance or when any of `fields`
+    changed, adding it to `update_fields` when they are given.
+    """
+    if not instance._state.adding and not any(instance.has_changed(field) for field in fields):
+        return
+
+    instance.next_transition_at = instance.get_next_transition_at()
+
+    update_fields = save_kwargs.get('update_fields')
+    if update_fields is not None and 'next_transition_at' not in update_fields:
+        save_kwargs['update_fields'] = list(update_fields) + ['next_transition_at']
+
+
+class Favorite(IntegerKeyDualWriteMixin, models.Model):
     user = models.ForeignKey(User, to_field='username',
                              on_delete=models.CASCADE)
     book = models.ForeignKey(Book, to_field='slug', on_delete=models.CASCADE)
+    user_ref = models.ForeignKey(
+        User, null=True, blank=True, editable=False, related_name='+',
+        on_delete=models.CASCADE, help_text="Integer key replacing `user`.")
+    book_ref = models.ForeignKey(
+        Book, null=True, blank=True, editable=False, related_name='+',
+        on_delete=models.CASCADE, help_text="Integer key replacing `book`.")
+
+    integer_keys = {'user_ref': 'user', 'book_ref': 'book'}
+
     created_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ['user', 'book']
 
 
-class Reservation(models.Model):
+class Reservation(IntegerKeyDualWriteMixin, DirtyFieldsMixin, models.Model):
     STATUS_CHOICES = [
         ('canceled_user', 'Canceled by the user'),
         ('canceled_system', 'Canceled by the system'),
@@ -32,6 +58,8 @@ class Reservation(models.Model):
         ('waiting_payment', 'Waiting payment'),
         ('completed', 'Completed'),
     ]
+    ACTIVE_STATUSES = ['confirmed', 'available', 'retired', 'expired']
+    RELEASED_STATUSES = ['canceled_user', 'canceled_system', 'completed']
 
     user = models.ForeignKey(User, to_field='username',
                              on_delete=models.CASCADE)
@@ -51,26 +79,94 @@ class Reservation(models.Model):
 
     notes = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now=True)
+    user_ref = models.ForeignKey(
+        User, null=True, blank=True, editable=False, related_name='+',
+        on_delete=models.CASCADE, help_text="Integer key replacing `user`.")
+    book_ref = models.ForeignKey(
+        Book, null=True, blank=True, editable=False, related_name='+',
+        on_delete=models.CASCADE, help_text="Integer key replacing `book`.")
+    copy = models.ForeignKey(
+        BookCopy, null=True, blank=True, on_delete=models.SET_NULL,
+        related_name='reservations', help_text="Copy assigned when the book was reserved.")
+
+    next_transition_at = models.DateTimeField(
+        null=True, blank=True, db_index=True, editable=False,
+        help_text="When the status must advance, polled by `dispatch_due_transitions`.")
+
+    integer_keys = {'user_ref': 'user', 'book_ref': 'book'}
+
+    def get_next_transition_at(self):
+        if self.status == 'confirmed':
+            return start_of_day(self.start_date)
+        if self.status == 'available':
+            return start_of_day(self.end_date)
+        if self.status == 'retired':
+            return start_of_day(self.end_date, days_after=1)
+        return None
 
     def save(self, *args, **kwargs):
         if self.initial_price == None:
             self.initial_price = calculate_initial_price(
                 self.start_date, self.end_date)
 
-        return super().save(*args, **kwargs)
+        schedule_transition(self, ['status', 'start_date', 'end_date'], kwargs)
+
+        # Canceled or returned before its end, the rest of the period is free.
+        released = self.has_changed('status') and self.status in self.RELEASED_STATUSES \
+            and self._loaded_values['status'] in self.ACTIVE_STATUSES
+        if not released:
+            return super().save(*args, **kwargs)
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            reservation_released.send(sender=Reservation, reservations=[self])
 
     def __str__(self) -> str:
         return f'{self.user}, reserve the book {self.book} from {self.start_date} to {self.end_date}. Status, {self.status}'
 
-class Credit(models.Model):
+class Credit(IntegerKeyDualWriteMixin, DirtyFieldsMixin, models.Model):
+    """
+    Balance of the credits of a user, the sum of its `CreditTransaction`s.
+    Only changed through `grant_credits` and `spend_credits`, which write
+    both at once.
+    """
     user = models.OneToOneField(User, to_field='username',
                                 on_delete=models.CASCADE)
     amount = models.PositiveIntegerField(default=0)
+    user_ref = models.ForeignKey(
+        User, null=True, blank=True, editable=False, related_name='+',
+        on_delete=models.CASCADE, help_text="Integer key replacing `user`.")
+
+    integer_keys = {'user_ref': 'user'}
 
     def __str__(self):
         return f'{self.user}, {self.amount}.'
 
 
+class CreditTransaction(models.Model):
+    """Append-only ledger of the credits given (positive) and spent (negative)."""
+    REASON_CHOICES = [
+        ('opening', 'Balance before the ledger'),
+        ('compensation', 'Compensation for a canceled reservation'),
+        ('spent', 'Spent'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='credit_transactions')
+    amount = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    # A plain id, not a foreign key: the reservation may have been moved to
+    # `ArchivedReservation`, which keeps its id.
+    reservation_id = models.BigIntegerField(null=True, blank=True, db_index=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-id']
+
+    def __str__(self):
+        return f'{self.user}, {self.amount:+d} ({self.reason}).'
+
+
 class Strike(models.Model):
     reservation = models.OneToOneField(Reservation, on_delete=models.CASCADE)
     reason = models.TextField()
@@ -79,9 +175,15 @@ class Strike(models.Model):
         return f'{self.reservation.user} on reservation {self.reservation.id}.'
 
 
-class Penalty(models.Model):
+class Penalty(IntegerKeyDualWriteMixin, DirtyFieldsMixin, models.Model):
     user = models.ForeignKey(User, to_field='username',
                              on_delete=models.CASCADE)
+    user_ref = models.ForeignKey(
+        User, null=True, blank=True, editable=False, related_name='+',
+        on_delete=models.CASCADE, help_text="Integer key replacing `user`.")
+
+    integer_keys = {'user_ref': 'user'}
+
     start_date = models.DateField(default=date.today)
     end_date = models.DateField(
         default=date.today, null=True, blank=True,
@@ -89,6 +191,19 @@ class Penalty(models.Model):
     )
 
     complete = models.BooleanField(default=False)
+    next_transition_at = models.DateTimeField(
+        null=True, blank=True, db_index=True, editable=False,
+        help_text="When the penalty must be completed, polled by `dispatch_due_transitions`.")
+
+    def get_next_transition_at(self):
+        if self.complete or not self.end_date:
+            return None
+        return start_of_day(self.end_date, days_after=1)
+
+    def save(self, *args, **kwargs):
+        schedule_transition(self, ['end_date', 'complete'], kwargs)
+
+        return super().save(*args, **kwargs)
 
     def __str__(self):
         if self.complete:
@@ -100,9 +215,15 @@ class Penalty(models.Model):
                 return f"{self.user.username} penalized forever."
 
 
-class StrikeGroup(models.Model):
+class StrikeGroup(IntegerKeyDualWriteMixin, models.Model):
     user = models.ForeignKey(User, to_field='username',
                              on_delete=models.CASCADE)
+    user_ref = models.ForeignKey(
+        User, null=True, blank=True, editable=False, related_name='+',
+        on_delete=models.CASCADE, help_text="Integer key replacing `user`.")
+
+    integer_keys = {'user_ref': 'user'}
+
     penalty = models.OneToOneField(
         Penalty, on_delete=models.CASCADE, null=True, blank=True)
     strikes = models.ManyToManyField(Strike, blank=True)
@@ -116,9 +237,15 @@ class StrikeGroup(models.Model):
         return f'Strikes for Penalty: {self.penalty}'
 
 
-class Notification(models.Model):
+class Notification(IntegerKeyDualWriteMixin, DirtyFieldsMixin, models.Model):
     user = models.ForeignKey(User, to_field='username',
                              on_delete=models.CASCADE)
+    user_ref = models.ForeignKey(
+        User, null=True, blank=True, editable=False, related_name='+',
+        on_delete=models.CASCADE, help_text="Integer key replacing `user`.")
+
+    integer_keys = {'user_ref': 'user'}
+
     title = models.CharField(max_length=250)
     message = models.TextField(null=True, blank=True)
 
@@ -126,14 +253,120 @@ class Notification(models.Model):
     object_id = models.PositiveBigIntegerField()
     content_object = GenericForeignKey('content_type', 'object_id')
 
+    # Read when `id` is at or below the watermark of the user
+    # (`NotificationWatermark`); above it, only the ones read out of order.
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now=True)
 
     class Meta:
+        # Follows the primary key inside the user index, no sort.
         ordering = [
-            'is_read',
-            '-created_at',
+            '-id',
         ]
 
     def __str__(self):
         return f"{self.user}, {self.title}"
+
+
+class NotificationWatermark(models.Model):
+    """
+    Every notification of `user` with id up to `last_read_id` is read, so
+    marking all as read is one row update whatever the amount.
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name='notification_watermark')
+    last_read_id = models.PositiveBigIntegerField(default=0)
+    last_read_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user}, read up to {self.last_read_id}"
+
+
+class WaitlistEntry(models.Model):
+    """
+    A user waiting for `book` to be free from `start_date` to `end_date`.
+    When a reservation of the book is released, the entries are promoted in
+    order of request (`created_at`): the first ones that fit are reserved.
+    """
+    STATUS_CHOICES = [
+        ('waiting', 'Waiting'),
+        ('promoted', 'Promoted to reservation'),
+        ('canceled', 'Canceled by the user'),
+        ('expired', 'Expired without a free copy'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='waitlist_entries')
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='waitlist_entries')
+    start_date = models.DateField()
+    end_date = models.DateField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='waiting')
+    # Plain id of the reservation it was promoted to, as in `CreditTransaction`.
+    reservation_id = models.BigIntegerField(null=True, blank=True, unique=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    promoted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['book', 'status', 'created_at'], name='waitlist_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} waits for {self.book} from {self.start_date} to {self.end_date}. Status, {self.status}"
+
+
+class ArchivedReservation(models.Model):
+    """
+    Reservation in a terminal status moved out of `Reservation` after
+    `RESERVATION_RETENTION_DAYS` (see `archive_terminal_reservations`). Keeps
+    the original id, and the book by value so it outlives the catalogue.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    book_slug = models.CharField(max_length=250, null=True, blank=True)
+    book_title = models.CharField(max_length=200)
+
+    start_date = models.DateField()
+    end_date = models.DateField()
+    status = models.CharField(max_length=20, choices=Reservation.STATUS_CHOICES)
+    returned_date = models.DateField(null=True, blank=True)
+    initial_price = models.DecimalField(max_digits=10, decimal_places=2)
+    penalty_price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True)
+    final_price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True)
+    notes = models.TextField(blank=True, null=True)
+
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-id']
+
+    def __str__(self):
+        return f'{self.user_id}, reserved the book {self.book_title} from {self.start_date} to {self.end_date}. Status, {self.status}'
+
+
+class ArchivedNotification(models.Model):
+    """
+    Read notification moved out of `Notification` after
+    `NOTIFICATION_RETENTION_DAYS`, or with its archived reservation.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+
+    title = models.CharField(max_length=250)
+    message = models.TextField(null=True, blank=True)
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveBigIntegerField()
+
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-id']
+
+    def __str__(self):
+        return f"{self.user_id}, {self.title}"
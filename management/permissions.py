@@ -1,4 +1,6 @@
 from rest_framework.permissions import BasePermission
+from core.utils import by_user
+
 from .models import Penalty
 
 
@@ -6,7 +8,7 @@ class IsUserNotPenalized(BasePermission):
     message = "You are not allowed to reserve a book at this time, there is a penalty in effect."
 
     def has_permission(self, request, view):
-        pen = Penalty.objects.filter(user=request.user, complete=False)
+        pen = Penalty.objects.filter(**by_user(request.user), complete=False)
         if pen.exists():
             return False
         else:
@@ -1,7 +1,7 @@
 from rest_framework.routers import SimpleRouter
 from .views import (
     FavoriteViewSet, ReservationViewSet, PenaltyViewSet,
-    StrikeViewSet, NotificationViewSet, CreditViewSet
+    StrikeViewSet, NotificationViewSet, CreditViewSet, WaitlistViewSet
 )
 
 router = SimpleRouter()
@@ -12,5 +12,6 @@ router.register(r'penalty', PenaltyViewSet, basename='penalty')
 router.register(r'strikes', StrikeViewSet, basename='strikes')
 router.register(r'credits', CreditViewSet, basename='credits')
 router.register(r'notification', NotificationViewSet, basename='notification')
+router.register(r'waitlist', WaitlistViewSet, basename='waitlist')
 
 urlpatterns = router.urls
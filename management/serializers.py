@@ -1,15 +1,22 @@
 from datetime import date
 from decimal import Decimal
 
-from django.db.models import Q
 from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
 from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 
 from books.models import Book
 from books.serializers import ListBookSerializer
-from .models import Favorite, Reservation, Credit, Strike, Penalty, StrikeGroup, Notification
-from .utils import calculate_penalty_price
+from .models import (
+    Favorite, Reservation, Credit, Strike, Penalty, StrikeGroup, Notification,
+    ArchivedReservation, ArchivedNotification, WaitlistEntry
+)
+from .availability import is_available
+from .utils import (
+    book_reservation, calculate_penalty_price, check_in_returns, spend_credits,
+    BULK_RETURN_MAX_ITEMS
+)
 
 
 class CreateFavoriteSerializer(serializers.ModelSerializer):
@@ -64,20 +71,49 @@ class CreateReservationSerializer(BaseReservationSerializer):
                 {'end_date': 'Must be after the start_date.'}
             )
 
-        # Check availability of the book on this period
-        overlapping_reservations = Reservation.objects.filter(
-            Q(book=book) &
-            Q(start_date__lte=end_date) &
-            Q(end_date__gte=start_date)
-        )
-
-        if overlapping_reservations.exists():
+        # Check availability of the book on this period. Only rejects early,
+        # `create` checks again under the lock of the book.
+        if book and start_date and end_date and not is_available(book, start_date, end_date):
             raise serializers.ValidationError(
                 {'book': 'This book is not available for the specified period.'}
             )
 
         return super().validate(attrs)
 
+    def create(self, validated_data):
+        try:
+            return book_reservation(**validated_data)
+        except ValidationError as e:
+            raise serializers.ValidationError(e.message_dict)
+
+
+class CheckInItemSerializer(serializers.Serializer):
+    reservation = serializers.IntegerField(required=False, min_value=1)
+    book = serializers.SlugField(required=False)
+    returned_date = serializers.DateField(required=False, default=date.today)
+
+    def validate_returned_date(self, value):
+        if value > date.today():
+            raise serializers.ValidationError(
+                {'returned_date': 'Can not be a future date.'}
+            )
+        return value
+
+    def validate(self, attrs):
+        if bool(attrs.get('reservation')) == bool(attrs.get('book')):
+            raise serializers.ValidationError(
+                {'reservation_or_book': 'Must have the reservation or the book, only one.'}
+            )
+        return attrs
+
+
+class CheckInSerializer(serializers.Serializer):
+    returns = serializers.ListField(
+        child=CheckInItemSerializer(), allow_empty=False, max_length=BULK_RETURN_MAX_ITEMS)
+
+    def create(self, validated_data):
+        return check_in_returns(validated_data['returns'])
+
 
 class ListReservationSerializer(BaseReservationSerializer):
     book = ListBookSerializer(read_only=True)
@@ -206,14 +242,11 @@ class CreditPatchSerializer(serializers.ModelSerializer):
 
     def update(self, instance: Credit, validated_data):
 
-        if instance.amount < validated_data['subtract']:
+        if spend_credits(instance.user, validated_data['subtract']) is None:
             raise serializers.ValidationError(
                 {'subtract': 'Not have enough credits to make the change.'}
             )
 
-        instance.amount -= validated_data['subtract']
-        instance.save()
-
         return instance
 
 
@@ -250,12 +283,18 @@ class ContentTypeSerializer(serializers.ModelSerializer):
 class NotificationSerializer(serializers.ModelSerializer):
     content_type = ContentTypeSerializer()
     content_object = serializers.SerializerMethodField()
+    is_read = serializers.SerializerMethodField()
 
     class Meta:
         model = Notification
         fields = ['id', 'title', 'message', 'is_read',
                   'created_at', 'content_type', 'content_object']
 
+    @extend_schema_field(serializers.BooleanField)
+    def get_is_read(self, obj):
+        # Pass `last_read_id`, the watermark of the user, in the context.
+        return obj.is_read or obj.id <= self.context.get('last_read_id', 0)
+
     @extend_schema_field(serializers.DictField,)
     def get_content_object(self, obj):
         model_name = obj.content_type.model
@@ -279,3 +318,54 @@ class NotificationSerializer(serializers.ModelSerializer):
         base_representation[f"{content_type['model']}"] = content_object
 
         return base_representation
+
+
+class ArchivedReservationSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = ArchivedReservation
+        exclude = ['user']
+
+
+class ArchivedNotificationSerializer(serializers.ModelSerializer):
+    type = serializers.CharField(source='content_type.model')
+
+    class Meta:
+        model = ArchivedNotification
+        fields = ['id', 'title', 'message', 'type', 'object_id',
+                  'created_at', 'archived_at']
+
+
+class WaitlistEntrySerializer(serializers.ModelSerializer):
+    book = serializers.SlugRelatedField(slug_field='slug', queryset=Book.objects.all())
+    reservation = serializers.IntegerField(source='reservation_id', read_only=True, allow_null=True)
+
+    class Meta:
+        model = WaitlistEntry
+        fields = ['id', 'book', 'start_date', 'end_date', 'status', 'reservation',
+                  'created_at', 'promoted_at']
+        read_only_fields = ['status', 'created_at', 'promoted_at']
+
+    def validate_start_date(self, value):
+        if value < date.today():
+            raise serializers.ValidationError(
+                {'start_date': 'Must be a future date.'}
+            )
+        return value
+
+    def validate(self, attrs):
+        start_date = attrs.get('start_date', None)
+        end_date = attrs.get('end_date', None)
+        book = attrs.get('book', None)
+
+        if start_date and end_date and start_date >= end_date:
+            raise serializers.ValidationError(
+                {'end_date': 'Must be after the start_date.'}
+            )
+
+        if book and start_date and end_date and is_available(book, start_date, end_date):
+            raise serializers.ValidationError(
+                {'book': 'This book is available for the specified period, reserve it instead.'}
+            )
+
+        return attrs
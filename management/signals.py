@@ -0,0 +1,10 @@
+from django.dispatch import Signal
+
+
+# Sent once the notifications are committed, with the pks of their users
+# (`user_ids`). `create_notification` and the outbox dispatcher send it.
+notifications_created = Signal()
+
+# Sent, inside their transaction, when active reservations are canceled or
+# completed (`reservations`). The waitlist listens to it.
+reservation_released = Signal()
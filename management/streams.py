@@ -0,0 +1,259 @@
+"""
+Server-Sent Events stream of the new notifications of a user.
+
+A raw ASGI app, mounted in `library/asgi.py`, so an open stream costs one
+coroutine waiting on an `asyncio.Event`: no thread, no query and no
+serialization until a notification of its user is committed. The wake up
+comes from `notifications_created`, published on the `NOTIFICATIONS_PUBSUB_URL`
+redis channel so that every ASGI process hears the notifications created by
+the celery workers. Without it, only the listeners of the same process are
+woken (development and tests). Without the pub/sub, or while its
+subscription is down, a wake up may be missed: then each heartbeat also looks
+for new notifications.
+
+Events carry the notification id, so a client that reconnects with
+`Last-Event-ID` receives what it missed.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.dispatch import receiver
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from core.utils import by_user
+from users.authentication import CachedJWTAuthentication
+
+from .models import Notification
+from .signals import notifications_created
+
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATIONS_CHANNEL = 'notifications'
+STREAM_BATCH_SIZE = 50
+
+
+class NotificationListeners:
+    """Open streams of this process, by user pk."""
+
+    def __init__(self):
+        self._listeners = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def add(self, user_id):
+        listener = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._listeners[user_id].add(listener)
+        return listener
+
+    def discard(self, user_id, listener):
+        with self._lock:
+            self._listeners[user_id].discard(listener)
+            if not self._listeners[user_id]:
+                del self._listeners[user_id]
+
+    def wake(self, user_ids):
+        """Thread safe, it is called from the request and worker threads."""
+        with self._lock:
+            listeners = [listener for user_id in user_ids
+                         for listener in self._listeners.get(user_id, ())]
+        for loop, event in listeners:
+            loop.call_soon_threadsafe(event.set)
+
+
+listeners = NotificationListeners()
+
+_publisher = None
+_subscribers = {}
+# Event loops whose redis subscription is up, their streams can not miss a
+# wake up.
+_subscribed = {}
+
+
+def _redis_publisher():
+    global _publisher
+    if _publisher is None:
+        import redis
+        _publisher = redis.Redis.from_url(settings.NOTIFICATIONS_PUBSUB_URL)
+    return _publisher
+
+
+async def _subscribe_forever():
+    import redis.asyncio as redis
+
+    loop = asyncio.get_running_loop()
+    while True:
+        client = redis.Redis.from_url(settings.NOTIFICATIONS_PUBSUB_URL)
+        try:
+            async with client.pubsub() as pubsub:
+                await pubsub.subscribe(NOTIFICATIONS_CHANNEL)
+                _subscribed[loop] = True
+                async for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        listeners.wake(json.loads(message['data']))
+        except (OSError, redis.RedisError):
+            # Streams catch up on their heartbeats meanwhile.
+            _subscribed[loop] = False
+            await asyncio.sleep(1)
+        finally:
+            await client.aclose()
+
+
+def ensure_subscribed():
+    """One redis subscription per process (event loop), shared by all streams."""
+    if not settings.NOTIFICATIONS_PUBSUB_URL:
+        return
+    loop = asyncio.get_running_loop()
+    if loop not in _subscribers:
+        _subscribers[loop] = loop.create_task(_subscribe_forever())
+
+
+def may_miss_wake_ups():
+    """True without the pub/sub, or while the subscription of this loop is down."""
+    return not (settings.NOTIFICATIONS_PUBSUB_URL
+                and _subscribed.get(asyncio.get_running_loop(), False))
+
+
+@receiver(notifications_created)
+def publish_notifications(sender, user_ids, **kwargs):
+    user_ids = sorted(set(user_ids))
+    if settings.NOTIFICATIONS_PUBSUB_URL:
+        import redis
+        try:
+            _redis_publisher().publish(NOTIFICATIONS_CHANNEL, json.dumps(user_ids))
+            return
+        except (OSError, redis.RedisError) as e:
+            # Sent on commit, the notifications are already saved: the other
+            # processes send them with the next notification of their users.
+            logger.warning('Notifications not published: %s', e)
+    listeners.wake(user_ids)
+
+
+def _authenticate(raw_token):
+    close_old_connections()
+    try:
+        authentication = CachedJWTAuthentication()
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+def _last_notification_id(user):
+    close_old_connections()
+    return Notification.objects.filter(**by_user(user)).order_by('-id').values_list(
+        'id', flat=True).first() or 0
+
+
+def _new_notifications(user, last_id):
+    close_old_connections()
+    notifications = Notification.objects.filter(
+        **by_user(user), id__gt=last_id
+    ).select_related('content_type').order_by('id')[:STREAM_BATCH_SIZE]
+
+    return [{
+        'id': notification.id,
+        'title': notification.title,
+        'message': notification.message,
+        'is_read': notification.is_read,
+        'created_at': notification.created_at.isoformat(),
+        'type': notification.content_type.model,
+        'object_id': notification.object_id,
+    } for notification in notifications]
+
+
+def _headers(scope):
+    return {name.decode('latin1').lower(): value.decode('latin1')
+            for name, value in scope.get('headers', [])}
+
+
+async def _send_response(send, status, body):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': json.dumps(body).encode()})
+
+
+async def notification_stream(scope, receive, send):
+    """
+    `GET /notification/stream/`, authenticated with the access token in the
+    `Authorization: Bearer` header or, for `EventSource`, the `token` query
+    parameter.
+    """
+    if scope['method'] != 'GET':
+        return await _send_response(send, 405, {'detail': 'Method not allowed.'})
+
+    headers = _headers(scope)
+    query = parse_qs(scope.get('query_string', b'').decode())
+
+    raw_token = None
+    if headers.get('authorization', '').startswith('Bearer '):
+        raw_token = headers['authorization'][len('Bearer '):]
+    elif query.get('token'):
+        raw_token = query['token'][0]
+
+    user = await sync_to_async(_authenticate)(raw_token) if raw_token else None
+    if user is None:
+        return await _send_response(
+            send, 401, {'detail': 'Authentication credentials were not provided or are invalid.'})
+
+    last_event_id = headers.get('last-event-id') or query.get('last_event_id', [''])[0]
+    if last_event_id.isdigit():
+        last_id = int(last_event_id)
+    else:
+        last_id = await sync_to_async(_last_notification_id)(user)
+
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [
+        (b'content-type', b'text/event-stream'),
+        (b'cache-control', b'no-cache'),
+        (b'x-accel-buffering', b'no'),
+    ]})
+    await send({'type': 'http.response.body',
+                'body': f'retry: {settings.NOTIFICATIONS_STREAM_RETRY_MS}\n\n'.encode(),
+                'more_body': True})
+
+    ensure_subscribed()
+    listener = listeners.add(user.pk)
+    _, woken = listener
+    disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+    try:
+        # The first pass sends what was missed since `Last-Event-ID`.
+        woken.set()
+        while not disconnected.done():
+            if woken.is_set():
+                woken.clear()
+                notifications = await sync_to_async(_new_notifications)(user, last_id)
+                for notification in notifications:
+                    last_id = notification['id']
+                    await send({'type': 'http.response.body', 'more_body': True, 'body': (
+                        f"id: {last_id}\nevent: notification\ndata: {json.dumps(notification)}\n\n"
+                    ).encode()})
+                if len(notifications) == STREAM_BATCH_SIZE:
+                    woken.set()
+                continue
+
+            wait = asyncio.ensure_future(woken.wait())
+            done, _ = await asyncio.wait(
+                [wait, disconnected], timeout=settings.NOTIFICATIONS_STREAM_HEARTBEAT,
+                return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # Keeps proxies from closing an idle connection.
+                await send({'type': 'http.response.body', 'body': b': heartbeat\n\n', 'more_body': True})
+                if may_miss_wake_ups():
+                    woken.set()
+            wait.cancel()
+    finally:
+        listeners.discard(user.pk, listener)
+        disconnected.cancel()
+
+
+async def _wait_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
@@ -3,28 +3,33 @@ from datetime import date
 from celery import shared_task
 from celery.utils.log import get_logger
 
+from django.db import transaction
 from django.db.models import Q
+from django.utils import timezone
 
-from .models import Reservation, Notification, Penalty, Credit
+from core.utils import OUTBOX_TASK_OPTIONS, by_user, consume_outbox_event, outbox_task
+from users.models import User
+from users.utils import send_queued_emails
+
+from . import billing, waitlist
+from .models import Reservation, Penalty, Credit
 from .utils import (
-    calculate_penalty_price, create_notification,
-    create_strike, add_strike_to_strike_group
+    calculate_penalty_price, outbox_notification, grant_credits,
+    advance_reservation, complete_penalty, end_never_picked_up_reservation,
+    expire_retired_reservation, make_reservation_available, mark_notifications_read,
+    queue_notification_digests, archive_read_notifications, archive_terminal_reservations,
+    ARCHIVE_CHUNK_SIZE
 )
 
 
 @shared_task
 def notifications_as_read(user, notifications):
     try:
+        user = User.objects.filter(username=user).first()
+        if user is None:
+            return f'No user. Task completed successfully.'
 
-        notis = Notification.objects.filter(
-            Q(id__in=notifications)
-        )
-        if notis.exists():
-            for noti in notis:
-
-                noti.is_read = True
-                noti.save()
-
+        if mark_notifications_read(user, notifications):
             return f'Task completed successfully.'
         return f'No noti. Task completed successfully.'
     except Exception as e:
@@ -46,32 +51,12 @@ def reservation_retired_to_expire():
 
     for r in res:
         try:
-            r.status = 'expired'
-            r.save()
+            with transaction.atomic():
+                res_to_cancel = expire_retired_reservation(r)
 
-            r.refresh_from_db()
-
-            strike = create_strike(
-                res=r,
-                reason=f'You must return the Book, {r.book} on {r.end_date}'
-            )
-
-            create_notification(
-                user=r.user,
-                title="Strike issued for not returning the book on time",
-                message=f"Dear {r.user}, a strike has been issued against your account due to the late return of the book {r.book}. "
-                        f"Remember that you reserved the book from {r.start_date} to {r.end_date}, "
-                        f"we remind you that for each day past the deadline you will be charged an extra $4.",
-                obj=strike
-            )
-
-            add_strike_to_strike_group(user=r.user, strike=strike)
-
-            res_to_cancel = Reservation.objects.filter(
-                book=r.book, start_date=today).first()
-
-            if res_to_cancel:
-                apply_credits.delay(reservation=res_to_cancel)
+                if res_to_cancel:
+                    outbox_task('management.tasks.apply_credits',
+                                reservation_id=res_to_cancel.pk)
 
         except Exception as e:
             some_fail = True
@@ -83,35 +68,52 @@ def reservation_retired_to_expire():
         return 'Task completed successfully.'
 
 
-@shared_task
-def apply_credits(reservation):
-    msg_note = f" The reservation was canceled by the system because other user" \
-        f" don't return the book, {reservation.book}, on time. We are going to compensate to" \
-        f" {reservation.user} give credits that can use for future reservation."
-
-    reservation.status = 'canceled_system'
-
-    if reservation.notes:
-        reservation.notes += msg_note
-    else:
-        reservation.notes = msg_note
-
-    credits, create = Credit.objects.get_or_create(user=reservation.user)
-
-    credits.amount += 4
-    credits.save()
-
-    noti_msg = f" Due to another user not returning their reserved book,{reservation.book} on time," \
-        f" you've been compensated with 4 credits. You can use these credits to reserve another book." \
-        f" Thank you for your understanding!"
-    create_notification(
-        user=reservation.user,
-        title='You receive Credits like compensation for Missed Reservation',
-        message=noti_msg,
-        obj=credits,
-    )
+@shared_task(**OUTBOX_TASK_OPTIONS)
+def apply_credits(reservation_id, outbox_event_id=None):
+    try:
+        with transaction.atomic():
+            # A redelivered message finds its event consumed and does nothing,
+            # so the credits are given once.
+            if outbox_event_id is not None and not consume_outbox_event(outbox_event_id):
+                return 'Already applied. Task completed successfully.'
+
+            reservation = Reservation.objects.select_for_update().select_related(
+                'book', 'user').filter(pk=reservation_id).first()
+            if reservation is None:
+                return 'No reservation. Task completed successfully.'
+
+            msg_note = f" The reservation was canceled by the system because other user" \
+                f" don't return the book, {reservation.book}, on time. We are going to compensate to" \
+                f" {reservation.user} give credits that can use for future reservation."
+
+            reservation.status = 'canceled_system'
+
+            if reservation.notes:
+                reservation.notes += msg_note
+            else:
+                reservation.notes = msg_note
+
+            reservation.save()
+
+            grant_credits(reservation.user, 4, 'compensation', reservation=reservation)
+            credits = Credit.objects.get(**by_user(reservation.user))
+
+            noti_msg = f" Due to another user not returning their reserved book,{reservation.book} on time," \
+                f" you've been compensated with 4 credits. You can use these credits to reserve another book." \
+                f" Thank you for your understanding!"
+            outbox_notification(
+                user=reservation.user,
+                title='You receive Credits like compensation for Missed Reservation',
+                message=noti_msg,
+                obj=credits,
+            )
 
-    return 'Task Complete successfully.'
+        return 'Task Complete successfully.'
+    except Exception as e:
+        if outbox_event_id is not None:
+            # Rolled back with its event, the retry applies it.
+            raise
+        return f"Task Fail : {str(e)}"
 
 
 @shared_task
@@ -128,16 +130,8 @@ def reservation_confirm_to_available():
 
     for res in reservations:
         try:
-            res.status = 'available'
-            res.save()
-
-            create_notification(
-                user=res.user,
-                title="Book Available to be retire.",
-                message=f"Good news! Your reservation for the book {res.book} from {res.start_date} to {res.end_date} "
-                        f"is now available for pickup.",
-                obj=res
-            )
+            with transaction.atomic():
+                make_reservation_available(res)
 
         except Exception as e:
             some_fail = True
@@ -163,15 +157,7 @@ def reservation_end_and_never_pickup():
 
     for r in res:
         try:
-            r.status = 'waiting_payment'
-            r.penalty_price = 0.0
-            r.final_price = r.initial_price
-            r.notes = f"The reservation of the book {r.book} made from {r.start_date} to " \
-                f"{r.end_date} ended. Even though you never picked up the book, " \
-                f"you must still pay the amount since you deprived another user " \
-                f"of purchasing it for this period of time."
-
-            r.save()
+            end_never_picked_up_reservation(r)
 
         except Exception as e:
             some_fail = True
@@ -199,16 +185,8 @@ def completed_penalization():
 
     for pen in penalties:
         try:
-            pen.complete = True
-            pen.save()
-
-            create_notification(
-                user=pen.user,
-                title="Penalization Ended.",
-                message=f"Good news {pen.user}! The penalization period has ended. "
-                        f"You are now free from any associated restrictions.",
-                obj=pen
-            )
+            with transaction.atomic():
+                complete_penalty(pen)
 
         except Exception as e:
             some_fail = True
@@ -218,3 +196,214 @@ def completed_penalization():
         return {'message': 'Task finish with errors.', 'errors': errors}
     else:
         return 'Task completed successfully.'
+
+
+@shared_task
+def transition_reservation(reservation_id):
+    try:
+        with transaction.atomic():
+            reservation = Reservation.objects.select_for_update().filter(
+                pk=reservation_id).first()
+            if reservation is None:
+                return 'No reservation. Task completed successfully.'
+
+            res_to_cancel = advance_reservation(reservation)
+
+            if res_to_cancel:
+                outbox_task('management.tasks.apply_credits',
+                            reservation_id=res_to_cancel.pk)
+
+            # Put the timer back for the next transition (the dispatcher
+            # cleared it), also when nothing was due yet.
+            Reservation.objects.filter(pk=reservation.pk).update(
+                next_transition_at=reservation.get_next_transition_at())
+
+        return 'Task completed successfully.'
+    except Exception as e:
+        return f"Task Fail : {str(e)}"
+
+
+@shared_task
+def transition_penalty(penalty_id):
+    try:
+        with transaction.atomic():
+            penalty = Penalty.objects.select_for_update().filter(pk=penalty_id).first()
+            if penalty is None:
+                return 'No penalty. Task completed successfully.'
+
+            if not penalty.complete and penalty.end_date and penalty.end_date < date.today():
+                complete_penalty(penalty)
+
+            Penalty.objects.filter(pk=penalty.pk).update(
+                next_transition_at=penalty.get_next_transition_at())
+
+        return 'Task completed successfully.'
+    except Exception as e:
+        return f"Task Fail : {str(e)}"
+
+
+@shared_task
+def dispatch_due_transitions(limit=1000):
+    """
+    Enqueue one transition task per reservation or penalty whose timer
+    (`next_transition_at`, indexed) is due. Runs every minute.
+    """
+    try:
+        now = timezone.now()
+        dispatched = 0
+        for model, task in ((Reservation, transition_reservation), (Penalty, transition_penalty)):
+            ids = list(model.objects.filter(
+                next_transition_at__lte=now).values_list('pk', flat=True)[:limit])
+            if not ids:
+                continue
+
+            # Cleared so the next run does not enqueue them again.
+            model.objects.filter(pk__in=ids).update(next_transition_at=None)
+            for pk in ids:
+                task.delay(pk)
+            dispatched += len(ids)
+
+        return f'Task completed successfully. {dispatched} transitions dispatched.'
+    except Exception as e:
+        return f"Task Fail : {str(e)}"
+
+
+RECONCILE_CHUNK_SIZE = 500
+
+
+@shared_task
+def reconcile_reservation_transitions(after_id=0, chunk_size=RECONCILE_CHUNK_SIZE):
+    """
+    Safety net for lost timers (failed tasks, rows written with `update()`):
+    enqueue the transition of the reservations overdue by status and dates.
+    Handles one chunk per run and enqueues itself for the next one, so the
+    batch worker interleaves other tasks.
+    """
+    try:
+        today = date.today()
+        ids = list(Reservation.objects.filter(
+            Q(status='confirmed', start_date__lte=today) |
+            Q(status='available', end_date__lte=today) |
+            Q(status='retired', end_date__lt=today),
+            pk__gt=after_id
+        ).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+
+        for pk in ids:
+            transition_reservation.delay(pk)
+
+        if len(ids) == chunk_size:
+            reconcile_reservation_transitions.delay(after_id=ids[-1], chunk_size=chunk_size)
+
+        return f'Task completed successfully. {len(ids)} transitions reconciled.'
+    except Exception as e:
+        return f"Task Fail : {str(e)}"
+
+
+@shared_task
+def reconcile_penalty_transitions(after_id=0, chunk_size=RECONCILE_CHUNK_SIZE):
+    try:
+        ids = list(Penalty.objects.filter(
+            complete=False, end_date__isnull=False, end_date__lt=date.today(),
+            pk__gt=after_id
+        ).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+
+        for pk in ids:
+            transition_penalty.delay(pk)
+
+        if len(ids) == chunk_size:
+            reconcile_penalty_transitions.delay(after_id=ids[-1], chunk_size=chunk_size)
+
+        return f'Task completed successfully. {len(ids)} transitions reconciled.'
+    except Exception as e:
+        return f"Task Fail : {str(e)}"
+
+
+@shared_task
+def send_notification_digests():
+    """
+    Daily digest of the unread notifications for the users that opted in,
+    sent in batches over one connection by the email queue.
+    """
+    try:
+        queued = queue_notification_digests()
+        result = send_queued_emails()
+
+        return f"Task completed successfully. {queued} digests queued, {result['sent']} emails sent."
+    except Exception as e:
+        return f"Task Fail : {str(e)}"
+
+
+@shared_task
+def archive_notifications(chunk_size=ARCHIVE_CHUNK_SIZE):
+    """
+    Move the read notifications past `NOTIFICATION_RETENTION_DAYS` to the
+    archive, one chunk per run, enqueuing itself while chunks come full.
+    """
+    try:
+        archived = archive_read_notifications(chunk_size=chunk_size)
+
+        if archived == chunk_size:
+            archive_notifications.delay(chunk_size=chunk_size)
+
+        return f'Task completed successfully. {archived} notifications archived.'
+    except Exception as e:
+        return f"Task Fail : {str(e)}"
+
+
+@shared_task
+def archive_reservations(chunk_size=ARCHIVE_CHUNK_SIZE):
+    try:
+        archived = archive_terminal_reservations(chunk_size=chunk_size)
+
+        if archived == chunk_size:
+            archive_reservations.delay(chunk_size=chunk_size)
+
+        return f'Task completed successfully. {archived} reservations archived.'
+    except Exception as e:
+        return f"Task Fail : {str(e)}"
+
+
+@shared_task(**OUTBOX_TASK_OPTIONS)
+def promote_waitlist(reservation_id, outbox_event_id=None):
+    try:
+        with transaction.atomic():
+            if outbox_event_id is not None and not consume_outbox_event(outbox_event_id):
+                return 'Already promoted. Task completed successfully.'
+
+            reservation = Reservation.objects.select_related('book').filter(
+                pk=reservation_id).first()
+            if reservation is None:
+                return 'No reservation. Task completed successfully.'
+
+            # Only the days still to come are freed.
+            start_date = max(reservation.start_date, date.today())
+            promoted = 0
+            if start_date <= reservation.end_date:
+                promoted = waitlist.promote_waitlist(
+                    reservation.book, start_date, reservation.end_date)
+
+        return f'Task completed successfully. {promoted} waitlist entries promoted.'
+    except Exception as e:
+        if outbox_event_id is not None:
+            raise
+        return f"Task Fail : {str(e)}"
+
+
+@shared_task
+def accrue_expired_penalties():
+    try:
+        accrued = billing.accrue_penalties()
+
+        return f'Task completed successfully. {accrued} penalties accrued.'
+    except Exception as e:
+        return f"Task Fail : {str(e)}"
+
+
+@shared_task
+def bill_waiting_payment_reservations():
+    try:
+        billed = billing.bill_waiting_payment()
+
+        return f'Task completed successfully. {billed} reservations billed.'
+    except Exception as e:
+        return f"Task Fail : {str(e)}"
@@ -0,0 +1,133 @@
+import datetime
+from unittest import mock
+
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+
+from core.test.test_setup import RegularUserAPITest
+
+from .factories import ReservationFactory
+from ..models import (
+    Reservation, Notification, ArchivedReservation, ArchivedNotification, CreditTransaction,
+    WaitlistEntry
+)
+from ..tasks import archive_notifications, archive_reservations
+from ..utils import (
+    archive_read_notifications, archive_terminal_reservations, create_notification,
+    create_strike, grant_credits, mark_all_notifications_read
+)
+
+
+@override_settings(NOTIFICATION_RETENTION_DAYS=30, RESERVATION_RETENTION_DAYS=60)
+class ArchiveTest(RegularUserAPITest, ReservationFactory):
+    def create_reservation(self, status, days_ago):
+        end_date = datetime.date.today() - datetime.timedelta(days=days_ago)
+        return Reservation.objects.create(
+            user=self.user, book=self.book(), status=status,
+            start_date=end_date - datetime.timedelta(days=3), end_date=end_date,
+            initial_price=10.00, final_price=10.00
+        )
+
+    def create_notification(self, days_ago, obj, is_read=False):
+        notification = create_notification(user=self.user, title='Notification', obj=obj)
+        Notification.objects.filter(pk=notification.pk).update(
+            created_at=timezone.now() - datetime.timedelta(days=days_ago), is_read=is_read)
+        return notification
+
+    def test_archive_read_old_notifications(self):
+        reservation = self.reservation_success(user=self.user)
+        old_read = self.create_notification(40, reservation, is_read=True)
+        old_unread = self.create_notification(40, reservation)
+        new_read = self.create_notification(5, reservation, is_read=True)
+
+        self.assertEqual(archive_read_notifications(), 1)
+
+        self.assertEqual(list(Notification.objects.values_list('id', flat=True)),
+                         [new_read.id, old_unread.id])
+        archived = ArchivedNotification.objects.get()
+        self.assertEqual(archived.id, old_read.id)
+        self.assertEqual(archived.user, self.user)
+        self.assertEqual(archived.object_id, reservation.id)
+
+    def test_archive_notifications_under_watermark(self):
+        reservation = self.reservation_success(user=self.user)
+        self.create_notification(40, reservation)
+        self.create_notification(40, reservation)
+        mark_all_notifications_read(self.user)
+
+        self.assertEqual(archive_read_notifications(), 2)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_archive_terminal_reservations(self):
+        completed = self.create_reservation('completed', 90)
+        canceled = self.create_reservation('canceled_user', 90)
+        recent = self.create_reservation('completed', 10)
+        waiting = self.create_reservation('waiting_payment', 90)
+        with_strike = self.create_reservation('completed', 90)
+        create_strike(res=with_strike, reason='Late.')
+        self.create_notification(1, completed)
+
+        self.assertEqual(archive_terminal_reservations(), 2)
+
+        self.assertEqual(set(Reservation.objects.values_list('id', flat=True)),
+                         {recent.id, waiting.id, with_strike.id})
+        archived = ArchivedReservation.objects.get(pk=completed.pk)
+        self.assertEqual(archived.book_slug, completed.book.slug)
+        self.assertEqual(archived.user, self.user)
+        self.assertTrue(ArchivedReservation.objects.filter(pk=canceled.pk).exists())
+        # Its notifications go with it, read or not.
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(ArchivedNotification.objects.get().object_id, completed.id)
+
+    def test_archive_keeps_ledger_and_waitlist_references(self):
+        canceled = self.create_reservation('canceled_system', 90)
+        grant_credits(self.user, 4, 'compensation', reservation=canceled)
+        entry = WaitlistEntry.objects.create(
+            user=self.user, book=canceled.book, start_date=canceled.start_date,
+            end_date=canceled.end_date, status='promoted', reservation_id=canceled.pk)
+
+        self.assertEqual(archive_terminal_reservations(), 1)
+
+        self.assertTrue(ArchivedReservation.objects.filter(pk=canceled.pk).exists())
+        self.assertEqual(CreditTransaction.objects.get(user=self.user).reservation_id, canceled.pk)
+        entry.refresh_from_db()
+        self.assertEqual(entry.reservation_id, canceled.pk)
+
+    def test_tasks_enqueue_next_chunk(self):
+        for _ in range(3):
+            self.create_reservation('completed', 90)
+
+        with mock.patch.object(archive_reservations, 'delay') as delay:
+            archive_reservations(chunk_size=2)
+        delay.assert_called_once_with(chunk_size=2)
+
+        with mock.patch.object(archive_reservations, 'delay') as delay:
+            archive_reservations(chunk_size=2)
+        delay.assert_not_called()
+
+        self.assertFalse(Reservation.objects.exists())
+        self.assertEqual(ArchivedReservation.objects.count(), 3)
+
+        with mock.patch.object(archive_notifications, 'delay') as delay:
+            self.assertIn('0 notifications archived', archive_notifications())
+        delay.assert_not_called()
+
+    def test_archive_endpoints(self):
+        reservation = self.create_reservation('completed', 90)
+        self.create_notification(40, reservation, is_read=True)
+        archive_terminal_reservations()
+
+        response = self.client.get(reverse('reservation-archive'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['id'], reservation.id)
+        self.assertEqual(response.data['results'][0]['status'], 'completed')
+
+        response = self.client.get(reverse('notification-archive'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['type'], 'reservation')
@@ -0,0 +1,148 @@
+import datetime
+
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework import status
+
+from books.models import BookCopy
+from core.test.test_setup import RegularUserAPITest
+
+from .factories import ReservationFactory
+from ..availability import (
+    allocate_copy, fully_booked_periods, is_available, occupancy, unavailable_periods
+)
+from ..models import Reservation
+from ..utils import book_reservation
+
+
+def day(offset):
+    return datetime.date.today() + datetime.timedelta(days=10 + offset)
+
+
+class SweepLineTest(SimpleTestCase):
+    def test_occupancy(self):
+        periods = [(day(0), day(4)), (day(2), day(6)), (day(5), day(6))]
+
+        self.assertEqual(list(occupancy(periods)), [
+            (day(0), 1), (day(2), 2), (day(5), 2), (day(7), 0)
+        ])
+
+    def test_back_to_back_periods_do_not_overlap(self):
+        periods = [(day(0), day(4)), (day(5), day(9))]
+
+        self.assertEqual(fully_booked_periods(periods, 2), [])
+        # Fully booked without a gap, one span.
+        self.assertEqual(fully_booked_periods(periods, 1), [(day(0), day(9))])
+
+    def test_fully_booked_spans_are_merged(self):
+        periods = [(day(0), day(4)), (day(2), day(8)), (day(5), day(9)), (day(12), day(13))]
+
+        self.assertEqual(fully_booked_periods(periods, 2), [(day(2), day(8))])
+
+
+class CopyAllocationTest(RegularUserAPITest, ReservationFactory):
+    def setUp(self):
+        super().setUp()
+        self.book_obj = self.book()
+        self.first_copy = self.book_obj.copies.get()
+        self.second_copy = BookCopy.objects.create(book=self.book_obj, number=2)
+
+    def reserve(self, start, end):
+        return book_reservation(self.user, self.book_obj, day(start), day(end))
+
+    def test_new_book_has_one_copy(self):
+        self.assertEqual(self.first_copy.number, 1)
+
+    def test_one_reservation_per_copy(self):
+        first = self.reserve(0, 5)
+        second = self.reserve(2, 7)
+
+        self.assertEqual({first.copy_id, second.copy_id},
+                         {self.first_copy.pk, self.second_copy.pk})
+        self.assertFalse(is_available(self.book_obj, day(3), day(4)))
+        self.assertTrue(is_available(self.book_obj, day(6), day(9)))
+        with self.assertRaises(ValidationError):
+            self.reserve(4, 6)
+
+    def test_confirmed_reservations_moved_to_fit(self):
+        first = self.reserve(0, 4)
+        later = self.reserve(7, 12)
+        middle = self.reserve(2, 5)
+        self.assertEqual(later.copy_id, self.first_copy.pk)
+        self.assertEqual(middle.copy_id, self.second_copy.pk)
+
+        # Each copy is busy at some day of it, but never both at once.
+        new = self.reserve(5, 9)
+
+        later.refresh_from_db()
+        self.assertEqual(new.copy_id, self.first_copy.pk)
+        self.assertEqual(later.copy_id, self.second_copy.pk)
+
+    def test_pinned_reservation_keeps_its_copy(self):
+        picked_up = self.reserve(0, 4)
+        Reservation.objects.filter(pk=picked_up.pk).update(status='retired')
+        self.reserve(2, 6)
+
+        self.assertIsNone(allocate_copy(self.book_obj, day(3), day(8)))
+        self.assertEqual(Reservation.objects.get(pk=picked_up.pk).copy_id, picked_up.copy_id)
+
+    def test_canceled_and_inactive_copies_ignored(self):
+        canceled = self.reserve(0, 4)
+        Reservation.objects.filter(pk=canceled.pk).update(status='canceled_user')
+        BookCopy.objects.filter(pk=self.second_copy.pk).update(is_active=False)
+
+        self.assertEqual(self.reserve(0, 4).copy_id, self.first_copy.pk)
+        self.assertFalse(is_available(self.book_obj, day(0), day(1)))
+
+    def test_reservation_without_copy_is_counted(self):
+        Reservation.objects.create(
+            user=self.user, book=self.book_obj, start_date=day(0), end_date=day(4),
+            initial_price=10.00)
+
+        self.reserve(0, 4)
+
+        self.assertFalse(is_available(self.book_obj, day(0), day(4)))
+        self.assertEqual(set(Reservation.objects.values_list('copy_id', flat=True)),
+                         {self.first_copy.pk, self.second_copy.pk})
+
+    def test_unavailable_periods(self):
+        self.reserve(0, 5)
+        self.reserve(3, 8)
+        self.reserve(12, 14)
+
+        self.assertEqual(unavailable_periods(self.book_obj), [(day(3), day(5))])
+
+        BookCopy.objects.filter(book=self.book_obj).update(is_active=False)
+        self.assertEqual(unavailable_periods(self.book_obj),
+                         [(datetime.date.today(), datetime.date.max)])
+
+
+class AvailabilityEndpointsTest(RegularUserAPITest, ReservationFactory):
+    def setUp(self):
+        super().setUp()
+        self.book_obj = self.book()
+        BookCopy.objects.create(book=self.book_obj, number=2)
+        book_reservation(self.user, self.book_obj, day(0), day(5))
+        book_reservation(self.user, self.book_obj, day(3), day(8))
+
+    def check(self, start, end):
+        return self.client.get(reverse('reservation-check-availability'), {
+            'book': self.book_obj.slug,
+            'start_date': day(start).isoformat(),
+            'end_date': day(end).isoformat(),
+        })
+
+    def test_check_availability(self):
+        self.assertTrue(self.check(6, 9).data['is_available'])
+        self.assertTrue(self.check(-5, 2).data['is_available'])
+        self.assertFalse(self.check(4, 6).data['is_available'])
+
+    def test_unavailable_periods_only_fully_booked(self):
+        response = self.client.get(
+            reverse('reservation-unavailable-periods'), {'book': self.book_obj.slug})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [
+            {'start_date': day(3).isoformat(), 'end_date': day(5).isoformat()}
+        ])
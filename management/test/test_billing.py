@@ -0,0 +1,94 @@
+import datetime
+from decimal import Decimal
+
+from core.test.test_setup import RegularUserAPITest
+
+from .factories import ReservationFactory
+from ..billing import DaysBetween, accrue_penalties, bill_reservations, bill_waiting_payment
+from ..models import Reservation
+from ..tasks import accrue_expired_penalties, bill_waiting_payment_reservations
+from ..utils import calculate_penalty_price
+from ..utils_models import calculate_initial_price
+
+
+def day(offset):
+    return datetime.date.today() + datetime.timedelta(days=offset)
+
+
+class BillingTest(RegularUserAPITest, ReservationFactory):
+    def create_reservation(self, status, start, end, returned=None, **fields):
+        return Reservation.objects.create(
+            user=self.user, book=self.book(), status=status,
+            start_date=day(start), end_date=day(end),
+            returned_date=day(returned) if returned is not None else None, **fields)
+
+    def test_prices_are_decimal(self):
+        self.assertEqual(calculate_initial_price(day(0), day(2)), Decimal('6.00'))
+        self.assertEqual(calculate_penalty_price(day(0), Decimal('6.00'), day(3)), Decimal('12.00'))
+        self.assertEqual(calculate_penalty_price(day(3), Decimal('6.00'), day(0)), Decimal('0.00'))
+
+    def test_days_between(self):
+        reservation = self.create_reservation('confirmed', 3, 40)
+
+        days = Reservation.objects.annotate(
+            days=DaysBetween('end_date', 'start_date')).get(pk=reservation.pk).days
+
+        self.assertEqual(days, 37)
+
+    def test_bill_reservations_as_one_by_one(self):
+        reservations = [
+            self.create_reservation('waiting_payment', -10, -5, initial_price=0, final_price=0),
+            self.create_reservation('waiting_payment', -20, -8, returned=-2, initial_price=0),
+            self.create_reservation('waiting_payment', -6, -1, returned=-3, initial_price=0),
+        ]
+
+        with self.assertNumQueries(1):
+            self.assertEqual(bill_reservations(Reservation.objects.filter(status='waiting_payment')), 3)
+
+        for reservation in reservations:
+            billed = Reservation.objects.get(pk=reservation.pk)
+            initial_price = calculate_initial_price(reservation.start_date, reservation.end_date)
+            penalty_price = calculate_penalty_price(
+                reservation.end_date, initial_price, reservation.returned_date) or Decimal('0.00')
+            self.assertEqual(billed.initial_price, initial_price)
+            self.assertEqual(billed.penalty_price, penalty_price)
+            self.assertEqual(billed.final_price, initial_price + penalty_price)
+
+    def test_accrue_penalties(self):
+        expired = self.create_reservation('expired', -10, -3)
+        retired = self.create_reservation('retired', -2, 3)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(accrue_penalties(), 1)
+
+        expired.refresh_from_db()
+        self.assertEqual(expired.penalty_price, Decimal('12.00'))
+        self.assertEqual(expired.final_price, expired.initial_price + Decimal('12.00'))
+        retired.refresh_from_db()
+        self.assertIsNone(retired.penalty_price)
+
+        accrue_penalties(today=day(1))
+        expired.refresh_from_db()
+        self.assertEqual(expired.penalty_price, Decimal('16.00'))
+
+    def test_bill_waiting_payment_skips_billed(self):
+        unbilled = self.create_reservation('waiting_payment', -10, -5)
+        # Corrected by an admin.
+        billed = self.create_reservation(
+            'waiting_payment', -10, -5, penalty_price=Decimal('0.00'), final_price=Decimal('1.00'))
+
+        self.assertEqual(bill_waiting_payment(), 1)
+
+        unbilled.refresh_from_db()
+        self.assertEqual(unbilled.final_price, unbilled.initial_price)
+        billed.refresh_from_db()
+        self.assertEqual(billed.final_price, Decimal('1.00'))
+
+        self.assertEqual(bill_waiting_payment(), 0)
+
+    def test_tasks(self):
+        self.create_reservation('expired', -10, -3)
+        self.create_reservation('waiting_payment', -10, -5)
+
+        self.assertIn('1 penalties accrued', accrue_expired_penalties())
+        self.assertIn('1 reservations billed', bill_waiting_payment_reservations())
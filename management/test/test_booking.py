@@ -0,0 +1,94 @@
+import datetime
+import io
+import threading
+
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection, OperationalError
+from django.test import TransactionTestCase, skipUnlessDBFeature
+
+from books.models import Book
+from users.models import User
+
+from .factories import ReservationFactory
+from ..models import Reservation
+from ..utils import book_reservation
+
+
+class ConcurrentBookingTest(TransactionTestCase, ReservationFactory):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(
+                first_name='Reader', last_name=str(i), username=f'reader{i}',
+                email=f'reader{i}@example.com', password='testpassword', is_active=True
+            ) for i in range(8)
+        ]
+        self.start_date = datetime.date.today() + datetime.timedelta(days=5)
+        self.end_date = self.start_date + datetime.timedelta(days=3)
+
+    def create_book(self):
+        # Without cover, the variants task would be enqueued on commit.
+        return Book.objects.create(
+            title=self.title(), language='en', genre=self.genre(),
+            publication_date=self.publication_date())
+
+    def book_in_parallel(self, book):
+        barrier = threading.Barrier(len(self.users))
+        outcomes = []
+
+        def attempt(user):
+            try:
+                barrier.wait()
+                book_reservation(user, book, self.start_date, self.end_date)
+                outcomes.append('booked')
+            except ValidationError:
+                outcomes.append('conflict')
+            except OperationalError:
+                # SQLite refuses a second writer instead of waiting.
+                outcomes.append('locked')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attempt, args=(user,)) for user in self.users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return outcomes
+
+    def test_no_double_booking_under_contention(self):
+        book = self.create_book()
+
+        outcomes = self.book_in_parallel(book)
+
+        self.assertEqual(outcomes.count('booked'), 1)
+        self.assertEqual(len(outcomes), len(self.users))
+        self.assertEqual(Reservation.objects.filter(book=book).count(), 1)
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_waiting_bookings_see_the_first_one(self):
+        book = self.create_book()
+
+        outcomes = self.book_in_parallel(book)
+
+        self.assertEqual(sorted(outcomes), ['booked'] + ['conflict'] * (len(self.users) - 1))
+
+    def test_sequential_conflict(self):
+        book = self.create_book()
+        book_reservation(self.users[0], book, self.start_date, self.end_date)
+
+        with self.assertRaises(ValidationError):
+            book_reservation(self.users[1], book, self.end_date, self.end_date + datetime.timedelta(days=2))
+
+        book_reservation(self.users[1], book, self.end_date + datetime.timedelta(days=1),
+                         self.end_date + datetime.timedelta(days=2))
+        self.assertEqual(Reservation.objects.filter(book=book).count(), 2)
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+
+        call_command('benchmark_booking', '--threads', '4', '--attempts', '20', stdout=out)
+
+        self.assertIn('bookings/sec', out.getvalue())
+        self.assertIn('0 double bookings', out.getvalue())
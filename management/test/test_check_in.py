@@ -0,0 +1,104 @@
+import datetime
+from decimal import Decimal
+
+from django.urls import reverse
+from rest_framework import status
+
+from core.models import OutboxEvent
+from core.test.test_setup import AdminUserAPITest, RegularUserAPITest
+
+from .factories import ReservationFactory
+from ..models import Reservation
+from ..utils import check_in_returns
+
+
+class CheckInTest(AdminUserAPITest, ReservationFactory):
+    def create_reservation(self, status, start_days_ago, end_days_ago, book=None):
+        today = datetime.date.today()
+        return Reservation.objects.create(
+            user=self.user, book=book or self.book(), status=status,
+            start_date=today - datetime.timedelta(days=start_days_ago),
+            end_date=today - datetime.timedelta(days=end_days_ago),
+            initial_price=Decimal('10.00'),
+        )
+
+    def test_check_in_batch(self):
+        on_time = self.create_reservation('retired', 5, -2)
+        late = self.create_reservation('expired', 10, 3)
+        today = datetime.date.today()
+
+        with self.assertNumQueries(6):
+            results = check_in_returns([
+                {'reservation': on_time.pk, 'returned_date': today},
+                {'book': late.book_id, 'returned_date': today},
+            ])
+
+        self.assertEqual([result['reservation'] for result in results], [on_time.pk, late.pk])
+        on_time.refresh_from_db()
+        late.refresh_from_db()
+        self.assertEqual(on_time.status, 'completed')
+        self.assertEqual(on_time.penalty_price, Decimal('0.00'))
+        self.assertEqual(on_time.final_price, Decimal('10.00'))
+        self.assertEqual(late.returned_date, today)
+        self.assertEqual(late.penalty_price, Decimal('12.00'))
+        self.assertEqual(late.final_price, Decimal('22.00'))
+        self.assertIsNone(late.next_transition_at)
+        # Released to the waitlist, which takes only the days still to come.
+        self.assertEqual(OutboxEvent.objects.filter(
+            payload__task='management.tasks.promote_waitlist').count(), 2)
+
+    def test_errors_reported_per_item(self):
+        completed = self.create_reservation('completed', 10, 3)
+        returned = self.create_reservation('retired', 5, -2)
+        book = self.book()
+        self.create_reservation('retired', 5, -2, book=book)
+        self.create_reservation('expired', 10, 3, book=book)
+        today = datetime.date.today()
+
+        results = check_in_returns([
+            {'reservation': 999999, 'returned_date': today},
+            {'reservation': completed.pk, 'returned_date': today},
+            {'book': book.slug, 'returned_date': today},
+            {'book': completed.book_id, 'returned_date': today},
+            {'reservation': returned.pk, 'returned_date': today},
+            {'reservation': returned.pk, 'returned_date': today},
+        ])
+
+        self.assertEqual(results[0]['error'], 'Reservation not found.')
+        self.assertIn('already ended', results[1]['error'])
+        self.assertIn('Several reservations', results[2]['error'])
+        self.assertIn('No reservation', results[3]['error'])
+        self.assertNotIn('error', results[4])
+        self.assertIn('repeated', results[5]['error'])
+        self.assertEqual(Reservation.objects.filter(status='completed').count(), 2)
+
+    def test_check_in_endpoint(self):
+        reservation = self.create_reservation('expired', 10, 3)
+
+        response = self.client.post(reverse('reservation-check-in'), {
+            'returns': [{'reservation': reservation.pk}, {'reservation': 999999}]
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['detail'], '1 returns registered.')
+        self.assertEqual(response.data['results'][0]['returned_date'], datetime.date.today())
+        self.assertEqual(Reservation.objects.get(pk=reservation.pk).status, 'completed')
+
+    def test_fail_check_in_invalid_items(self):
+        reservation = self.create_reservation('expired', 10, 3)
+        tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+
+        response = self.client.post(reverse('reservation-check-in'), {'returns': [
+            {'reservation': reservation.pk, 'book': reservation.book_id},
+            {'reservation': reservation.pk, 'returned_date': tomorrow.isoformat()},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Reservation.objects.get(pk=reservation.pk).status, 'expired')
+
+
+class CheckInPermissionTest(RegularUserAPITest):
+    def test_fail_not_admin(self):
+        response = self.client.post(reverse('reservation-check-in'), {'returns': []}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
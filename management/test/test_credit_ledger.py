@@ -0,0 +1,87 @@
+import threading
+
+from django.db import connection, OperationalError
+from django.db.models import Sum
+from django.test import TransactionTestCase
+from django.urls import reverse
+from rest_framework import status
+
+from core.test.test_setup import RegularUserAPITest
+from users.models import User
+
+from ..models import Credit, CreditTransaction
+from ..utils import grant_credits, spend_credits
+
+
+class CreditLedgerTest(RegularUserAPITest):
+    def test_read_never_writes(self):
+        response = self.client.get(reverse('credits-list'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['amount'], 0)
+        self.assertFalse(Credit.objects.exists())
+
+    def test_grant_and_spend(self):
+        grant_credits(self.user, 4, 'compensation')
+        grant_credits(self.user, 4, 'compensation')
+        entry = spend_credits(self.user, 3)
+
+        self.assertEqual(entry.amount, -3)
+        self.assertEqual(Credit.objects.get(user=self.user).amount, 5)
+        self.assertEqual(
+            CreditTransaction.objects.filter(user=self.user).aggregate(total=Sum('amount'))['total'], 5)
+
+    def test_spend_not_enough(self):
+        grant_credits(self.user, 2, 'compensation')
+
+        self.assertIsNone(spend_credits(self.user, 3))
+        self.assertEqual(Credit.objects.get(user=self.user).amount, 2)
+        self.assertEqual(CreditTransaction.objects.count(), 1)
+
+    def test_spend_without_balance(self):
+        self.assertIsNone(spend_credits(self.user, 1))
+        self.assertFalse(Credit.objects.exists())
+        self.assertFalse(CreditTransaction.objects.exists())
+
+
+class ConcurrentCreditLedgerTest(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            first_name='Reader', last_name='Credits', username='readercredits',
+            email='readercredits@example.com', password='testpassword', is_active=True
+        )
+        grant_credits(self.user, 10, 'opening')
+
+    def test_parallel_grants_and_spends(self):
+        operations = [('grant', 4)] * 6 + [('spend', 3)] * 10
+        barrier = threading.Barrier(len(operations))
+        outcomes = []
+
+        def attempt(operation, amount):
+            try:
+                barrier.wait()
+                if operation == 'grant':
+                    grant_credits(self.user, amount, 'compensation')
+                    outcomes.append(amount)
+                elif spend_credits(self.user, amount) is not None:
+                    outcomes.append(-amount)
+                else:
+                    outcomes.append(0)
+            except OperationalError:
+                # SQLite refuses a second writer instead of waiting.
+                outcomes.append(0)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attempt, args=operation) for operation in operations]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        balance = Credit.objects.get(user=self.user).amount
+        ledger = CreditTransaction.objects.filter(user=self.user).aggregate(total=Sum('amount'))['total']
+        self.assertEqual(len(outcomes), len(operations))
+        self.assertGreaterEqual(balance, 0)
+        self.assertEqual(balance, ledger)
+        self.assertEqual(balance, 10 + sum(outcomes))
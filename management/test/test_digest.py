@@ -0,0 +1,78 @@
+import datetime
+
+from django.core import mail
+from django.utils import timezone
+
+from core.test.test_setup import RegularUserAPITest
+from users.models import User, QueuedEmail
+
+from .factories import ReservationFactory
+from ..models import Notification
+from ..tasks import send_notification_digests
+from ..utils import create_notification, queue_notification_digests
+
+
+class NotificationDigestTest(RegularUserAPITest, ReservationFactory):
+    def setUp(self):
+        super().setUp()
+        User.objects.filter(pk=self.user.pk).update(notification_digest=True)
+        self.reservation = self.reservation_success(self.user)
+
+    def create_user(self, username, digest=True):
+        return User.objects.create_user(
+            first_name='Other', last_name='Reader', username=username,
+            email=f'{username}@example.com', password='testpassword',
+            is_active=True, notification_digest=digest
+        )
+
+    def test_digest_groups_unread_per_user(self):
+        create_notification(user=self.user, title='Available', obj=self.reservation)
+        create_notification(user=self.user, title='Strike', obj=self.reservation)
+        read = create_notification(user=self.user, title='Old', obj=self.reservation)
+        Notification.objects.filter(pk=read.pk).update(is_read=True)
+
+        other = self.create_user('other')
+        create_notification(user=other, title='Credits', obj=self.reservation)
+        not_subscribed = self.create_user('quiet', digest=False)
+        create_notification(user=not_subscribed, title='Credits', obj=self.reservation)
+
+        self.assertEqual(queue_notification_digests(chunk_size=1), 2)
+
+        email = QueuedEmail.objects.get(to_email=self.user.email)
+        self.assertEqual(
+            {row['title'] for row in email.context['notifications']}, {'Available', 'Strike'})
+        self.assertFalse(QueuedEmail.objects.filter(to_email='quiet@example.com').exists())
+
+    def test_digest_only_since_last_one(self):
+        create_notification(user=self.user, title='Available', obj=self.reservation)
+        queue_notification_digests()
+
+        self.assertEqual(queue_notification_digests(), 0)
+
+        Notification.objects.update(
+            created_at=timezone.now() - datetime.timedelta(days=2))
+        User.objects.filter(pk=self.user.pk).update(
+            last_digest_at=timezone.now() - datetime.timedelta(days=1))
+        create_notification(user=self.user, title='Strike', obj=self.reservation)
+
+        self.assertEqual(queue_notification_digests(), 1)
+        email = QueuedEmail.objects.filter(to_email=self.user.email).latest('pk')
+        self.assertEqual([row['title'] for row in email.context['notifications']], ['Strike'])
+
+    def test_query_count_does_not_grow_with_users(self):
+        for i in range(5):
+            user = self.create_user(f'reader{i}')
+            create_notification(user=user, title='Available', obj=self.reservation)
+
+        # Per chunk: users, notifications, insert and update, plus the empty chunk.
+        with self.assertNumQueries(5):
+            self.assertEqual(queue_notification_digests(chunk_size=10), 5)
+
+    def test_task_sends_digests(self):
+        create_notification(user=self.user, title='Available', obj=self.reservation)
+
+        result = send_notification_digests()
+
+        self.assertIn('1 digests queued, 1 emails sent', result)
+        self.assertEqual(mail.outbox[0].to, [self.user.email])
+        self.assertIn('Available', mail.outbox[0].alternatives[0][0])
@@ -0,0 +1,90 @@
+import io
+import datetime
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from core.test.test_setup import RegularUserAPITest
+from core.utils import by_user
+
+from .factories import ReservationFactory
+from ..models import Favorite, Reservation, Penalty
+
+
+class IntegerKeysTest(RegularUserAPITest, ReservationFactory):
+    def test_dual_write_on_create(self):
+        reservation = self.reservation_success(self.user)
+
+        reservation = Reservation.objects.get(pk=reservation.pk)
+        self.assertEqual(reservation.user_ref_id, self.user.pk)
+        self.assertEqual(reservation.book_ref_id, reservation.book.pk)
+
+    def test_dual_write_when_key_changes(self):
+        reservation = self.reservation_success(self.user)
+        other = self.book()
+
+        reservation = Reservation.objects.get(pk=reservation.pk)
+        reservation.book_id = other.slug
+        reservation.save()
+
+        self.assertEqual(Reservation.objects.get(pk=reservation.pk).book_ref_id, other.pk)
+
+    def test_backfill_rows_written_without_save(self):
+        book = self.book()
+        Favorite.objects.bulk_create([Favorite(user=self.user, book=book)])
+        self.assertIsNone(Favorite.objects.get().user_ref_id)
+
+        with self.assertRaises(CommandError):
+            call_command('backfill_integer_keys', '--verify', stdout=io.StringIO())
+
+        out = io.StringIO()
+        call_command('backfill_integer_keys', '--chunk-size', '1', stdout=out)
+
+        favorite = Favorite.objects.get()
+        self.assertEqual(favorite.user_ref_id, self.user.pk)
+        self.assertEqual(favorite.book_ref_id, book.pk)
+        self.assertIn('Favorite.user_ref: 1 rows filled.', out.getvalue())
+
+        out = io.StringIO()
+        call_command('backfill_integer_keys', '--verify', stdout=out)
+        self.assertIn('All integer keys are filled', out.getvalue())
+
+    def test_by_user(self):
+        self.assertEqual(by_user(self.user), {'user': self.user})
+
+        with override_settings(INTEGER_KEY_READS=True):
+            self.assertEqual(by_user(self.user, 'reservation__'),
+                             {'reservation__user_ref': self.user})
+
+    @override_settings(INTEGER_KEY_READS=True)
+    def test_list_reservations_integer_reads(self):
+        reservation = self.reservation_success(self.user)
+
+        response = self.client.get(reverse('reservation-list'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['id'], reservation.id)
+
+    @override_settings(INTEGER_KEY_READS=True)
+    def test_penalized_user_integer_reads(self):
+        Penalty.objects.create(
+            user=self.user,
+            end_date=datetime.date.today() + datetime.timedelta(days=3)
+        )
+
+        start, end = self.start_end_dates()
+        response = self.client.post(reverse('reservation-list'), {
+            'book': self.book().slug, 'start_date': start, 'end_date': end})
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_benchmark_command(self):
+        self.reservation_success(self.user)
+        out = io.StringIO()
+
+        call_command('benchmark_integer_keys', '--repeat', '1', stdout=out)
+
+        self.assertIn('Reservations of user: varchar', out.getvalue())
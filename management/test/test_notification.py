@@ -135,11 +135,9 @@ class AuthNotificationListAPITest(RegularUserAPITest, ReservationFactory):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(6, response.data['count'])
 
+        # Newest first, whatever the read state.
         for i in range(response.data['count']):
-            if i < 3:
-                self.assertEqual(response.data['results'][i]['is_read'], False)
-            else:
-                self.assertEqual(response.data['results'][i]['is_read'], True)
+            self.assertEqual(response.data['results'][i]['is_read'], i % 2 == 1)
 
     def test_notification_list_pagination(self):
         for i in range(6):
@@ -1,6 +1,7 @@
 import pdb
 import datetime
 from decimal import Decimal
+from unittest import mock
 from freezegun import freeze_time
 
 from django.urls import reverse
@@ -12,6 +13,7 @@ from core.test.test_setup import AdminUserAPITest, RegularUserAPITest
 from .factories import ReservationFactory
 from ..utils_models import calculate_initial_price
 from ..models import Reservation, Notification
+from ..serializers import CheckReservationAvailabilitySerializer
 from ..utils import create_penalty
 from ..tasks import (
     reservation_confirm_to_available, reservation_end_and_never_pickup,
@@ -722,6 +724,22 @@ class AuthCheckAvailabilityReservationAPITest(RegularUserAPITest, ReservationFac
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['is_available'], True)
 
+    def test_check_availability_book_deleted_after_validation(self):
+        today = datetime.date.today()
+        url = reverse('reservation-check-availability')
+        with mock.patch.object(
+                CheckReservationAvailabilitySerializer, 'validate', lambda self, attrs: attrs):
+            response = self.client.get(
+                url,
+                {
+                    'book': 'not-a-book',
+                    'start_date': today + datetime.timedelta(days=1),
+                    'end_date': today + datetime.timedelta(days=5)
+                }
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_check_availability_false_some_period(self):
         dates = self.start_end_dates()
         reservation = Reservation.objects.create(
@@ -0,0 +1,187 @@
+import asyncio
+import datetime
+from unittest import mock
+
+import redis
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.test import TestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from library.asgi import application
+from users.models import User
+
+from .factories import ReservationFactory
+from .. import streams
+from ..models import Notification, Reservation
+from ..signals import notifications_created
+from ..utils import create_notification
+
+
+def stream_scope(token=None, last_event_id=None, method='GET'):
+    headers = []
+    if token:
+        headers.append((b'authorization', f'Bearer {token}'.encode()))
+    if last_event_id:
+        headers.append((b'last-event-id', str(last_event_id).encode()))
+    return {'type': 'http', 'method': method, 'path': '/notification/stream/',
+            'query_string': b'', 'headers': headers}
+
+
+@override_settings(NOTIFICATIONS_PUBSUB_URL='')
+class NotificationStreamTest(TestCase, ReservationFactory):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            first_name='Ana', last_name='Lopez', username='analopez',
+            email='ana@example.com', password='testpassword', is_active=True
+        )
+        self.token = str(AccessToken.for_user(self.user))
+        today = datetime.date.today()
+        self.reservation = Reservation.objects.create(
+            user=self.user, book=self.book(), start_date=today,
+            end_date=today + datetime.timedelta(days=3), initial_price=10.00
+        )
+
+    def notify(self, title):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_notification(user=self.user, title=title, obj=self.reservation)
+
+    async def open_stream(self, **kwargs):
+        communicator = ApplicationCommunicator(application, stream_scope(**kwargs))
+        await communicator.send_input({'type': 'http.request', 'body': b''})
+        start = await communicator.receive_output(timeout=1)
+        return communicator, start
+
+    async def read_body(self, communicator):
+        message = await communicator.receive_output(timeout=1)
+        return message['body'].decode()
+
+    def test_fail_without_token(self):
+        async def run():
+            communicator, start = await self.open_stream()
+            self.assertEqual(start['status'], 401)
+            await communicator.wait()
+
+        async_to_sync(run)()
+
+    def test_resume_from_last_event_id(self):
+        first = self.notify('First')
+        second = self.notify('Second')
+        third = self.notify('Third')
+
+        async def run():
+            communicator, start = await self.open_stream(
+                token=self.token, last_event_id=first.id)
+            self.assertEqual(start['status'], 200)
+            self.assertIn((b'content-type', b'text/event-stream'), start['headers'])
+            self.assertEqual(await self.read_body(communicator), 'retry: 5000\n\n')
+
+            body = await self.read_body(communicator)
+            self.assertTrue(body.startswith(f'id: {second.id}\nevent: notification\n'))
+            self.assertIn('"title": "Second"', body)
+            self.assertTrue((await self.read_body(communicator)).startswith(f'id: {third.id}\n'))
+
+            await communicator.send_input({'type': 'http.disconnect'})
+            await communicator.wait()
+
+        async_to_sync(run)()
+
+    def test_new_notification_pushed(self):
+        self.notify('Old')
+
+        async def run():
+            communicator, _ = await self.open_stream(token=self.token)
+            await self.read_body(communicator)
+            # Only notifications created after connecting.
+            self.assertTrue(await communicator.receive_nothing(timeout=0.1))
+
+            notification = await sync_to_async(self.notify)('New')
+
+            body = await self.read_body(communicator)
+            self.assertTrue(body.startswith(f'id: {notification.id}\n'))
+
+            await communicator.send_input({'type': 'http.disconnect'})
+            await communicator.wait()
+
+        async_to_sync(run)()
+
+    @override_settings(NOTIFICATIONS_STREAM_HEARTBEAT=0.05)
+    def test_heartbeat_on_idle_stream(self):
+        async def run():
+            communicator, _ = await self.open_stream(token=self.token)
+            await self.read_body(communicator)
+
+            self.assertEqual(await self.read_body(communicator), ': heartbeat\n\n')
+
+            await communicator.send_input({'type': 'http.disconnect'})
+            await communicator.wait()
+
+        async_to_sync(run)()
+
+    @override_settings(NOTIFICATIONS_STREAM_HEARTBEAT=0.05)
+    def test_heartbeat_sends_missed_notification(self):
+        async def run():
+            communicator, _ = await self.open_stream(token=self.token)
+            await self.read_body(communicator)
+
+            # Created without waking the stream, as with redis down.
+            notification = await sync_to_async(Notification.objects.create)(
+                user=self.user, title='Missed', content_object=self.reservation)
+
+            self.assertEqual(await self.read_body(communicator), ': heartbeat\n\n')
+            body = await self.read_body(communicator)
+            self.assertTrue(body.startswith(f'id: {notification.id}\n'))
+
+            await communicator.send_input({'type': 'http.disconnect'})
+            await communicator.wait()
+
+        async_to_sync(run)()
+
+    @override_settings(NOTIFICATIONS_STREAM_HEARTBEAT=0.05,
+                       NOTIFICATIONS_PUBSUB_URL='redis://redis:6379/0')
+    def test_heartbeat_without_query_while_subscribed(self):
+        async def run():
+            loop = asyncio.get_running_loop()
+            streams._subscribed[loop] = True
+            try:
+                with mock.patch.object(streams, 'ensure_subscribed'), \
+                        mock.patch.object(streams, '_new_notifications',
+                                          wraps=streams._new_notifications) as new_notifications:
+                    communicator, _ = await self.open_stream(token=self.token)
+                    await self.read_body(communicator)
+
+                    self.assertEqual(await self.read_body(communicator), ': heartbeat\n\n')
+                    self.assertEqual(await self.read_body(communicator), ': heartbeat\n\n')
+
+                    await communicator.send_input({'type': 'http.disconnect'})
+                    await communicator.wait()
+
+                # Only the first pass, for what was missed before connecting.
+                new_notifications.assert_called_once()
+            finally:
+                del streams._subscribed[loop]
+
+        async_to_sync(run)()
+
+    @override_settings(NOTIFICATIONS_PUBSUB_URL='redis://redis:6379/0')
+    def test_publish_failure_is_logged(self):
+        publisher = mock.Mock()
+        publisher.publish.side_effect = redis.ConnectionError('down')
+
+        with mock.patch.object(streams, '_redis_publisher', return_value=publisher), \
+                mock.patch.object(streams.listeners, 'wake') as wake, \
+                self.assertLogs('management.streams', level='WARNING') as logs:
+            notifications_created.send(sender=Notification, user_ids=[self.user.pk])
+
+        self.assertIn('Notifications not published: down', logs.output[0])
+        wake.assert_called_once_with([self.user.pk])
+
+    def test_other_paths_go_to_django(self):
+        async def run():
+            communicator = ApplicationCommunicator(application, {
+                **stream_scope(), 'path': '/notification/'})
+            await communicator.send_input({'type': 'http.request', 'body': b''})
+            start = await communicator.receive_output(timeout=5)
+            self.assertEqual(start['status'], 401)
+
+        async_to_sync(run)()
@@ -0,0 +1,120 @@
+import datetime
+from unittest import mock
+
+from freezegun import freeze_time
+
+from core.test.test_setup import RegularUserAPITest
+from core.utils import dispatch_outbox
+
+from .factories import ReservationFactory
+from ..models import Reservation, Penalty, Notification
+from ..tasks import (
+    dispatch_due_transitions, reconcile_reservation_transitions,
+    transition_reservation, transition_penalty
+)
+from ..utils import create_penalty
+from ..utils_models import start_of_day
+
+
+class TransitionTimersTest(RegularUserAPITest, ReservationFactory):
+    def create_reservation(self, start_date, end_date, status='confirmed'):
+        return Reservation.objects.create(
+            user=self.user, book=self.book(),
+            start_date=start_date, end_date=end_date,
+            initial_price=10.00, status=status
+        )
+
+    def test_timer_set_on_create_and_status_change(self):
+        today = datetime.date.today()
+        reservation = self.create_reservation(
+            today + datetime.timedelta(days=2), today + datetime.timedelta(days=5))
+
+        self.assertEqual(reservation.next_transition_at,
+                         start_of_day(today + datetime.timedelta(days=2)))
+
+        reservation = Reservation.objects.get(pk=reservation.pk)
+        reservation.status = 'retired'
+        reservation.save()
+
+        self.assertEqual(Reservation.objects.get(pk=reservation.pk).next_transition_at,
+                         start_of_day(today + datetime.timedelta(days=6)))
+
+        reservation.status = 'completed'
+        reservation.save()
+        self.assertIsNone(Reservation.objects.get(pk=reservation.pk).next_transition_at)
+
+    def test_dispatch_only_due_timers(self):
+        today = datetime.date.today()
+        due = self.create_reservation(today, today + datetime.timedelta(days=3))
+        self.create_reservation(
+            today + datetime.timedelta(days=1), today + datetime.timedelta(days=3))
+
+        with mock.patch.object(transition_reservation, 'delay') as delay:
+            dispatch_due_transitions()
+            dispatch_due_transitions()
+
+        delay.assert_called_once_with(due.pk)
+        self.assertIsNone(Reservation.objects.get(pk=due.pk).next_transition_at)
+
+    def test_transition_confirmed_to_available(self):
+        today = datetime.date.today()
+        reservation = self.create_reservation(today, today + datetime.timedelta(days=3))
+
+        transition_reservation(reservation.pk)
+
+        reservation = Reservation.objects.get(pk=reservation.pk)
+        self.assertEqual(reservation.status, 'available')
+        self.assertEqual(reservation.next_transition_at,
+                         start_of_day(today + datetime.timedelta(days=3)))
+        self.assertFalse(Notification.objects.filter(object_id=reservation.pk).exists())
+
+        dispatch_outbox()
+        self.assertTrue(Notification.objects.filter(object_id=reservation.pk).exists())
+
+    def test_transition_not_due_restores_timer(self):
+        tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+        reservation = self.create_reservation(tomorrow, tomorrow)
+        Reservation.objects.filter(pk=reservation.pk).update(next_transition_at=None)
+
+        transition_reservation(reservation.pk)
+
+        reservation = Reservation.objects.get(pk=reservation.pk)
+        self.assertEqual(reservation.status, 'confirmed')
+        self.assertEqual(reservation.next_transition_at, start_of_day(tomorrow))
+
+    def test_stale_available_reservation_waits_payment(self):
+        today = datetime.date.today()
+        reservation = self.create_reservation(
+            today - datetime.timedelta(days=5), today - datetime.timedelta(days=1))
+
+        transition_reservation(reservation.pk)
+
+        reservation = Reservation.objects.get(pk=reservation.pk)
+        self.assertEqual(reservation.status, 'waiting_payment')
+        self.assertIsNone(reservation.next_transition_at)
+
+    def test_penalty_completed_by_timer(self):
+        penalty = create_penalty(self.user)
+        self.assertEqual(penalty.next_transition_at,
+                         start_of_day(penalty.end_date, days_after=1))
+
+        day_after = penalty.end_date + datetime.timedelta(days=1)
+        with freeze_time(datetime.datetime.combine(day_after, datetime.time(12))):
+            with mock.patch.object(transition_penalty, 'delay') as delay:
+                dispatch_due_transitions()
+            delay.assert_called_once_with(penalty.pk)
+
+            transition_penalty(penalty.pk)
+
+        self.assertTrue(Penalty.objects.get(pk=penalty.pk).complete)
+
+    def test_reconcile_catches_lost_timers(self):
+        today = datetime.date.today()
+        reservation = self.create_reservation(today, today + datetime.timedelta(days=3))
+        Reservation.objects.filter(pk=reservation.pk).update(next_transition_at=None)
+
+        with mock.patch.object(transition_reservation, 'delay') as delay:
+            result = reconcile_reservation_transitions()
+
+        delay.assert_called_once_with(reservation.pk)
+        self.assertIn('1 transitions reconciled', result)
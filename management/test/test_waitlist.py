@@ -0,0 +1,133 @@
+import datetime
+
+from django.urls import reverse
+from rest_framework import status
+
+from core.models import OutboxEvent
+from core.test.test_setup import RegularUserAPITest
+from users.models import User
+
+from .factories import ReservationFactory
+from ..models import Reservation, Penalty, WaitlistEntry
+from ..tasks import promote_waitlist
+from ..utils import book_reservation
+
+
+def day(offset):
+    return datetime.date.today() + datetime.timedelta(days=10 + offset)
+
+
+class WaitlistTest(RegularUserAPITest, ReservationFactory):
+    def setUp(self):
+        super().setUp()
+        self.book_obj = self.book()
+        self.other = User.objects.create_user(
+            first_name='Ana', last_name='Lopez', username='analopez',
+            email='ana@example.com', password='testpassword', is_active=True
+        )
+        self.reservation = book_reservation(self.other, self.book_obj, day(0), day(5))
+
+    def wait(self, user, start, end):
+        return WaitlistEntry.objects.create(
+            user=user, book=self.book_obj, start_date=day(start), end_date=day(end))
+
+    def run_promotion(self):
+        event = OutboxEvent.objects.get(payload__task='management.tasks.promote_waitlist')
+        return promote_waitlist(**event.payload['kwargs'], outbox_event_id=event.pk)
+
+    def test_join_waitlist(self):
+        url = reverse('waitlist-list')
+        data = {'book': self.book_obj.slug, 'start_date': day(2), 'end_date': day(4)}
+
+        response = self.client.post(url, data)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['status'], 'waiting')
+        self.assertEqual(WaitlistEntry.objects.get().user, self.user)
+
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_fail_join_when_available(self):
+        response = self.client.post(reverse('waitlist-list'), {
+            'book': self.book_obj.slug, 'start_date': day(6), 'end_date': day(8)})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('book', response.data)
+
+    def test_cancel_promotes_first_waiter(self):
+        first = self.wait(self.user, 1, 3)
+        second_user = User.objects.create_user(
+            first_name='Juan', last_name='Perez', username='juanperez',
+            email='juan@example.com', password='testpassword', is_active=True
+        )
+        second = self.wait(second_user, 2, 4)
+
+        self.reservation.status = 'canceled_user'
+        self.reservation.save()
+        self.assertIn('1 waitlist entries promoted', self.run_promotion())
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, 'promoted')
+        reservation = Reservation.objects.get(pk=first.reservation_id)
+        self.assertEqual(reservation.user, self.user)
+        self.assertEqual(reservation.start_date, day(1))
+        self.assertEqual(second.status, 'waiting')
+        self.assertTrue(OutboxEvent.objects.filter(
+            kind='notification', payload__user_id=self.user.username,
+            payload__object_id=reservation.pk).exists())
+
+    def test_promotion_runs_once(self):
+        entry = self.wait(self.user, 1, 3)
+        self.reservation.status = 'canceled_system'
+        self.reservation.save()
+
+        self.run_promotion()
+        self.assertIn('Already promoted', self.run_promotion())
+
+        self.assertEqual(Reservation.objects.filter(user=self.user).count(), 1)
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'promoted')
+
+    def test_penalized_waiter_skipped(self):
+        entry = self.wait(self.user, 1, 3)
+        Penalty.objects.create(
+            user=self.user, start_date=datetime.date.today(),
+            end_date=datetime.date.today() + datetime.timedelta(days=30))
+        self.reservation.status = 'canceled_user'
+        self.reservation.save()
+
+        self.run_promotion()
+
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'waiting')
+
+    def test_only_active_reservations_release(self):
+        self.reservation.status = 'waiting_payment'
+        self.reservation.save()
+        self.reservation.status = 'completed'
+        self.reservation.save()
+
+        self.assertFalse(OutboxEvent.objects.filter(
+            payload__task='management.tasks.promote_waitlist').exists())
+
+    def test_cancel_endpoint_releases(self):
+        self.wait(self.other, 1, 3)
+        reservation = book_reservation(self.user, self.book_obj, day(6), day(8))
+
+        response = self.client.delete(reverse('reservation-detail', kwargs={'pk': reservation.pk}))
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        event = OutboxEvent.objects.get(payload__task='management.tasks.promote_waitlist')
+        self.assertEqual(event.payload['kwargs'], {'reservation_id': reservation.pk})
+
+    def test_leave_waitlist(self):
+        entry = self.wait(self.user, 1, 3)
+        url = reverse('waitlist-detail', kwargs={'pk': entry.pk})
+
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.get(reverse('waitlist-list'))
+        self.assertEqual(response.data['results'][0]['status'], 'canceled')
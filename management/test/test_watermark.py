@@ -0,0 +1,118 @@
+import importlib
+
+from django.apps import apps
+from django.urls import reverse
+from rest_framework import status
+
+from core.test.test_setup import RegularUserAPITest
+
+from .factories import ReservationFactory
+from ..models import Notification, NotificationWatermark
+from ..serializers import NotificationSerializer
+from ..tasks import notifications_as_read
+from ..utils import (
+    create_notification, get_last_read_id, mark_all_notifications_read,
+    mark_notifications_read, unread_notifications
+)
+
+
+watermark_migration = importlib.import_module(
+    'management.migrations.0017_notification_watermark')
+
+
+class NotificationWatermarkTest(RegularUserAPITest, ReservationFactory):
+    def setUp(self):
+        super().setUp()
+        self.reservation = self.reservation_success(user=self.user)
+        self.notifications = [self.create_notification() for _ in range(5)]
+
+    def create_notification(self):
+        return create_notification(user=self.user, title='Notification', obj=self.reservation)
+
+    def test_mark_all_read_single_update(self):
+        mark_all_notifications_read(self.user)
+        newest = self.create_notification()
+
+        # Last id, then savepoint, lock, update of the watermark and release.
+        with self.assertNumQueries(5):
+            mark_all_notifications_read(self.user)
+
+        self.assertEqual(get_last_read_id(self.user), newest.id)
+        self.assertFalse(unread_notifications(self.user).exists())
+        self.assertFalse(Notification.objects.filter(is_read=True).exists())
+
+    def test_mark_all_read_never_moves_watermark_down(self):
+        newest = self.notifications[-1]
+        # As moved by a concurrent mark, after the last id was read.
+        NotificationWatermark.objects.create(user=self.user, last_read_id=newest.id + 10)
+
+        mark_all_notifications_read(self.user)
+
+        self.assertEqual(get_last_read_id(self.user), newest.id + 10)
+        self.assertEqual(NotificationWatermark.objects.filter(user=self.user).count(), 1)
+
+    def test_out_of_order_read_is_override(self):
+        newest = self.notifications[-1]
+
+        mark_notifications_read(self.user, [newest.id])
+
+        self.assertEqual(get_last_read_id(self.user), 0)
+        self.assertTrue(Notification.objects.get(pk=newest.pk).is_read)
+        self.assertEqual(unread_notifications(self.user).count(), 4)
+
+    def test_read_in_order_moves_watermark(self):
+        first_ids = [notification.id for notification in self.notifications[:2]]
+
+        mark_notifications_read(self.user, first_ids)
+
+        self.assertEqual(get_last_read_id(self.user), first_ids[-1])
+        self.assertEqual(unread_notifications(self.user).count(), 3)
+
+        # Reads under the watermark change nothing.
+        self.assertEqual(mark_notifications_read(self.user, first_ids), 0)
+
+    def test_task_marks_as_read(self):
+        notifications_as_read(self.user.username, [self.notifications[0].id])
+
+        self.assertEqual(get_last_read_id(self.user), self.notifications[0].id)
+
+    def test_serializer_reads_watermark(self):
+        mark_all_notifications_read(self.user)
+        notification = Notification.objects.get(pk=self.notifications[0].pk)
+
+        self.assertFalse(NotificationSerializer(notification).data['is_read'])
+        self.assertTrue(NotificationSerializer(
+            notification, context={'last_read_id': get_last_read_id(self.user)}).data['is_read'])
+
+    def test_migration_from_is_read(self):
+        Notification.objects.filter(
+            pk__in=[self.notifications[0].pk, self.notifications[1].pk, self.notifications[3].pk]
+        ).update(is_read=True)
+
+        watermark_migration.fill_watermarks(apps, None)
+
+        self.assertEqual(get_last_read_id(self.user), self.notifications[1].id)
+        self.assertEqual(
+            list(unread_notifications(self.user).values_list('id', flat=True)),
+            [self.notifications[4].id, self.notifications[2].id]
+        )
+
+        NotificationWatermark.objects.all().delete()
+        Notification.objects.update(is_read=True)
+
+        watermark_migration.fill_watermarks(apps, None)
+        self.assertEqual(get_last_read_id(self.user), self.notifications[-1].id)
+
+    def test_read_all_endpoint(self):
+        response = self.client.post(reverse('notification-read-all'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(get_last_read_id(self.user), self.notifications[-1].id)
+
+    def test_unread_amount_endpoint(self):
+        mark_notifications_read(self.user, [self.notifications[0].id, self.notifications[4].id])
+
+        response = self.client.get(reverse('notification-amount'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['amount_unread_notifications'], 3)
@@ -1,29 +1,174 @@
 from datetime import date, datetime, timedelta
+from decimal import Decimal
+from itertools import groupby
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from books.models import Book
+from core.models import OutboxEvent
+from core.utils import by_user
+
+from users.models import User, QueuedEmail
+
+from .availability import allocate_copy
+from .models import (
+    Reservation, Strike, Penalty, StrikeGroup, Notification, NotificationWatermark,
+    ArchivedReservation, ArchivedNotification, Credit, CreditTransaction
+)
+from .signals import notifications_created, reservation_released
+from .utils_models import PENALTY_PER_DAY
+
+
+DIGEST_CHUNK_SIZE = 1000
+DIGEST_MAX_NOTIFICATIONS = 20
+
+ARCHIVE_CHUNK_SIZE = 1000
+TERMINAL_RESERVATION_STATUSES = ['completed', 'canceled_user', 'canceled_system']
 
-from .models import Reservation, Strike, Penalty, StrikeGroup, Notification
+BULK_RETURN_MAX_ITEMS = 1000
+BULK_RETURN_BATCH_SIZE = 500
+PICKED_UP_RESERVATION_STATUSES = ['retired', 'expired']
 
 
 def calculate_penalty_price(
-        end_date: datetime = None, initial_price: float = None,
-        returned_date: datetime = None) -> float:
+        end_date: datetime = None, initial_price: Decimal = None,
+        returned_date: datetime = None) -> Decimal:
 
     if end_date and returned_date and initial_price:
         try:
             if end_date >= returned_date:
-                return 0.0
+                return Decimal('0.00')
             else:
-                base_penalty_per_day = 4.0
                 delay = (returned_date - end_date).days
-                penalty_price = delay * base_penalty_per_day
 
-                return round(penalty_price, 2)
+                return delay * PENALTY_PER_DAY
         except:
             pass
 
     return None
 
 
+def lock_book(book):
+    """
+    Take the row lock of `book` until the end of the transaction. The bookings
+    of the same book run their check and insert one after the other, the
+    ones of other books do not wait.
+    """
+    list(Book.objects.select_for_update().filter(pk=book.pk).values_list('pk', flat=True))
+
+
+def book_reservation(user, book, start_date, end_date, **fields):
+    """
+    Assign a free copy of `book` and create the reservation under its lock, so
+    two concurrent requests can not reserve the same copy. The lock is held
+    only for the allocation and the insert.
+    """
+    with transaction.atomic():
+        lock_book(book)
+
+        copy_id = allocate_copy(book, start_date, end_date)
+        if copy_id is None:
+            raise ValidationError(
+                {'book': 'This book is not available for the specified period.'})
+
+        return Reservation.objects.create(
+            user=user, book=book, copy_id=copy_id, start_date=start_date,
+            end_date=end_date, **fields)
+
+
+def check_in_returns(items):
+    """
+    Return desk: complete the reservations of a batch of returned books in one
+    transaction. Each item has `returned_date` and either the `reservation`
+    id or the `book` slug (its reservation picked up, if only one is). The
+    penalties and final prices are computed in memory and written with one
+    `bulk_update`.
+
+    Returns one result per item, in order, with the new values or `error`.
+    """
+    ids = [item['reservation'] for item in items if item.get('reservation')]
+    slugs = [item['book'] for item in items if item.get('book')]
+
+    results = []
+    returned = []
+    with transaction.atomic():
+        reservations = Reservation.objects.select_for_update().select_related(
+            'book').in_bulk(ids)
+
+        out_by_book = {}
+        for reservation in Reservation.objects.select_for_update().select_related(
+                'book').filter(book__in=slugs, status__in=PICKED_UP_RESERVATION_STATUSES):
+            out_by_book.setdefault(reservation.book_id, []).append(reservation)
+
+        seen = set()
+        for item in items:
+            if item.get('reservation'):
+                result = {'reservation': item['reservation']}
+                reservation = reservations.get(item['reservation'])
+                if reservation is None:
+                    results.append({**result, 'error': 'Reservation not found.'})
+                    continue
+            else:
+                result = {'book': item['book']}
+                out = out_by_book.get(item['book'], [])
+                if len(out) != 1:
+                    error = 'No reservation of this book is picked up.' if not out else \
+                        'Several reservations of this book are picked up, use the reservation id.'
+                    results.append({**result, 'error': error})
+                    continue
+                reservation = out[0]
+
+            if reservation.pk in seen:
+                results.append({**result, 'error': 'Reservation repeated in the batch.'})
+                continue
+            seen.add(reservation.pk)
+
+            if reservation.status not in Reservation.ACTIVE_STATUSES:
+                results.append({**result, 'error': f'Reservation already ended, status {reservation.status}.'})
+                continue
+
+            penalty_price = calculate_penalty_price(
+                reservation.end_date,
+                initial_price=reservation.initial_price,
+                returned_date=item['returned_date']
+            )
+            if penalty_price is None:
+                results.append({**result, 'error': 'Error calculating penalty price.'})
+                continue
+
+            reservation.returned_date = item['returned_date']
+            reservation.penalty_price = penalty_price
+            reservation.final_price = reservation.penalty_price + reservation.initial_price
+            reservation.status = 'completed'
+            reservation.next_transition_at = reservation.get_next_transition_at()
+            returned.append(reservation)
+
+            results.append({
+                **result,
+                'reservation': reservation.pk,
+                'book': reservation.book_id,
+                'status': reservation.status,
+                'returned_date': reservation.returned_date,
+                'penalty_price': reservation.penalty_price,
+                'final_price': reservation.final_price,
+            })
+
+        Reservation.objects.bulk_update(returned, [
+            'returned_date', 'penalty_price', 'final_price', 'status', 'next_transition_at'
+        ], batch_size=BULK_RETURN_BATCH_SIZE)
+        # `bulk_update` skips `save()`, which sends it for a single return.
+        if returned:
+            reservation_released.send(sender=Reservation, reservations=returned)
+
+    return results
+
+
 def create_notification(user=None, title=None, message=None, obj=None):
 
     notification = Notification.objects.create(
@@ -33,9 +178,127 @@ def create_notification(user=None, title=None, message=None, obj=None):
         content_object=obj
     )
 
+    transaction.on_commit(lambda: notifications_created.send(
+        sender=Notification, user_ids=[user.pk]))
+
     return notification
 
 
+def outbox_notification(user=None, title=None, message=None, obj=None):
+    """
+    Same as `create_notification`, but written to the outbox: the
+    notification is created by the dispatcher only if the current transaction
+    commits, bulk inserted with the others of its batch.
+    """
+    return OutboxEvent.objects.create(kind='notification', payload={
+        'user_id': user.username,
+        'user_ref_id': user.pk,
+        'title': title,
+        'message': message,
+        'content_type_id': ContentType.objects.get_for_model(obj).pk,
+        'object_id': obj.pk,
+    })
+
+
+def get_last_read_id(user):
+    return NotificationWatermark.objects.filter(user=user).values_list(
+        'last_read_id', flat=True).first() or 0
+
+
+def unread_notifications(user, last_read_id=None):
+    """Only the notifications above the watermark are looked at."""
+    if last_read_id is None:
+        last_read_id = get_last_read_id(user)
+
+    return Notification.objects.filter(
+        **by_user(user), id__gt=last_read_id, is_read=False)
+
+
+def mark_all_notifications_read(user):
+    """
+    One row update, whatever the amount of unread notifications. The
+    watermark never moves down, a concurrent mark may have moved it further.
+    """
+    last_id = Notification.objects.filter(**by_user(user)).order_by(
+        '-id').values_list('id', flat=True).first()
+    if last_id is None:
+        return None
+
+    with transaction.atomic():
+        watermark, created = NotificationWatermark.objects.select_for_update(
+        ).get_or_create(user=user)
+        NotificationWatermark.objects.filter(pk=watermark.pk).update(
+            last_read_id=Greatest(F('last_read_id'), last_id), last_read_at=timezone.now())
+
+    return last_id
+
+
+def mark_notifications_read(user, ids):
+    """
+    Flag as read the notifications of `ids` above the watermark (the reads out
+    of order). If no unread is left under the newest of them, the watermark
+    moves up to it instead, and the flags under it stop mattering.
+    """
+    with transaction.atomic():
+        watermark, created = NotificationWatermark.objects.select_for_update(
+        ).get_or_create(user=user)
+
+        ids = [pk for pk in ids if pk > watermark.last_read_id]
+        if not ids:
+            return 0
+
+        updated = Notification.objects.filter(
+            **by_user(user), id__in=ids).update(is_read=True)
+
+        newest = max(ids)
+        if not unread_notifications(user, watermark.last_read_id).filter(id__lte=newest).exists():
+            watermark.last_read_id = newest
+            watermark.last_read_at = timezone.now()
+            watermark.save()
+
+    return updated
+
+
+def grant_credits(user, amount, reason, reservation=None):
+    """
+    Add `amount` credits to `user`: a ledger entry and an `F()` increment of
+    the balance, in one transaction, so concurrent grants and spends never
+    lose an update. Returns the ledger entry.
+    """
+    with transaction.atomic():
+        entry = CreditTransaction.objects.create(
+            user=user, amount=amount, reason=reason,
+            reservation_id=reservation.pk if reservation else None)
+
+        if not Credit.objects.filter(**by_user(user)).update(amount=F('amount') + amount):
+            try:
+                with transaction.atomic():
+                    Credit.objects.create(user=user, amount=amount)
+            except IntegrityError:
+                # Created meanwhile by another grant.
+                Credit.objects.filter(**by_user(user)).update(amount=F('amount') + amount)
+
+    return entry
+
+
+def spend_credits(user, amount, reason='spent', reservation=None):
+    """
+    Take `amount` credits from `user` if the balance has them, checked and
+    decremented by the same `UPDATE`. Returns the ledger entry, or None if
+    the balance was not enough (then nothing is written).
+    """
+    with transaction.atomic():
+        spent = Credit.objects.filter(
+            **by_user(user), amount__gte=amount
+        ).update(amount=F('amount') - amount)
+        if not spent:
+            return None
+
+        return CreditTransaction.objects.create(
+            user=user, amount=-amount, reason=reason,
+            reservation_id=reservation.pk if reservation else None)
+
+
 def create_strike(res: None, reason: None):
 
     strike = Strike.objects.create(
@@ -72,7 +335,7 @@ def create_penalty(user):
         end_date=end_date_prev
     )
 
-    create_notification(
+    outbox_notification(
         user,
         title=f"You have been penalized.",
         message=f"Hi {user},",
@@ -98,3 +361,227 @@ def add_strike_to_strike_group(user, strike: Strike):
         strike_group.strikes.add(strike)
 
     return strike_group
+
+
+def make_reservation_available(reservation):
+    reservation.status = 'available'
+    reservation.save()
+
+    outbox_notification(
+        user=reservation.user,
+        title="Book Available to be retire.",
+        message=f"Good news! Your reservation for the book {reservation.book} from {reservation.start_date} to {reservation.end_date} "
+                f"is now available for pickup.",
+        obj=reservation
+    )
+
+
+def end_never_picked_up_reservation(reservation):
+    reservation.status = 'waiting_payment'
+    reservation.penalty_price = Decimal('0.00')
+    reservation.final_price = reservation.initial_price
+    reservation.notes = f"The reservation of the book {reservation.book} made from {reservation.start_date} to " \
+        f"{reservation.end_date} ended. Even though you never picked up the book, " \
+        f"you must still pay the amount since you deprived another user " \
+        f"of purchasing it for this period of time."
+
+    reservation.save()
+
+
+def expire_retired_reservation(reservation):
+    """
+    Expire a reservation whose book was not returned on time and issue the
+    strike. Returns the reservation of other user that starts today with the
+    same book, which must be canceled with credits (`apply_credits`).
+    """
+    reservation.status = 'expired'
+    reservation.save()
+
+    reservation.refresh_from_db()
+
+    strike = create_strike(
+        res=reservation,
+        reason=f'You must return the Book, {reservation.book} on {reservation.end_date}'
+    )
+
+    outbox_notification(
+        user=reservation.user,
+        title="Strike issued for not returning the book on time",
+        message=f"Dear {reservation.user}, a strike has been issued against your account due to the late return of the book {reservation.book}. "
+                f"Remember that you reserved the book from {reservation.start_date} to {reservation.end_date}, "
+                f"we remind you that for each day past the deadline you will be charged an extra $4.",
+        obj=strike
+    )
+
+    add_strike_to_strike_group(user=reservation.user, strike=strike)
+
+    return Reservation.objects.filter(
+        book=reservation.book, start_date=date.today()).first()
+
+
+def advance_reservation(reservation):
+    """
+    Apply every transition that is due today, in order (a stale confirmed
+    reservation can end as waiting payment). Returns the reservation to cancel
+    with credits, if any.
+    """
+    today = date.today()
+    to_cancel = None
+
+    if reservation.status == 'confirmed' and reservation.start_date <= today:
+        make_reservation_available(reservation)
+
+    if reservation.status == 'available' and reservation.end_date <= today:
+        end_never_picked_up_reservation(reservation)
+
+    if reservation.status == 'retired' and reservation.end_date < today:
+        to_cancel = expire_retired_reservation(reservation)
+
+    return to_cancel
+
+
+def complete_penalty(penalty):
+    penalty.complete = True
+    penalty.save()
+
+    outbox_notification(
+        user=penalty.user,
+        title="Penalization Ended.",
+        message=f"Good news {penalty.user}! The penalization period has ended. "
+                f"You are now free from any associated restrictions.",
+        obj=penalty
+    )
+
+
+def queue_notification_digests(chunk_size=DIGEST_CHUNK_SIZE):
+    """
+    Queue one digest email per subscribed user with the notifications unread
+    since their last digest. Users are streamed by primary key in chunks, and
+    the notifications of a chunk come in one query ordered by user.
+    """
+    started_at = timezone.now()
+    queued = 0
+    last_pk = 0
+
+    while True:
+        users = list(User.objects.filter(
+            notification_digest=True, is_active=True, pk__gt=last_pk
+        ).order_by('pk').values(
+            'pk', 'username', 'email', 'last_digest_at',
+            last_read_id=Coalesce('notification_watermark__last_read_id', 0)
+        )[:chunk_size])
+        if not users:
+            return queued
+        last_pk = users[-1]['pk']
+
+        by_username = {user['username']: user for user in users}
+
+        notifications = Notification.objects.filter(
+            user_id__in=by_username.keys(), is_read=False, created_at__lte=started_at,
+            id__gt=min(user['last_read_id'] for user in users)
+        ).order_by('user_id', '-created_at').values('id', 'user_id', 'title', 'message', 'created_at')
+
+        last_digests = [user['last_digest_at'] for user in users]
+        if all(last_digests):
+            notifications = notifications.filter(created_at__gt=min(last_digests))
+
+        emails = []
+        for username, rows in groupby(notifications.iterator(), key=lambda row: row['user_id']):
+            since = by_username[username]['last_digest_at']
+            last_read_id = by_username[username]['last_read_id']
+            rows = [
+                {'title': row['title'], 'message': row['message']}
+                for row in rows
+                if row['id'] > last_read_id and (since is None or row['created_at'] > since)
+            ]
+            if not rows:
+                continue
+
+            emails.append(QueuedEmail(
+                to_email=by_username[username]['email'],
+                subject=f'You have {len(rows)} unread notifications.',
+                template='notification_digest_message.html',
+                context={'user': username, 'notifications': rows[:DIGEST_MAX_NOTIFICATIONS]},
+            ))
+
+        QueuedEmail.objects.bulk_create(emails)
+        User.objects.filter(pk__in=[user['pk'] for user in users]).update(last_digest_at=started_at)
+        queued += len(emails)
+
+
+def _move_notifications(notifications):
+    """Copy the rows of `notifications` (a queryset) to the archive and delete them."""
+    rows = list(notifications.values(
+        'id', 'title', 'message', 'content_type_id', 'object_id', 'created_at',
+        user_pk=F('user__id')))
+
+    ArchivedNotification.objects.bulk_create([
+        ArchivedNotification(
+            id=row['id'], user_id=row['user_pk'], title=row['title'], message=row['message'],
+            content_type_id=row['content_type_id'], object_id=row['object_id'],
+            created_at=row['created_at'],
+        ) for row in rows
+    ], ignore_conflicts=True)
+    Notification.objects.filter(id__in=[row['id'] for row in rows]).delete()
+
+    return len(rows)
+
+
+def archive_read_notifications(days=None, chunk_size=ARCHIVE_CHUNK_SIZE):
+    """
+    Move one chunk of the read notifications (flagged or under the watermark
+    of their user) older than `days` to `ArchivedNotification`. Returns the
+    amount moved, less than `chunk_size` once nothing is left.
+    """
+    if days is None:
+        days = settings.NOTIFICATION_RETENTION_DAYS
+    limit = timezone.now() - timedelta(days=days)
+
+    with transaction.atomic():
+        ids = list(Notification.objects.filter(
+            Q(is_read=True) | Q(id__lte=F('user__notification_watermark__last_read_id')),
+            created_at__lt=limit
+        ).order_by('id').values_list('id', flat=True)[:chunk_size])
+
+        return _move_notifications(Notification.objects.filter(id__in=ids))
+
+
+def archive_terminal_reservations(days=None, chunk_size=ARCHIVE_CHUNK_SIZE):
+    """
+    Move one chunk of the completed and canceled reservations that ended more
+    than `days` ago, with their notifications, to `ArchivedReservation`.
+    Reservations with a strike stay, the strikes count for the penalties.
+    Returns the amount moved.
+    """
+    if days is None:
+        days = settings.RESERVATION_RETENTION_DAYS
+    limit = date.today() - timedelta(days=days)
+
+    with transaction.atomic():
+        rows = list(Reservation.objects.filter(
+            status__in=TERMINAL_RESERVATION_STATUSES, end_date__lt=limit, strike__isnull=True
+        ).order_by('id').values(
+            'id', 'start_date', 'end_date', 'status', 'returned_date', 'initial_price',
+            'penalty_price', 'final_price', 'notes', 'created_at',
+            user_pk=F('user__id'), book_slug=F('book__slug'), book_title=F('book__title')
+        )[:chunk_size])
+        if not rows:
+            return 0
+        ids = [row['id'] for row in rows]
+
+        ArchivedReservation.objects.bulk_create([
+            ArchivedReservation(
+                id=row['id'], user_id=row['user_pk'], book_slug=row['book_slug'],
+                book_title=row['book_title'], start_date=row['start_date'],
+                end_date=row['end_date'], status=row['status'],
+                returned_date=row['returned_date'], initial_price=row['initial_price'],
+                penalty_price=row['penalty_price'], final_price=row['final_price'],
+                notes=row['notes'], created_at=row['created_at'],
+            ) for row in rows
+        ], ignore_conflicts=True)
+
+        _move_notifications(Notification.objects.filter(
+            content_type=ContentType.objects.get_for_model(Reservation), object_id__in=ids))
+        Reservation.objects.filter(id__in=ids).delete()
+
+    return len(rows)
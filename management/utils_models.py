@@ -1,17 +1,21 @@
-from datetime import datetime, date
+from datetime import datetime, date, time, timedelta
+from decimal import Decimal
 from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 # from .models import Notification, Reservation
 
 
-def calculate_initial_price(start_date: datetime = None, end_date: datetime = None) -> float:
+PRICE_PER_DAY = Decimal('2.00')
+PENALTY_PER_DAY = Decimal('4.00')
+
+
+def calculate_initial_price(start_date: datetime = None, end_date: datetime = None) -> Decimal:
     if start_date and end_date:
         try:
-            base_price_per_day = 2.0
             duration = (end_date - start_date).days + 1
 
-            base_price = duration * base_price_per_day
-
-            return round(base_price, 2)
+            return duration * PRICE_PER_DAY
 
         except:
             pass
@@ -19,6 +23,18 @@ def calculate_initial_price(start_date: datetime = None, end_date: datetime = No
     return None
 
 
+def start_of_day(day, days_after=0):
+    """
+    Aware datetime of the local midnight that opens `day` (plus `days_after`).
+    """
+    if isinstance(day, str):
+        day = parse_date(day)
+    if isinstance(day, datetime):
+        day = day.date()
+
+    return timezone.make_aware(datetime.combine(day + timedelta(days=days_after), time.min))
+
+
 # def create_notification_for_reservation_status(reservation):
 #     if reservation.status == 'available':
 #         title = f'Reservation of book: {reservation.book}, is now available to be retired.'
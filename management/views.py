@@ -1,5 +1,4 @@
 from datetime import date
-from django.db.models import Q
 from django.db import transaction
 from django.shortcuts import get_object_or_404
 
@@ -13,11 +12,13 @@ from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 
 from core.serializers import DetailSerializer, DummySerializer
-from core.utils import GenericPagination
+from core.utils import GenericPagination, by_user
 
 from .serializers import *
+from .availability import is_available, unavailable_periods
 from .permissions import IsUserNotPenalized
 from .tasks import notifications_as_read
+from .utils import get_last_read_id, mark_all_notifications_read, unread_notifications
 
 
 class FavoriteViewSet(viewsets.GenericViewSet):
@@ -36,9 +37,9 @@ class FavoriteViewSet(viewsets.GenericViewSet):
 
     def get_queryset(self, lookup=None):
         if lookup:
-            return Favorite.objects.select_related('book').filter(user=self.request.user, book=lookup)
+            return Favorite.objects.select_related('book').filter(**by_user(self.request.user), book=lookup)
         else:
-            return Favorite.objects.select_related('book').filter(user=self.request.user).order_by('-created_at')
+            return Favorite.objects.select_related('book').filter(**by_user(self.request.user)).order_by('-created_at')
 
     @extend_schema(
         responses={200: ListFavoriteSerializer},
@@ -179,29 +180,11 @@ class ReservationViewSet(viewsets.ModelViewSet):
     serializer_class = CreateReservationSerializer
     pagination_class = GenericPagination
 
-    def get_queryset(self, lookup=None, book=None, start_date=None, end_date=None):
+    def get_queryset(self, lookup=None):
         if lookup:
             return Reservation.objects.select_related('book').filter(id=lookup).first()
 
-        if book and start_date and end_date:
-            overlapping_reservations = Reservation.objects.select_related('book').filter(
-                Q(book__slug__exact=book) &
-                Q(start_date__lte=end_date) &
-                Q(end_date__gte=start_date) &
-                Q(status__in=['confirmed', 'available', 'expired', 'retired'])
-            )
-            return overlapping_reservations
-        if book:
-            today = date.today()
-            unavailable_periods = Reservation.objects.select_related('book').filter(
-                Q(book__slug__exact=book) &
-                Q(end_date__gte=today) &
-                Q(status__in=['confirmed', 'available', 'expired', 'retired'])
-            ).values('start_date', 'end_date').order_by('-start_date')
-
-            return unavailable_periods
-
-        return Reservation.objects.select_related('book').filter(user=self.request.user).order_by('start_date')
+        return Reservation.objects.select_related('book').filter(**by_user(self.request.user)).order_by('start_date')
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -216,6 +199,10 @@ class ReservationViewSet(viewsets.ModelViewSet):
             return CheckReservationAvailabilitySerializer
         elif self.action == 'unavailable_periods_to_reservation':
             return UnavailableReservationPeriodsSerializer
+        elif self.action == 'archive':
+            return ArchivedReservationSerializer
+        elif self.action == 'check_in':
+            return CheckInSerializer
 
     def get_permissions(self):
 
@@ -223,7 +210,7 @@ class ReservationViewSet(viewsets.ModelViewSet):
             return [AllowAny(), ]
         elif self.action == 'create':
             return [IsAuthenticated(), IsUserNotPenalized()]
-        elif self.action in ['list', 'retrieve', 'destroy']:
+        elif self.action in ['list', 'retrieve', 'destroy', 'archive']:
             return [IsAuthenticated(), ]
         else:
             return [IsAdminUser(), ]
@@ -251,7 +238,7 @@ class ReservationViewSet(viewsets.ModelViewSet):
             The user has a penalty in progress..\n
         '''
         penalty = Penalty.objects.filter(
-            user=self.request.user,
+            **by_user(self.request.user),
             complete=False
         )
         if not penalty:
@@ -587,17 +574,19 @@ class ReservationViewSet(viewsets.ModelViewSet):
             ### Response(Failure):\n
             - `400 BAD REQUEST`:
             Invalid input data. Check the response for details\n
+            - `404 Not found`:
+            Book with that slug not found.\n
         '''
         availability_serializer = self.get_serializer_class()(data=request.query_params)
         if availability_serializer.is_valid():
 
-            overlap = self.get_queryset(
-                book=availability_serializer.validated_data['book'],
-                start_date=availability_serializer.validated_data['start_date'],
-                end_date=availability_serializer.validated_data['end_date'],
+            available = is_available(
+                get_object_or_404(Book, slug=availability_serializer.validated_data['book']),
+                availability_serializer.validated_data['start_date'],
+                availability_serializer.validated_data['end_date'],
             )
 
-            return Response({'is_available': not overlap.exists()}, status=status.HTTP_200_OK)
+            return Response({'is_available': available}, status=status.HTTP_200_OK)
         else:
             return Response(availability_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -616,14 +605,15 @@ class ReservationViewSet(viewsets.ModelViewSet):
     )
     def unavailable_periods_to_reservation(self, request, *args, **kwargs):
         '''
-            List Unavailability periods to reserve of a book (ANY). \n
+            List Unavailability periods to reserve of a book (ANY), from today on.
+            Only the periods in which every copy of the book is reserved.\n
             ### Path Parameter:\n
             - `book` (str): Slug of the book.\n
 
             ### Response(Success):\n
             - `200 OK` : List of periods.\n
-                - `start_date` (string): Date, format YYYY-mm-dd, when start a reservation.\n
-                - `end_date` (string): Date, format YYYY-mm-dd, when end a reservation.\n
+                - `start_date` (string): Date, format YYYY-mm-dd, when the period starts.\n
+                - `end_date` (string): Date, format YYYY-mm-dd, when the period ends.\n
             ### Response(Failure):\n
             - `400 Bad REQUEST`:
             Invalid input data. Check the response for details\n
@@ -634,26 +624,120 @@ class ReservationViewSet(viewsets.ModelViewSet):
         if book:
             book_q = Book.objects.filter(slug__iexact=book).first()
             if book_q:
-                periods = self.get_queryset(book=book_q.slug)
-                if periods.exists():
-                    periods_serializer = self.get_serializer_class()(instance=periods, many=True)
-                    return Response(periods_serializer.data, status=status.HTTP_200_OK)
-                else:
-                    return Response([], status=status.HTTP_200_OK)
+                periods = [
+                    {'start_date': start_date, 'end_date': end_date}
+                    for start_date, end_date in unavailable_periods(book_q)
+                ]
+                periods_serializer = self.get_serializer_class()(instance=periods, many=True)
+                return Response(periods_serializer.data, status=status.HTTP_200_OK)
             else:
                 return Response({'detail': 'Bool parsed not found.'}, status=status.HTTP_404_NOT_FOUND)
         else:
             return Response({'book': 'Book slug required as query parameter.'}, status=status.HTTP_400_BAD_REQUEST)
 
 
+    @extend_schema(
+        responses={200: ArchivedReservationSerializer(many=True)},
+        parameters=[
+            OpenApiParameter(
+                name='page', description='Page number.', type=int),
+            OpenApiParameter(
+                name='page_size', description='Amount of results per page (max 30).', type=int),
+        ],
+    )
+    @action(methods=['GET'], detail=False, url_path="archive", url_name="archive")
+    def archive(self, request, *args, **kwargs):
+        '''
+            List of user's archived reservations (Only Users that are Authenticate). \n
+            Completed and canceled reservations are moved to the archive some time after they end,
+            `RESERVATION_RETENTION_DAYS`, and are no longer listed with the reservations.\n
+
+            ### Query Parameters :\n
+            - `page` (int): Page to get.\n
+            - `page_size` (int): Amount of reservations to get per page.\n
+
+            ### Response(Success):\n
+            - `200 OK` : List of archived reservations, newest first.\n
+                - `id` (int): Reservation ID.\n
+                - `book_slug` (str): Slug of the reserved book.\n
+                - `book_title` (str): Title of the reserved book.\n
+                - `start_date` (str): Date, format YYYY-mm-dd, when started the reservation.\n
+                - `end_date` (str): Date, format YYYY-mm-dd, when ended the reservation.\n
+                - `status` (str): completed, canceled_user or canceled_system.\n
+                - `returned_date` (str): Date, format YYYY-mm-dd, when the book was returned.\n
+                - `initial_price` (decimal): Price for the period of reservation.\n
+                - `penalty_price` (decimal): Penalty price.\n
+                - `final_price` (decimal): Final price.\n
+                - `notes` (str): Notes of the reservation.\n
+                - `created_at` (str): Date time when was created the reservation.\n
+                - `archived_at` (str): Date time when was archived.\n\n
+
+            ### Response(Failure):\n
+            - `401 Unauthorized`:
+            If the user is not authenticated.\n
+        '''
+        reservations = ArchivedReservation.objects.filter(user=request.user)
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(reservations, request, view=self)
+        return paginator.get_paginated_response(
+            self.get_serializer_class()(instance=page, many=True).data)
+
+    @extend_schema(
+        request=CheckInSerializer,
+        responses={200: DetailSerializer},
+    )
+    @action(methods=['POST'], detail=False, url_path='check-in', url_name='check-in')
+    def check_in(self, request, *args, **kwargs):
+        '''
+            Return desk, register the return of many books at once (Only Users with Admin Range).\n
+            Penalties and final prices are computed like `PATCH /reservation/<id>/` with `returned_date`,
+            all the batch is written in one transaction.\n
+
+            ### Request Body :\n
+            - `returns` (list): Returned books, up to 1000.\n
+                - `reservation` (int)(optional): Reservation ID.\n
+                - `book` (str)(optional): Slug of the book, instead of the reservation ID. Only when
+                one reservation of the book is retired or expired.\n
+                - `returned_date` (str)(optional): Date, format YYYY-mm-dd, when was returned. Today by default.\n
+
+            ### Response(Success):\n
+            - `200 OK` : Result of each return, in the order of the request.\n
+                - `detail` (str): Amount of returns registered.\n
+                - `results` (list):\n
+                    - `reservation` (int): Reservation ID.\n
+                    - `book` (str): Slug of the book.\n
+                    - `status` (str): completed.\n
+                    - `returned_date` (str): Date, format YYYY-mm-dd, when was returned.\n
+                    - `penalty_price` (decimal): Penalty price.\n
+                    - `final_price` (decimal): Final price.\n
+                    - `error` (str): Instead of the fields above, why the return was not registered.\n
+
+            ### Response(Failure):\n
+            - `400 BAD REQUEST`:
+            Invalid input data. Check the response for details.\n
+            - `401 Unauthorized`:
+            If the user is not authenticated.\n
+            - `403 Forbidden`:
+            If the user is not admin.\n
+        '''
+        check_in_serializer = self.get_serializer_class()(data=request.data)
+        if check_in_serializer.is_valid():
+            results = check_in_serializer.save()
+            returned = sum(1 for result in results if 'error' not in result)
+
+            return Response({'detail': f'{returned} returns registered.', 'results': results}, status=status.HTTP_200_OK)
+        else:
+            return Response(check_in_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
 class CreditViewSet(viewsets.GenericViewSet):
     serializer_class = CreditRetrieveSerializer
 
     def get_queryset(self):
-        user_credit, create = Credit.objects.get_or_create(
-            user=self.request.user
-        )
-        return user_credit
+        # Without a row yet, an unsaved one with 0 credits: reads never write.
+        user_credit = Credit.objects.filter(**by_user(self.request.user)).first()
+        return user_credit or Credit(user=self.request.user, amount=0)
 
     def get_serializer_class(self):
         if self.action == 'subtract':
@@ -744,7 +828,7 @@ class StrikeViewSet(viewsets.GenericViewSet):
     permission_classes = [IsAuthenticated,]
 
     def get_queryset(self):
-        strikes = Strike.objects.filter(reservation__user=self.request.user)
+        strikes = Strike.objects.filter(**by_user(self.request.user, 'reservation__'))
 
         return strikes
 
@@ -833,12 +917,12 @@ class PenaltyViewSet(viewsets.GenericViewSet):
     def get_queryset(self, lookup=None):
         if lookup:
             penalty = get_object_or_404(
-                Penalty, id=lookup, user=self.request.user)
+                Penalty, id=lookup, **by_user(self.request.user))
             strikes = StrikeGroup.objects.select_related(
                 'penalty').filter(penalty=penalty).first()
             return strikes
         else:
-            return Penalty.objects.filter(user=self.request.user)
+            return Penalty.objects.filter(**by_user(self.request.user))
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -963,21 +1047,29 @@ class NotificationViewSet(viewsets.GenericViewSet):
     permission_classes = [IsAuthenticated, ]
     pagination_class = GenericPagination
 
+    def get_last_read_id(self):
+        if not hasattr(self, '_last_read_id'):
+            self._last_read_id = get_last_read_id(self.request.user)
+        return self._last_read_id
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['last_read_id'] = self.get_last_read_id()
+        return context
+
     def get_queryset(self, not_read=None, lookup=None):
         notis = None
 
         if not_read:
-            notis = Notification.objects.filter(
-                user=self.request.user,
-                is_read=False
-            )
+            notis = unread_notifications(
+                self.request.user, self.get_last_read_id())
         else:
             notis = Notification.objects.filter(
-                user=self.request.user
+                **by_user(self.request.user)
             )
         if lookup:
             notis = Notification.objects.filter(
-                id=lookup, user=self.request.user).first()
+                id=lookup, **by_user(self.request.user)).first()
 
         return notis
 
@@ -987,6 +1079,8 @@ class NotificationViewSet(viewsets.GenericViewSet):
     def list(self, request, *args, **kwargs):
         """
             List notifications that have a user (Only Users that are Authenticate). \n
+            To receive the new ones as they arrive, open the Server-Sent Events stream
+            `GET /notification/stream/` instead of polling this list.\n
 
             ### Query Parameters:\n
             - `not_read` (boolean)(optional): If true, only fetch unread notifications.\n
@@ -1018,7 +1112,7 @@ class NotificationViewSet(viewsets.GenericViewSet):
 
             if notis.exists():
                 notis_serializer = self.serializer_class(
-                    instance=notis, many=True)
+                    instance=notis, many=True, context=self.get_serializer_context())
                 paginator = self.pagination_class()
                 paginator_data = paginator.paginate_queryset(
                     notis_serializer.data,
@@ -1067,7 +1161,8 @@ class NotificationViewSet(viewsets.GenericViewSet):
                 noti = self.get_queryset(lookup=pk)
 
                 if noti:
-                    noti_serializer = self.serializer_class(instance=noti)
+                    noti_serializer = self.serializer_class(
+                        instance=noti, context=self.get_serializer_context())
                     notifications_as_read.delay(
                         user=request.user.username, notifications=[noti.id])
 
@@ -1078,3 +1173,200 @@ class NotificationViewSet(viewsets.GenericViewSet):
                 return Response({'detail': 'Invalid notification id.'}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({'detail': f'Error on server side.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @extend_schema(request=None, responses={200: DetailSerializer})
+    @action(methods=['POST'], detail=False, url_path="read-all", url_name="read-all")
+    def read_all(self, request, *args, **kwargs):
+        '''
+        Mark every notification of the authenticate user as read (Only Users that are Authenticate). \n
+        Moves the read watermark of the user up to its last notification, the cost does not depend
+        on the amount of unread notifications.\n
+
+        ### Response(Success):\n
+        - `200 OK` : .\n
+            - `detail` (str): Notifications marked as read.\n
+
+        ### Response(Failure):\n
+        - `401 Unauthorized`:
+            If the user is not authenticated.\n
+        '''
+        mark_all_notifications_read(request.user)
+        return Response({'detail': 'Notifications marked as read.'}, status=status.HTTP_200_OK)
+
+    @extend_schema(responses={200: DetailSerializer})
+    @action(methods=['GET'], detail=False, url_path="amount", url_name="amount")
+    def get_amount(self, request, *args, **kwargs):
+        '''
+        Get amount of unread notifications of the authenticate user (Only Users that are Authenticate). \n
+        Only the notifications above the read watermark are counted.\n
+
+        ### Response(Success):\n
+        - `200 OK` : .\n
+            - `amount_unread_notifications` (int): Number of unread notifications the user has.\n
+
+        ### Response(Failure):\n
+        - `401 Unauthorized`:
+            If the user is not authenticated.\n
+        '''
+        n_amount = self.get_queryset(not_read=True).count()
+        return Response({'amount_unread_notifications': n_amount}, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        responses={200: ArchivedNotificationSerializer(many=True)},
+        parameters=[
+            OpenApiParameter(
+                name='page', description='Page number.', type=int),
+            OpenApiParameter(
+                name='page_size', description='Amount of results per page (max 30).', type=int),
+        ],
+    )
+    @action(methods=['GET'], detail=False, url_path="archive", url_name="archive")
+    def archive(self, request, *args, **kwargs):
+        '''
+        List archived notifications of the authenticate user (Only Users that are Authenticate). \n
+        Read notifications are moved to the archive after `NOTIFICATION_RETENTION_DAYS`.\n
+
+        ### Query Parameters:\n
+        - `page` (int): Page to get.\n
+        - `page_size` (int): Amount of notifications to get per page.\n
+
+        ### Response(Success):\n
+        - `200 OK` : List of archived notifications, newest first.\n
+            - `id` (int): Notification ID.\n
+            - `title` (str): Title of the notification.\n
+            - `message` (str): Body of the notification.\n
+            - `type` (str): Model name which is related the notification.\n
+            - `object_id` (int): ID of the related object.\n
+            - `created_at` (str): Date time when was sent.\n
+            - `archived_at` (str): Date time when was archived.\n
+
+        ### Response(Failure):\n
+        - `401 Unauthorized`:
+            If the user is not authenticated.\n
+        '''
+        notifications = ArchivedNotification.objects.filter(
+            user=request.user).select_related('content_type')
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(notifications, request, view=self)
+        return paginator.get_paginated_response(
+            ArchivedNotificationSerializer(instance=page, many=True).data)
+
+
+class WaitlistViewSet(viewsets.GenericViewSet):
+    serializer_class = WaitlistEntrySerializer
+    pagination_class = GenericPagination
+
+    def get_queryset(self):
+        return WaitlistEntry.objects.select_related('book').filter(
+            user=self.request.user).order_by('-created_at')
+
+    def get_permissions(self):
+        if self.action == 'create':
+            return [IsAuthenticated(), IsUserNotPenalized()]
+        return [IsAuthenticated(), ]
+
+    @extend_schema(
+        responses={200: WaitlistEntrySerializer(many=True)},
+        parameters=[
+            OpenApiParameter(
+                name='page', description='Page number.', type=int),
+            OpenApiParameter(
+                name='page_size', description='Amount of results per page (max 30).', type=int),
+        ],
+    )
+    def list(self, request, *args, **kwargs):
+        '''
+            List of user's waitlist entries (Only Users that are Authenticate). \n
+
+            ### Query Parameters :\n
+            - `page` (int): Page to get.\n
+            - `page_size` (int): Amount of entries to get per page.\n
+
+            ### Response(Success):\n
+            - `200 OK` : List of entries, newest first.\n
+                - `id` (int): Entry ID.\n
+                - `book` (str): Slug of the book.\n
+                - `start_date` (str): Date, format YYYY-mm-dd, when starts the period waited.\n
+                - `end_date` (str): Date, format YYYY-mm-dd, when ends the period waited.\n
+                - `status` (str): waiting, promoted, canceled or expired.\n
+                - `reservation` (int): ID of the reservation made when promoted, otherwise null.\n
+                - `created_at` (str): Date time when joined the waitlist.\n
+                - `promoted_at` (str): Date time when was promoted, otherwise null.\n
+
+            ### Response(Failure):\n
+            - `401 Unauthorized`:
+            If the user is not authenticated.\n
+        '''
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(self.get_queryset(), request, view=self)
+        return paginator.get_paginated_response(
+            self.get_serializer_class()(instance=page, many=True).data)
+
+    @extend_schema(responses={201: WaitlistEntrySerializer})
+    def create(self, request, *args, **kwargs):
+        '''
+            Join the waitlist of a book that is not available in a period (Only Users that are Authenticate).\n
+            When a reservation of the book is canceled or returned early, the waiters are reserved
+            the freed copy in order of request and notified, no need to poll `check/availability`.\n
+
+            ### Request Body :\n
+            - `book` (str): Slug of the book.\n
+            - `start_date` (str): Date, format YYYY-mm-dd, that is going to start the reservation.\n
+            - `end_date` (str): Date, format YYYY-mm-dd, that is going to end the reservation.\n
+
+            ### Response(Success):\n
+            - `201 Create` : Waitlist entry.\n
+
+            ### Response(Failure):\n
+            - `400 BAD REQUEST`:
+            Invalid input data, the book is available in the period or the user already waits for it.\n
+            - `401 Unauthorized`:
+            If the user is not authenticated.\n
+            - `403 For bidden`:
+            The user has a penalty in progress.\n
+        '''
+        entry_serializer = self.get_serializer_class()(data=request.data)
+        if entry_serializer.is_valid():
+            already_waiting = WaitlistEntry.objects.filter(
+                user=request.user,
+                book=entry_serializer.validated_data['book'],
+                status='waiting',
+                start_date__lte=entry_serializer.validated_data['end_date'],
+                end_date__gte=entry_serializer.validated_data['start_date'],
+            )
+            if already_waiting.exists():
+                return Response({'book': 'You are already waiting for this book in the specified period.'}, status=status.HTTP_400_BAD_REQUEST)
+
+            entry_serializer.save(user=request.user)
+            return Response(entry_serializer.data, status=status.HTTP_201_CREATED)
+        else:
+            return Response(entry_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @extend_schema(responses={204: DummySerializer})
+    def destroy(self, request, pk=None, *args, **kwargs):
+        '''
+            Leave the waitlist (Only Users that are Authenticate).\n
+
+            ### Path Parameter:\n
+            - `id` (int): ID of the waitlist entry.\n
+
+            ### Response(Success):\n
+            - `204 NO CONTENT` : Entry canceled.\n
+
+            ### Response(Failure):\n
+            - `400 BAD REQUEST`:
+            Invalid pk.\n
+            - `401 Unauthorized`:
+            If the user is not authenticated.\n
+            - `404 Not found`:
+            The user has no waiting entry with that ID.\n
+        '''
+        if not (pk and pk.isdigit()):
+            return Response({'detail': 'Invalid pk.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        canceled = self.get_queryset().filter(pk=pk, status='waiting').update(status='canceled')
+        if canceled:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        else:
+            return Response({'detail': 'Waitlist entry not found.'}, status=status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,78 @@
+"""
+Waitlist of the books, so readers are told when a period frees up instead of
+polling `check/availability`.
+
+A released reservation (`reservation_released`) writes a
+`management.tasks.promote_waitlist` outbox event in its own transaction. The
+task reserves the rest of its period for the first waiters, in order of
+request, whose period fits, and notifies them.
+"""
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.utils import by_user, outbox_tasks
+
+from .models import Penalty, WaitlistEntry
+from .signals import reservation_released
+from .utils import book_reservation, lock_book, outbox_notification
+
+
+@receiver(reservation_released)
+def enqueue_waitlist_promotion(sender, reservations, **kwargs):
+    outbox_tasks('management.tasks.promote_waitlist', [
+        {'reservation_id': reservation.pk} for reservation in reservations
+    ])
+
+
+def waiting_entries(book, start_date=None, end_date=None):
+    entries = WaitlistEntry.objects.filter(book=book, status='waiting')
+    if start_date:
+        entries = entries.filter(end_date__gte=start_date)
+    if end_date:
+        entries = entries.filter(start_date__lte=end_date)
+    return entries
+
+
+def promote_waitlist(book, start_date, end_date):
+    """
+    Reserve `book` for the waiters whose period overlaps the freed one, first
+    come first served; the ones that do not fit keep waiting. Returns the
+    amount of promoted entries.
+    """
+    promoted = 0
+    with transaction.atomic():
+        lock_book(book)
+
+        # Their period started, they can not be reserved anymore.
+        waiting_entries(book).filter(start_date__lt=date.today()).update(status='expired')
+
+        entries = waiting_entries(book, start_date, end_date).select_related('user')
+        for entry in entries:
+            if Penalty.objects.filter(**by_user(entry.user), complete=False).exists():
+                continue
+
+            try:
+                reservation = book_reservation(
+                    entry.user, book, entry.start_date, entry.end_date)
+            except ValidationError:
+                continue
+
+            entry.status = 'promoted'
+            entry.reservation_id = reservation.pk
+            entry.promoted_at = timezone.now()
+            entry.save()
+
+            outbox_notification(
+                user=entry.user,
+                title='Your waitlisted book was reserved.',
+                message=f"Good news! A copy of the book {book} was freed and reserved for you "
+                        f"from {entry.start_date} to {entry.end_date}.",
+                obj=reservation,
+            )
+            promoted += 1
+
+    return promoted
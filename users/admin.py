@@ -1,6 +1,13 @@
 from django.contrib import admin
 
-from .models import User
+from .models import User, QueuedEmail
 # Register your models here.
 
 admin.site.register(User)
+
+
+@admin.register(QueuedEmail)
+class QueuedEmailAdmin(admin.ModelAdmin):
+    list_display = ['id', 'to_email', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['to_email']
@@ -1,22 +1,55 @@
-from django.contrib.auth.backends import BaseBackend
-from .models import User
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
 from django.db.models import Q
 
+from .models import User, normalize_login, missing_login_cache_key
 
-class MyUserBackend(BaseBackend):
 
-    def authenticate(self, request, username=None, password=None):
-        try:
-            # Username or username Accepts
-            user = User.objects.get(Q(is_active=True) &
-                                    (Q(username__iexact=username) | Q(email__iexact=username)))
+class MyUserBackend(ModelBackend):
+    """
+    Authenticate with the username or the email in a single query.
 
-            if user.check_password(password) or user.password == password:
-                return user
+    Both are looked up through the lowercase, indexed `normalized_*` columns,
+    the password is hashed exactly once (against a dummy hash when there is no
+    user, so a miss takes as long as a wrong password) and the logins without
+    an active user are cached for `AUTH_MISSING_LOGIN_TIMEOUT` seconds.
+    """
 
-        except User.DoesNotExist:
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        user = self.get_login_user(normalize_login(username))
+        if user is None:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user.
+            User().set_password(password)
+            return None
+
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    def get_login_user(self, login):
+        cache_key = missing_login_cache_key(login)
+        if cache.get(cache_key):
             return None
 
+        users = list(User.objects.filter(
+            Q(normalized_username=login) | Q(normalized_email=login),
+            is_active=True
+        )[:2])
+        if not users:
+            cache.set(cache_key, True, settings.AUTH_MISSING_LOGIN_TIMEOUT)
+            return None
+
+        # A username that looks like the email of other user wins.
+        users.sort(key=lambda user: user.normalized_username != login)
+        return users[0]
+
     def get_user(self, user_id):
         try:
             return User.objects.get(pk=user_id)
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import user_version_cache_key
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    `JWTAuthentication` that keeps the resolved user in the cache for
+    `AUTH_USER_CACHE_TIMEOUT` seconds.
+
+    The entry is keyed by the user id plus a per-user version, bumped on every
+    `User.save()`/`delete()`, so a deactivation or a password change takes
+    effect on the next request while the rest of the requests read no row.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            return super().get_user(validated_token)
+
+        version = cache.get(user_version_cache_key(user_id), 0)
+        key = f'auth:user:{user_id}:{version}'
+
+        user = cache.get(key)
+        if user is None:
+            # Inactive or missing users raise here and are never cached.
+            user = super().get_user(validated_token)
+            cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+
+        return user
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    The user versions of `CachedJWTAuthentication` and the missing logins are
+    invalidated through the cache, a per process one does not reach the rest
+    of the workers and a revoked user keeps access until the entry expires.
+    """
+    if not settings.DEBUG and 'locmem' in settings.CACHES['default']['BACKEND'].lower():
+        return [Error(
+            'The default cache is local to each process.',
+            hint='Set CACHE_URL to the shared (Redis) cache.',
+            id='users.E001',
+        )]
+    return []
@@ -0,0 +1,63 @@
+import time
+import uuid
+
+from django.contrib.auth import authenticate
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from users.models import User, missing_login_cache_key
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Measure the login throughput of the authentication backends, on a throwaway user.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations', type=int, default=20,
+            help='Logins per scenario.')
+
+    def handle(self, *args, **options):
+        if options['iterations'] <= 0:
+            raise CommandError('--iterations must be bigger than 0.')
+
+        try:
+            with transaction.atomic():
+                self.run(options['iterations'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, iterations):
+        handle = uuid.uuid4().hex[:12]
+        password = uuid.uuid4().hex
+        User.objects.create_user(
+            first_name='Benchmark', last_name='Login', username=f'Bench-{handle}',
+            email=f'Bench-{handle}@example.com', password=password, is_active=True
+        )
+        missing = f'missing-{handle}'
+
+        scenarios = [
+            ('Username', f'bench-{handle}', password),
+            ('Email', f'BENCH-{handle}@example.com', password),
+            ('Wrong password', f'bench-{handle}', 'wrong-password'),
+            ('Missing user', missing, password),
+        ]
+
+        for name, login, secret in scenarios:
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    authenticate(username=login, password=secret)
+                elapsed = time.perf_counter() - start
+
+            self.stdout.write(
+                f'{name}: {iterations / elapsed:.1f} logins/sec, '
+                f'{len(queries) / iterations:.2f} queries/login.')
+
+        cache.delete(missing_login_cache_key(missing))
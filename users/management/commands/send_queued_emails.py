@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from users.utils import EMAIL_BATCH_SIZE, send_queued_emails
+
+
+class Command(BaseCommand):
+    help = 'Send the queued emails in batches through one connection and report the throughput.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=EMAIL_BATCH_SIZE,
+            help='Amount of emails claimed per batch.')
+
+    def handle(self, *args, **options):
+        result = send_queued_emails(batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['sent']} sent, {result['failed']} failed in {result['elapsed']}s "
+            f"({result['messages_per_second']} messages/sec)."))
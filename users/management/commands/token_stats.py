@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from users.utils import token_tables_stats
+
+
+class Command(BaseCommand):
+    help = 'Show the size of the refresh-token tables and of the blacklist Bloom filter.'
+
+    def handle(self, *args, **options):
+        stats = token_tables_stats()
+
+        self.stdout.write(
+            f"Outstanding tokens: {stats['outstanding']} ({stats['outstanding_expired']} expired).")
+        self.stdout.write(f"Blacklisted tokens: {stats['blacklisted']}.")
+
+        for table, size in stats['tables_bytes'].items():
+            self.stdout.write(f'{table}: {size / 1024 / 1024:.2f} MB.')
+
+        if stats['bloom_built_at'] is None:
+            self.stdout.write('Bloom filter: not built.')
+        else:
+            self.stdout.write(
+                f"Bloom filter: {stats['bloom_items']} tokens in {stats['bloom_bytes']} bytes, "
+                f"built at {stats['bloom_built_at']:%Y-%m-%d %H:%M:%S}.")
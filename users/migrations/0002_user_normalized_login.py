@@ -0,0 +1,33 @@
+# Generated by Django 4.2.9 on 2026-10-19 07:57
+
+from django.db import migrations, models
+from django.db.models.functions import Lower, Trim
+
+
+def fill_normalized_login(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    User.objects.update(
+        normalized_username=Lower(Trim('username')),
+        normalized_email=Lower(Trim('email')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='normalized_email',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=254),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='normalized_username',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(fill_normalized_login, migrations.RunPython.noop),
+    ]
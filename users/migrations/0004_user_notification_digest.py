@@ -0,0 +1,23 @@
+# Generated by Django 4.2.9 on 2026-10-19 08:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_queuedemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='last_digest_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='notification_digest',
+            field=models.BooleanField(default=False, help_text='Receive a daily email with the unread notifications.'),
+        ),
+    ]
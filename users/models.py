@@ -1,4 +1,5 @@
-from django.db import models
+from django.core.cache import cache
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 
@@ -10,8 +11,36 @@ from django.core.exceptions import ValidationError
 from core.models import DatesRecordsBaseModel
 
 
+def normalize_login(value):
+    return (value or '').strip().lower()
+
+
+def missing_login_cache_key(login):
+    return f'auth:missing:{login}'
+
+
+def forget_missing_login(*logins):
+    cache.delete_many([missing_login_cache_key(login) for login in logins if login])
+
+
+def user_version_cache_key(user_id):
+    return f'auth:user-version:{user_id}'
+
+
+def bump_user_version(user_id):
+    """
+    Invalidate the cached copies of the user (see `CachedJWTAuthentication`).
+    """
+    key = user_version_cache_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
 def get_profile_file_upload_path(self, filename):
-    return f'users/{self.username}/{filename}'
+    # The storage names the file by its content hash inside this directory.
+    return f'users/{filename}'
 
 
 class CustomAccountManager(BaseUserManager):
@@ -67,12 +96,22 @@ class User(AbstractBaseUser, PermissionsMixin, DatesRecordsBaseModel):
         upload_to=get_profile_file_upload_path, null=True, blank=True)
     email = models.EmailField(unique=True)
 
+    # Lowercase copies of the login columns, so the login is an indexed lookup.
+    normalized_username = models.CharField(
+        max_length=100, db_index=True, editable=False, default='')
+    normalized_email = models.CharField(
+        max_length=254, db_index=True, editable=False, default='')
+
     birth_date = models.DateField(null=True, blank=True)
 
     is_superuser = models.BooleanField(default=False)
     is_staff = models.BooleanField(default=False)
     is_active = models.BooleanField(default=False)
 
+    notification_digest = models.BooleanField(
+        default=False, help_text="Receive a daily email with the unread notifications.")
+    last_digest_at = models.DateTimeField(null=True, blank=True, editable=False)
+
     objects = CustomAccountManager()
 
     USERNAME_FIELD = 'username'
@@ -85,6 +124,33 @@ class User(AbstractBaseUser, PermissionsMixin, DatesRecordsBaseModel):
     def __str__(self):
         return self.username
 
+    def save(self, *args, **kwargs):
+        self.normalized_username = normalize_login(self.username)
+        self.normalized_email = normalize_login(self.email)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {
+                'normalized_username', 'normalized_email'}
+
+        super().save(*args, **kwargs)
+
+        # Once committed: a request meanwhile would cache the old row again
+        # under the new version (or the login as missing again).
+        user_id, logins = self.pk, (self.normalized_username, self.normalized_email)
+
+        def invalidate():
+            forget_missing_login(*logins)
+            bump_user_version(user_id)
+
+        transaction.on_commit(invalidate)
+
+    def delete(self, *args, **kwargs):
+        user_id = self.pk
+        result = super().delete(*args, **kwargs)
+        transaction.on_commit(lambda: bump_user_version(user_id))
+        return result
+
 
 class ResetLink(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -105,3 +171,33 @@ class ResetLink(models.Model):
         """
         self.used = True
         self.save()
+
+
+class QueuedEmail(models.Model):
+    """
+    Email waiting to be sent by `users.tasks.send_queued_emails`, which drains
+    them in batches through a single connection. Sent and failed rows are
+    purged after `EMAIL_RETENTION` by `users.tasks.purge_sent_emails`.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    template = models.CharField(max_length=255)
+    context = models.JSONField(default=dict, blank=True)
+
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default='pending', db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    next_attempt_at = models.DateTimeField(default=timezone.now, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.subject} to {self.to_email}, {self.status}.'
@@ -6,10 +6,11 @@ from django.core import exceptions as django_exceptions
 from django.db import IntegrityError, transaction
 from rest_framework import serializers
 from rest_framework.settings import api_settings
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
 
 
 from .models import User
+from .tokens import CachedBlacklistRefreshToken
 
 
 class ListProfileUserSerializer(serializers.ModelSerializer):
@@ -122,6 +123,10 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     pass
 
 
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = CachedBlacklistRefreshToken
+
+
 class SetPasswordSerializer(serializers.Serializer):
     password = serializers.CharField(
         max_length=252, min_length=8, write_only=True)
@@ -0,0 +1,17 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from .models import User
+from .utils import remember_blacklisted_token, remember_taken_login
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def blacklisted_token_created(sender, instance, created, **kwargs):
+    if created:
+        remember_blacklisted_token(instance.token.jti)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    remember_taken_login(instance)
@@ -1,45 +1,118 @@
 from celery import shared_task
 
-from django.template.loader import get_template
-from django.contrib.sites.shortcuts import get_current_site
-from django.utils.http import urlsafe_base64_encode
-from django.utils.encoding import force_bytes
-from django.core.mail import EmailMultiAlternatives
-from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 
-from .models import User
-from .tokens import account_activation_token
+from core.utils import OUTBOX_TASK_OPTIONS, consume_outbox_event
+
+from .models import ResetLink
+from .utils import (
+    EMAIL_BATCH_SIZE, account_email_context, build_blacklist_bloom_filter,
+    build_taken_logins_bloom_filter, purge_expired_tokens, purge_queued_emails, queue_email,
+    send_queued_emails
+)
+
+
+EMAIL_DRAIN_SCHEDULED_CACHE_KEY = 'users:email-drain-scheduled'
+# Seconds that a drain waits for the emails queued with the first one.
+EMAIL_DRAIN_COUNTDOWN = 2
+
+
+def schedule_email_drain():
+    """
+    Enqueue one drain for the emails being queued, not one per email; the
+    beat schedule drains every minute anyway.
+    """
+    if cache.add(EMAIL_DRAIN_SCHEDULED_CACHE_KEY, True, 60):
+        send_queued_emails_task.apply_async(countdown=EMAIL_DRAIN_COUNTDOWN)
+
+
+@shared_task(**OUTBOX_TASK_OPTIONS)
+def send_email(request_domain, request_secure, username, to_email, mail_subject: str, template: str,
+               reset_link_id=None, token=None, outbox_event_id=None):
+    try:
+        if token and not reset_link_id:
+            # Outbox events written before `reset_link_id`.
+            reset_link_id = ResetLink.objects.filter(
+                user__username=username, token=token).values_list('pk', flat=True).first()
+
+        context = account_email_context(
+            username, request_domain, request_secure, reset_link_id=reset_link_id)
+
+        with transaction.atomic():
+            # A redelivered message does not queue the email twice.
+            if outbox_event_id is None or consume_outbox_event(outbox_event_id):
+                queue_email(to_email, mail_subject, template, context)
+
+        # Drained together with any other email waiting.
+        schedule_email_drain()
+        return 'Task completed successfully. Email queued.'
+
+    except Exception as e:
+        if outbox_event_id is not None:
+            raise
+        return f"Task Fail Send mail to {username}: {str(e)}."
+
+
+@shared_task(name='users.tasks.send_queued_emails')
+def send_queued_emails_task(batch_size=EMAIL_BATCH_SIZE):
+    try:
+        # The emails queued from now on schedule another drain.
+        cache.delete(EMAIL_DRAIN_SCHEDULED_CACHE_KEY)
+        result = send_queued_emails(batch_size=batch_size)
+
+        return f"Task Completed Successfully. {result['sent']} sent, {result['failed']} failed, " \
+            f"{result['messages_per_second']} messages/sec."
+
+    except Exception as e:
+        return f"Task Fail : {str(e)}"
 
 
 @shared_task
-def send_email(request_domain, request_secure, username, to_email, mail_subject: str, template: str, token=None):
+def purge_sent_emails(chunk_size=1000, max_chunks=20):
     try:
+        purged = purge_queued_emails(chunk_size=chunk_size, max_chunks=max_chunks)
+
+        return f"Task Completed Successfully. {purged} sent or failed emails purged."
+
+    except Exception as e:
+        return f"Task Fail : {str(e)}"
+
+
+@shared_task
+def purge_expired_jwt_tokens(chunk_size=1000, max_chunks=20):
+    try:
+        purged = purge_expired_tokens(chunk_size=chunk_size, max_chunks=max_chunks)
+        if purged == chunk_size * max_chunks:
+            # Leave the worker to other tasks and go on with the next chunks.
+            purge_expired_jwt_tokens.delay(chunk_size=chunk_size, max_chunks=max_chunks)
+            return f"Task Completed Successfully. {purged} expired tokens purged, continuing."
+
+        build_blacklist_bloom_filter()
 
-        user = User.objects.get(username=username)
-        mail_subject = mail_subject
+        return f"Task Completed Successfully. {purged} expired tokens purged."
 
-        context = {
-            'user': user.username,
-            'domain': request_domain,
-            'uid': urlsafe_base64_encode(force_bytes(user.pk)),
-            'token': token if token else account_activation_token.make_token(user),
-            'protocol': 'https' if request_secure else 'http',
-        }
+    except Exception as e:
+        return f"Task Fail : {str(e)}"
 
-        temp = get_template(template)
 
-        content = temp.render(context)
+@shared_task
+def rebuild_blacklist_bloom_filter():
+    try:
+        bloom = build_blacklist_bloom_filter()
 
-        corr = EmailMultiAlternatives(
-            subject=mail_subject,
-            from_email=settings.EMAIL_HOST_USER,
-            to=[to_email],
-        )
+        return f"Task Completed Successfully. {bloom.count} blacklisted tokens."
 
-        corr.attach_alternative(content, 'text/html')
-        corr.send(fail_silently=False)
+    except Exception as e:
+        return f"Task Fail : {str(e)}"
 
-        return "Task Completed Successfully."
+
+@shared_task
+def rebuild_taken_logins_bloom_filter():
+    try:
+        bloom = build_taken_logins_bloom_filter()
+
+        return f"Task Completed Successfully. {bloom.count} usernames and emails."
 
     except Exception as e:
-        return f"Task Fail Send mail to {username}: {str(e)}."
+        return f"Task Fail : {str(e)}"
@@ -0,0 +1,74 @@
+import io
+from unittest import mock
+
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..models import User
+
+
+class MyUserBackendTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            first_name='Ana', last_name='Lopez', username='AnaLopez',
+            email='Ana.Lopez@Example.com', password='testpassword', is_active=True
+        )
+
+    def test_normalized_columns(self):
+        self.assertEqual(self.user.normalized_username, 'analopez')
+        self.assertEqual(self.user.normalized_email, 'ana.lopez@example.com')
+
+    def test_authenticate_username_or_email_one_query(self):
+        for login in ['analopez', 'ANALOPEZ', 'ana.lopez@example.com', ' Ana.Lopez@Example.com']:
+            with self.assertNumQueries(1):
+                user = authenticate(username=login, password='testpassword')
+            self.assertEqual(user, self.user)
+
+    def test_authenticate_wrong_password(self):
+        self.assertIsNone(authenticate(username='analopez', password='wrong'))
+
+    def test_authenticate_inactive_user(self):
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertIsNone(authenticate(username='analopez', password='testpassword'))
+
+    def test_missing_user_hashes_once_and_is_cached(self):
+        with mock.patch.object(PBKDF2PasswordHasher, 'encode',
+                               wraps=PBKDF2PasswordHasher().encode) as encode:
+            with self.assertNumQueries(1):
+                self.assertIsNone(authenticate(username='nobody', password='testpassword'))
+            with self.assertNumQueries(0):
+                self.assertIsNone(authenticate(username='nobody', password='testpassword'))
+
+        self.assertEqual(encode.call_count, 2)
+
+    def test_missing_cache_cleared_on_signup(self):
+        self.assertIsNone(authenticate(username='newuser', password='testpassword'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user(
+                first_name='New', last_name='User', username='newuser',
+                email='new@example.com', password='testpassword', is_active=True
+            )
+
+        self.assertIsNotNone(authenticate(username='newuser', password='testpassword'))
+
+    def test_token_with_email(self):
+        response = self.client.post(
+            '/token/', {'username': 'ANA.LOPEZ@example.com', 'password': 'testpassword'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.data)
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+
+        call_command('benchmark_login', '--iterations', '2', stdout=out)
+
+        self.assertIn('Missing user:', out.getvalue())
+        self.assertEqual(User.objects.count(), 1)
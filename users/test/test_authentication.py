@@ -0,0 +1,86 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from core.test.test_setup import RegularUserAPITest
+
+from ..checks import check_shared_cache
+from ..models import User, user_version_cache_key
+
+
+class CachedJWTAuthenticationTest(RegularUserAPITest):
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+
+    def test_user_resolved_from_cache(self):
+        url = reverse('users-detail', kwargs={'username': self.user.username})
+
+        self.client.get(url)
+        # Only the profile lookup of the view, the user comes from the cache.
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_deactivated_user_rejected_immediately(self):
+        url = reverse('users-detail', kwargs={'username': self.user.username})
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.get(pk=self.user.pk)
+            user.is_active = False
+            user.save()
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_staff_change_seen_immediately(self):
+        url = reverse('users-list')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.get(pk=self.user.pk)
+            user.is_staff = True
+            user.save()
+
+        self.assertNotEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_deleted_user_rejected(self):
+        url = reverse('users-detail', kwargs={'username': self.user.username})
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.get(pk=self.user.pk).delete()
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_version_bumped_on_commit(self):
+        key = user_version_cache_key(self.user.pk)
+        version = cache.get(key, 0)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            user = User.objects.get(pk=self.user.pk)
+            user.is_active = False
+            user.save()
+            # A request before the commit still reads the old row.
+            self.assertEqual(cache.get(key, 0), version)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(cache.get(key), version + 1)
+
+
+class SharedCacheCheckTest(SimpleTestCase):
+    @override_settings(DEBUG=False, CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_local_cache_fails_deploy_check(self):
+        self.assertEqual([error.id for error in check_shared_cache(None)], ['users.E001'])
+
+    @override_settings(DEBUG=False, CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                    'LOCATION': 'redis://redis:6379/1'}})
+    def test_shared_cache(self):
+        self.assertEqual(check_shared_cache(None), [])
@@ -0,0 +1,113 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ..models import User
+from ..utils import (
+    build_taken_logins_bloom_filter, generate_available_username_suggestions, is_login_taken,
+    _local_bloom_filters, TAKEN_LOGINS_BLOOM_CACHE_KEY
+)
+
+
+class CheckFieldAvailabilityAPITest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            first_name='Ana', last_name='Lopez', username='analopez',
+            email='ana@example.com', password='testpassword', is_active=True
+        )
+
+    def url(self, field_name, value):
+        return reverse('users-check-field-value-availability',
+                       kwargs={'field_name': field_name, 'value': value})
+
+    def test_username_taken_with_suggestions(self):
+        response = self.client.get(self.url('username', 'AnaLopez'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['available'])
+        self.assertEqual(len(response.data['suggestions']), 3)
+        for suggestion in response.data['suggestions']:
+            self.assertTrue(suggestion.startswith('analopez'))
+            self.assertFalse(User.objects.filter(username=suggestion).exists())
+
+    def test_email_taken(self):
+        response = self.client.get(self.url('email', 'ana@example.com'))
+
+        self.assertFalse(response.data['available'])
+        self.assertNotIn('suggestions', response.data)
+
+    def test_available_without_query(self):
+        build_taken_logins_bloom_filter()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url('username', 'someone-else'))
+
+        self.assertTrue(response.data['available'])
+
+    def test_user_created_after_build_is_taken(self):
+        build_taken_logins_bloom_filter()
+        User.objects.create_user(
+            first_name='New', last_name='User', username='newuser',
+            email='new@example.com', password='testpassword'
+        )
+
+        self.assertTrue(is_login_taken('username', 'newuser'))
+        self.assertTrue(is_login_taken('email', 'NEW@example.com'))
+
+    def test_fail_field_name(self):
+        response = self.client.get(self.url('first_name', 'ana'))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class UsernameSuggestionsTest(APITestCase):
+    def test_suggestions_one_query_per_round(self):
+        with self.assertNumQueries(1):
+            suggestions = generate_available_username_suggestions('ana', max_suggestions=3)
+
+        self.assertEqual(len(set(suggestions)), 3)
+
+    def test_suggestions_top_up_when_taken(self):
+        User.objects.bulk_create([
+            User(username=f'ana{i}', normalized_username=f'ana{i}',
+                 email=f'ana{i}@example.com', normalized_email=f'ana{i}@example.com')
+            for i in range(10, 1001)
+        ])
+
+        suggestions = generate_available_username_suggestions('ana', max_suggestions=3)
+
+        self.assertEqual(len(suggestions), 3)
+        self.assertFalse(User.objects.filter(username__in=suggestions).exists())
+
+
+class TakenLoginsBloomFilterTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        build_taken_logins_bloom_filter()
+
+    def filter_fetches(self, get):
+        return [call for call in get.call_args_list
+                if call.args[0] == TAKEN_LOGINS_BLOOM_CACHE_KEY]
+
+    def test_filter_kept_in_process_memory(self):
+        # Only its version and the recent key are read on each check.
+        with mock.patch.object(cache, 'get', wraps=cache.get) as get:
+            for _ in range(3):
+                self.assertFalse(is_login_taken('username', 'someone-else'))
+
+        self.assertEqual(self.filter_fetches(get), [])
+
+    def test_rebuilt_filter_fetched_once(self):
+        # Built by another process: not in the memory of this one yet.
+        build_taken_logins_bloom_filter()
+        _local_bloom_filters.clear()
+
+        with mock.patch.object(cache, 'get', wraps=cache.get) as get:
+            self.assertFalse(is_login_taken('username', 'someone-else'))
+            self.assertFalse(is_login_taken('email', 'someone@example.com'))
+
+        self.assertEqual(len(self.filter_fetches(get)), 1)
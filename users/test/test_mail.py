@@ -0,0 +1,181 @@
+import io
+import socketserver
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..models import User, QueuedEmail, ResetLink
+from ..tasks import purge_sent_emails, send_email, send_queued_emails_task
+from ..tokens import account_activation_token
+from ..utils import EMAIL_MAX_ATTEMPTS, EMAIL_RETENTION, queue_email, send_queued_emails
+
+
+class FlakyEmailBackend(EmailBackend):
+    def send_messages(self, messages):
+        if any('bad@example.com' in message.to for message in messages):
+            raise ConnectionError('Recipient refused.')
+        return super().send_messages(messages)
+
+
+class SMTPStandIn(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.server.connections += 1
+        self.wfile.write(b'220 localhost\r\n')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+
+            command = line.decode().strip().upper()
+            if command == 'DATA':
+                self.wfile.write(b'354 End data with <CR><LF>.<CR><LF>\r\n')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                self.server.messages += 1
+                self.wfile.write(b'250 OK\r\n')
+            elif command == 'QUIT':
+                self.wfile.write(b'221 Bye\r\n')
+                break
+            else:
+                self.wfile.write(b'250 OK\r\n')
+
+
+def queue_emails(amount, to_email='reader{}@example.com'):
+    for i in range(amount):
+        queue_email(to_email.format(i), 'Welcome', 'email_confirmation_message.html',
+                    {'user': f'reader{i}', 'domain': 'example.com', 'uid': 'MQ',
+                     'token': 'token', 'protocol': 'https'})
+
+
+class SendQueuedEmailsTest(TestCase):
+    def test_send_batches_locmem(self):
+        queue_emails(5)
+
+        result = send_queued_emails(batch_size=2)
+
+        self.assertEqual(result['sent'], 5)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertIn('example.com', mail.outbox[0].alternatives[0][0])
+        self.assertEqual(QueuedEmail.objects.filter(status='sent').count(), 5)
+        self.assertIn('messages_per_second', result)
+
+    @override_settings(EMAIL_BACKEND='users.test.test_mail.FlakyEmailBackend')
+    def test_failure_retried_individually(self):
+        queue_emails(2)
+        queue_email('bad@example.com', 'Welcome', 'email_confirmation_message.html', {})
+
+        result = send_queued_emails()
+
+        self.assertEqual((result['sent'], result['failed']), (2, 1))
+        bad = QueuedEmail.objects.get(to_email='bad@example.com')
+        self.assertEqual((bad.status, bad.attempts), ('pending', 1))
+        self.assertGreater(bad.next_attempt_at, timezone.now())
+
+        for _ in range(EMAIL_MAX_ATTEMPTS - 1):
+            QueuedEmail.objects.filter(pk=bad.pk).update(
+                next_attempt_at=timezone.now() - timedelta(seconds=1))
+            send_queued_emails()
+
+        bad.refresh_from_db()
+        self.assertEqual((bad.status, bad.attempts), ('failed', EMAIL_MAX_ATTEMPTS))
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_stale_sending_rows_sent_again(self):
+        queue_emails(1)
+        QueuedEmail.objects.update(
+            status='sending', next_attempt_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(send_queued_emails()['sent'], 1)
+
+    def create_user(self):
+        return User.objects.create_user(
+            first_name='Ana', last_name='Lopez', username='analopez',
+            email='ana@example.com', password='testpassword'
+        )
+
+    def test_send_email_task_queues_without_token(self):
+        user = self.create_user()
+
+        with mock.patch.object(send_queued_emails_task, 'apply_async') as apply_async:
+            result = send_email('example.com', True, user.username, user.email,
+                                'Confirm sign up.', 'email_confirmation_message.html')
+            send_email('example.com', True, user.username, user.email,
+                       'Confirm sign up.', 'email_confirmation_message.html')
+
+        self.assertIn('Email queued', result)
+        # One drain for both emails.
+        apply_async.assert_called_once()
+        for email in QueuedEmail.objects.all():
+            self.assertNotIn('token', email.context)
+            self.assertEqual(email.context['account'], user.username)
+
+        # The users of the batch are read with one query, not one per email.
+        with self.assertNumQueries(11):
+            self.assertEqual(send_queued_emails()['sent'], 2)
+
+        self.assertEqual(mail.outbox[0].to, ['ana@example.com'])
+        token = account_activation_token.make_token(user)
+        self.assertIn(token, mail.outbox[0].alternatives[0][0])
+
+    def test_reset_email_token_read_from_link(self):
+        user = self.create_user()
+        reset_link = ResetLink.objects.create(
+            user=user, token='reset-token', expiration_time=timezone.now() + timedelta(minutes=90))
+
+        with mock.patch.object(send_queued_emails_task, 'apply_async'):
+            send_email('example.com', True, user.username, user.email, 'Reset.',
+                       'email_confirmation_message.html', reset_link_id=reset_link.pk)
+
+        self.assertNotIn('reset-token', str(QueuedEmail.objects.get().context))
+        send_queued_emails()
+        self.assertIn('reset-token', mail.outbox[0].alternatives[0][0])
+
+    def test_purge_sent_and_failed(self):
+        queue_emails(3)
+        QueuedEmail.objects.filter(to_email='reader0@example.com').update(status='sent')
+        QueuedEmail.objects.filter(to_email='reader1@example.com').update(status='failed')
+        QueuedEmail.objects.update(created_at=timezone.now() - EMAIL_RETENTION - timedelta(days=1))
+
+        self.assertIn('2 sent or failed emails purged', purge_sent_emails())
+
+        self.assertEqual(QueuedEmail.objects.get().status, 'pending')
+
+    def test_command_reports_rate(self):
+        queue_emails(3)
+        out = io.StringIO()
+
+        call_command('send_queued_emails', stdout=out)
+
+        self.assertIn('3 sent', out.getvalue())
+        self.assertIn('messages/sec', out.getvalue())
+
+
+class SendQueuedEmailsSMTPTest(TestCase):
+    def setUp(self):
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPStandIn)
+        self.server.daemon_threads = True
+        self.server.connections = self.server.messages = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_one_connection_for_all_messages(self):
+        queue_emails(10)
+
+        with override_settings(
+                EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                EMAIL_HOST='127.0.0.1', EMAIL_PORT=self.server.server_address[1],
+                EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='', EMAIL_USE_TLS=False):
+            result = send_queued_emails(batch_size=4)
+
+        self.assertEqual(result['sent'], 10)
+        self.assertEqual(self.server.messages, 10)
+        self.assertEqual(self.server.connections, 1)
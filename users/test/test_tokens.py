@@ -0,0 +1,132 @@
+import io
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..models import User
+from ..tasks import purge_expired_jwt_tokens
+from ..utils import (
+    BloomFilter, build_blacklist_bloom_filter, is_token_blacklisted, purge_expired_tokens,
+    _local_bloom_filters, BLACKLIST_BLOOM_CACHE_KEY
+)
+
+
+def create_user(username='tokenuser'):
+    return User.objects.create_user(
+        first_name='Token', last_name='User', username=username,
+        email=f'{username}@example.com', password='testpassword', is_active=True
+    )
+
+
+class BloomFilterTest(TestCase):
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(capacity=500)
+        values = [f'jti-{i}' for i in range(500)]
+        for value in values:
+            bloom.add(value)
+
+        self.assertTrue(all(value in bloom for value in values))
+        false_positives = sum(f'other-{i}' in bloom for i in range(2000))
+        self.assertLess(false_positives, 100)
+
+
+class TokenBlacklistTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+
+    def blacklist_new_token(self):
+        token = RefreshToken.for_user(self.user)
+        token.blacklist()
+        return token['jti']
+
+    def test_negative_check_without_query(self):
+        build_blacklist_bloom_filter()
+        token = RefreshToken.for_user(self.user)
+
+        with self.assertNumQueries(0):
+            self.assertFalse(is_token_blacklisted(token['jti']))
+
+    def test_positive_confirmed_in_database(self):
+        jti = self.blacklist_new_token()
+        build_blacklist_bloom_filter()
+
+        with self.assertNumQueries(1):
+            self.assertTrue(is_token_blacklisted(jti))
+
+    def test_blacklisted_after_build_is_detected(self):
+        build_blacklist_bloom_filter()
+        jti = self.blacklist_new_token()
+
+        with self.assertNumQueries(0):
+            self.assertTrue(is_token_blacklisted(jti))
+
+    def test_filter_not_transferred_per_check(self):
+        build_blacklist_bloom_filter()
+        jti = RefreshToken.for_user(self.user)['jti']
+
+        with mock.patch.object(cache, 'get', wraps=cache.get) as get:
+            for _ in range(3):
+                self.assertFalse(is_token_blacklisted(jti))
+
+        self.assertNotIn(BLACKLIST_BLOOM_CACHE_KEY, [call.args[0] for call in get.call_args_list])
+
+    def test_filter_rebuilt_by_other_process(self):
+        build_blacklist_bloom_filter()
+        jti = self.blacklist_new_token()
+        cache.clear()
+        # Another process rebuilds it, with the token, and this one still
+        # holds the previous filter.
+        previous = dict(_local_bloom_filters)
+        build_blacklist_bloom_filter()
+        _local_bloom_filters.update(previous)
+
+        with self.assertNumQueries(1):
+            self.assertTrue(is_token_blacklisted(jti))
+
+    def test_database_fallback_without_filter(self):
+        jti = self.blacklist_new_token()
+        cache.clear()
+
+        self.assertTrue(is_token_blacklisted(jti))
+
+    def test_refresh_rotated_token_rejected(self):
+        build_blacklist_bloom_filter()
+        refresh = str(RefreshToken.for_user(self.user))
+
+        response = self.client.post('/token/refresh/', {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post('/token/refresh/', {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_purge_expired_tokens_in_chunks(self):
+        for _ in range(5):
+            self.blacklist_new_token()
+        live_jti = self.blacklist_new_token()
+        OutstandingToken.objects.exclude(jti=live_jti).update(
+            expires_at=timezone.now() - timedelta(days=1))
+
+        self.assertEqual(purge_expired_tokens(chunk_size=2), 5)
+
+        self.assertEqual(OutstandingToken.objects.get().jti, live_jti)
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+    def test_purge_task_and_stats(self):
+        self.blacklist_new_token()
+        OutstandingToken.objects.update(expires_at=timezone.now() - timedelta(days=1))
+
+        self.assertIn('1 expired tokens purged', purge_expired_jwt_tokens())
+
+        out = io.StringIO()
+        call_command('token_stats', stdout=out)
+        self.assertIn('Outstanding tokens: 0 (0 expired).', out.getvalue())
+        self.assertIn('Bloom filter: 0 tokens', out.getvalue())
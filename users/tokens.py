@@ -1,6 +1,12 @@
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 import six
 
+from .utils import is_token_blacklisted
+
 
 class AccountActivationTokenGenerator(PasswordResetTokenGenerator):
     def _make_hash_value(self, user, timestamp):
@@ -11,3 +17,14 @@ class AccountActivationTokenGenerator(PasswordResetTokenGenerator):
 
 
 account_activation_token = AccountActivationTokenGenerator()
+
+
+class CachedBlacklistRefreshToken(RefreshToken):
+    """
+    Refresh token whose blacklist check goes through the Bloom filter of
+    `users.utils.is_token_blacklisted`.
+    """
+
+    def check_blacklist(self):
+        if is_token_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
@@ -1,14 +1,440 @@
+import hashlib
+import math
 import random
+import time
+import uuid
+from datetime import timedelta
+from functools import lru_cache
 
-from .models import User
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection, transaction
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
 
+from .models import User, QueuedEmail, ResetLink, normalize_login
 
-def generate_available_username_suggestions(base_user_handle, max_suggestions=3):
-    existing_user_handles = User.objects.all().values('user_handle')
 
+BLACKLIST_BLOOM_CACHE_KEY = 'auth:blacklist-bloom'
+TAKEN_LOGINS_BLOOM_CACHE_KEY = 'users:taken-logins-bloom'
+# A filter older than this is ignored (the check goes to the database), the
+# beat schedule rebuilds them every 10 minutes.
+BLOOM_MAX_AGE = 30 * 60
+
+
+class BloomFilter:
+    """
+    Set membership without false negatives and with `error_rate` false
+    positives, in about 1.2 bytes per item at 1%.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, value):
+        digest = hashlib.sha256(value.encode()).digest()
+        first = int.from_bytes(digest[:8], 'big')
+        second = int.from_bytes(digest[8:16], 'big') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self.positions(value):
+            self.bits[position // 8] |= 1 << (position % 8)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position // 8] & (1 << (position % 8))
+                   for position in self.positions(value))
+
+
+def bloom_version_cache_key(cache_key):
+    return f'{cache_key}:version'
+
+
+# Filters already transferred and unpickled, by cache key: {'version', 'entry'}.
+_local_bloom_filters = {}
+
+
+def store_bloom_filter(cache_key, values, capacity):
+    """
+    Build a Bloom filter with `values` and store it, without timeout, with the
+    time the build started: what is written after that is not in the filter.
+    A new version is stored next to it, so the processes fetch it again.
+    """
+    built_at = timezone.now()
+    bloom = BloomFilter(capacity=max(1000, int(capacity * 1.2)))
+    for value in values:
+        bloom.add(value)
+
+    version = uuid.uuid4().hex
+    entry = {'filter': bloom, 'built_at': built_at, 'version': version}
+    cache.set_many({cache_key: entry, bloom_version_cache_key(cache_key): version}, None)
+    _local_bloom_filters[cache_key] = {'version': version, 'entry': entry}
+    return bloom
+
+
+def get_fresh_bloom_filter(cache_key, recent_key):
+    """
+    The filter of `cache_key` (None when missing or too old) and whether
+    `recent_key` is set, with one round trip of small keys: the filter is
+    kept in process memory and only transferred again after a rebuild,
+    checking on each call just its version.
+    """
+    version_key = bloom_version_cache_key(cache_key)
+    values = cache.get_many([version_key, recent_key])
+    version = values.get(version_key)
+
+    local = _local_bloom_filters.get(cache_key)
+    if version is None:
+        entry = None
+    elif local is not None and local['version'] == version:
+        entry = local['entry']
+    else:
+        entry = cache.get(cache_key)
+        if entry is not None:
+            _local_bloom_filters[cache_key] = {'version': entry['version'], 'entry': entry}
+
+    recently = bool(values.get(recent_key, False))
+    if entry is None or timezone.now() - entry['built_at'] >= timedelta(seconds=BLOOM_MAX_AGE):
+        return None, recently
+    return entry['filter'], recently
+
+
+def recent_blacklist_cache_key(jti):
+    return f'auth:blacklisted:{jti}'
+
+
+def remember_blacklisted_token(jti):
+    """
+    Cover the tokens blacklisted after the last build of the Bloom filter,
+    until a newer filter includes them.
+    """
+    cache.set(recent_blacklist_cache_key(jti), True, BLOOM_MAX_AGE + 60)
+
+
+def build_blacklist_bloom_filter(chunk_size=5000):
+    jtis = BlacklistedToken.objects.filter(
+        token__expires_at__gt=timezone.now()
+    ).order_by('pk').values_list('token__jti', flat=True)
+
+    return store_bloom_filter(
+        BLACKLIST_BLOOM_CACHE_KEY, jtis.iterator(chunk_size=chunk_size), jtis.count())
+
+
+def is_token_blacklisted(jti):
+    """
+    Check the Bloom filter first: a negative is final (together with the
+    recently blacklisted tokens), a positive is confirmed in the database.
+    Without a fresh filter the check goes straight to the database.
+    """
+    bloom, recently = get_fresh_bloom_filter(
+        BLACKLIST_BLOOM_CACHE_KEY, recent_blacklist_cache_key(jti))
+    if bloom is not None and jti not in bloom:
+        return recently
+
+    return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+def purge_expired_tokens(chunk_size=1000, max_chunks=None):
+    """
+    Delete the expired outstanding tokens, with their blacklist rows, in
+    chunks so that no statement locks the tables for long. Stops after
+    `max_chunks` chunks, if given; returns the amount purged.
+    """
+    now = timezone.now()
+    purged = chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        ids = list(OutstandingToken.objects.filter(
+            expires_at__lte=now).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            break
+
+        BlacklistedToken.objects.filter(token_id__in=ids).delete()
+        OutstandingToken.objects.filter(pk__in=ids).delete()
+        purged += len(ids)
+        chunks += 1
+
+    return purged
+
+
+def token_tables_stats():
+    now = timezone.now()
+    stats = {
+        'outstanding': OutstandingToken.objects.count(),
+        'outstanding_expired': OutstandingToken.objects.filter(expires_at__lte=now).count(),
+        'blacklisted': BlacklistedToken.objects.count(),
+        'bloom_items': None,
+        'bloom_bytes': None,
+        'bloom_built_at': None,
+        'tables_bytes': {},
+    }
+
+    entry = cache.get(BLACKLIST_BLOOM_CACHE_KEY)
+    if entry is not None:
+        stats['bloom_items'] = entry['filter'].count
+        stats['bloom_bytes'] = len(entry['filter'].bits)
+        stats['bloom_built_at'] = entry['built_at']
+
+    if connection.vendor == 'mysql':
+        tables = [OutstandingToken._meta.db_table, BlacklistedToken._meta.db_table]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT table_name, data_length + index_length FROM information_schema.tables '
+                'WHERE table_schema = DATABASE() AND table_name IN (%s, %s)', tables)
+            stats['tables_bytes'] = dict(cursor.fetchall())
+
+    return stats
+
+
+def recent_login_cache_key(field_name, value):
+    return f'users:taken:{field_name}:{value}'
+
+
+def remember_taken_login(user):
+    """
+    Cover the usernames and emails saved after the last build of the Bloom
+    filter, until a newer filter includes them.
+    """
+    cache.set_many({
+        recent_login_cache_key('username', user.normalized_username): True,
+        recent_login_cache_key('email', user.normalized_email): True,
+    }, BLOOM_MAX_AGE + 60)
+
+
+def build_taken_logins_bloom_filter(chunk_size=5000):
+    users = User.objects.order_by('pk').values_list('normalized_username', 'normalized_email')
+
+    def values():
+        for username, email in users.iterator(chunk_size=chunk_size):
+            yield f'username:{username}'
+            yield f'email:{email}'
+
+    return store_bloom_filter(TAKEN_LOGINS_BLOOM_CACHE_KEY, values(), users.count() * 2)
+
+
+def is_login_taken(field_name, value):
+    """
+    Whether a user has `value` as username or email (`field_name`). Values
+    out of the Bloom filter answer without a query, the signup form checks
+    on every keystroke.
+    """
+    value = normalize_login(value)
+    bloom, recently = get_fresh_bloom_filter(
+        TAKEN_LOGINS_BLOOM_CACHE_KEY, recent_login_cache_key(field_name, value))
+    if bloom is not None and f'{field_name}:{value}' not in bloom:
+        return recently
+
+    return User.objects.filter(**{f'normalized_{field_name}': value}).exists()
+
+
+def generate_available_username_suggestions(base_username, max_suggestions=3, batch_size=10, max_rounds=5):
+    """
+    Suggest free usernames made of `base_username` and a random number. Each
+    round checks a batch of candidates with one query, until enough are free.
+    """
+    base_username = normalize_login(base_username)
     suggestions = []
-    for i in range(1, max_suggestions + 1):
-        suggestion = f"{base_user_handle}{random.randint(10, 1000)}"
-        if suggestion not in existing_user_handles:
-            suggestions.append(suggestion)
+    tried = set()
+    upper = 1000
+
+    for _ in range(max_rounds):
+        candidates = []
+        while len(candidates) < batch_size and len(tried) < upper - 9:
+            candidate = f'{base_username}{random.randint(10, upper)}'
+            if candidate not in tried:
+                tried.add(candidate)
+                candidates.append(candidate)
+
+        taken = set(User.objects.filter(
+            normalized_username__in=candidates).values_list('normalized_username', flat=True))
+        suggestions += [candidate for candidate in candidates
+                        if candidate not in taken][:max_suggestions - len(suggestions)]
+
+        if len(suggestions) >= max_suggestions:
+            break
+        # Widen the range when most of the candidates are taken.
+        upper *= 10
+
     return suggestions
+
+
+EMAIL_BATCH_SIZE = 100
+EMAIL_MAX_ATTEMPTS = 5
+# Rows left in `sending` by a worker that died are sent again after this.
+EMAIL_SENDING_TIMEOUT = timedelta(minutes=10)
+# Sent and failed rows are kept this long, for the admin, then purged.
+EMAIL_RETENTION = timedelta(days=7)
+
+
+@lru_cache(maxsize=32)
+def compiled_template(name):
+    return get_template(name)
+
+
+def queue_email(to_email, subject, template, context):
+    return QueuedEmail.objects.create(
+        to_email=to_email, subject=subject, template=template, context=context)
+
+
+def account_email_context(username, domain, secure, reset_link_id=None):
+    """
+    Context of an email with a link to the account of `username`. It holds
+    only ids: the token is minted when the email is sent (see `email_context`),
+    so no usable token is stored with the queued row.
+    """
+    context = {'account': username, 'domain': domain, 'protocol': 'https' if secure else 'http'}
+    if reset_link_id:
+        context['reset_link_id'] = reset_link_id
+    return context
+
+
+def fetch_email_accounts(emails):
+    """Users and reset links of the account emails of a batch, one query each."""
+    usernames = {email.context['account'] for email in emails if 'account' in email.context}
+    reset_link_ids = {email.context['reset_link_id'] for email in emails
+                      if 'reset_link_id' in email.context}
+
+    users = User.objects.in_bulk(usernames, field_name='username') if usernames else {}
+    reset_links = ResetLink.objects.in_bulk(reset_link_ids) if reset_link_ids else {}
+    return users, reset_links
+
+
+def email_context(email, users, reset_links):
+    if 'account' not in email.context:
+        return email.context
+
+    from .tokens import account_activation_token
+
+    user = users.get(email.context['account'])
+    if user is None:
+        raise RuntimeError('The account no longer exists.')
+
+    if 'reset_link_id' in email.context:
+        reset_link = reset_links.get(email.context['reset_link_id'])
+        if reset_link is None:
+            raise RuntimeError('The reset link no longer exists.')
+        token = reset_link.token
+    else:
+        token = account_activation_token.make_token(user)
+
+    return {
+        'user': user.username,
+        'domain': email.context['domain'],
+        'uid': urlsafe_base64_encode(force_bytes(user.pk)),
+        'token': token,
+        'protocol': email.context['protocol'],
+    }
+
+
+def build_email_message(email, connection=None, context=None):
+    content = compiled_template(email.template).render(
+        email.context if context is None else context)
+
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        from_email=settings.EMAIL_HOST_USER,
+        to=[email.to_email],
+        connection=connection,
+    )
+    message.attach_alternative(content, 'text/html')
+    return message
+
+
+def claim_queued_emails(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(QueuedEmail.objects.select_for_update(skip_locked=True).filter(
+            status='pending', next_attempt_at__lte=now
+        ).order_by('pk')[:batch_size])
+
+        QueuedEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+            status='sending', next_attempt_at=now + EMAIL_SENDING_TIMEOUT)
+
+    return emails
+
+
+def send_queued_emails(batch_size=EMAIL_BATCH_SIZE, max_batches=None):
+    """
+    Drain the pending emails in batches through one SMTP connection.
+
+    Each message goes alone to `send_messages`: the SMTP backend stops at the
+    first failure without telling which messages were delivered, so a batch
+    call could not retry only the failed ones. A failed message is retried
+    with exponential backoff, up to EMAIL_MAX_ATTEMPTS times.
+    """
+    start = time.perf_counter()
+    sent = failed = batches = 0
+
+    QueuedEmail.objects.filter(
+        status='sending', next_attempt_at__lte=timezone.now()).update(status='pending')
+
+    connection = get_connection()
+    try:
+        connection.open()
+        while max_batches is None or batches < max_batches:
+            emails = claim_queued_emails(batch_size)
+            if not emails:
+                break
+            batches += 1
+            users, reset_links = fetch_email_accounts(emails)
+
+            for email in emails:
+                try:
+                    context = email_context(email, users, reset_links)
+                    if not connection.send_messages([build_email_message(email, connection, context)]):
+                        raise RuntimeError('The message was not sent.')
+                except Exception as e:
+                    failed += 1
+                    email.attempts += 1
+                    email.last_error = str(e)
+                    email.status = 'failed' if email.attempts >= EMAIL_MAX_ATTEMPTS else 'pending'
+                    email.next_attempt_at = timezone.now() + timedelta(minutes=2 ** email.attempts)
+                    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+                    # The connection may be broken after an error.
+                    connection.close()
+                    connection.open()
+                else:
+                    sent += 1
+                    email.status = 'sent'
+                    email.sent_at = timezone.now()
+                    email.save(update_fields=['status', 'sent_at'])
+    finally:
+        connection.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        'sent': sent,
+        'failed': failed,
+        'elapsed': round(elapsed, 3),
+        'messages_per_second': round(sent / elapsed, 2) if elapsed else 0,
+    }
+
+
+def purge_queued_emails(chunk_size=1000, max_chunks=None):
+    """
+    Delete the sent and failed emails older than EMAIL_RETENTION, in chunks.
+    Returns the amount purged.
+    """
+    until = timezone.now() - EMAIL_RETENTION
+    purged = chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        ids = list(QueuedEmail.objects.filter(
+            status__in=['sent', 'failed'], created_at__lte=until
+        ).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            break
+
+        QueuedEmail.objects.filter(pk__in=ids).delete()
+        purged += len(ids)
+        chunks += 1
+
+    return purged
@@ -19,7 +19,7 @@ from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 
 from drf_spectacular.utils import OpenApiParameter, extend_schema
 
-from core.utils import GenericPagination
+from core.utils import GenericPagination, outbox_task
 from core.serializers import DummySerializer
 from .serializers import (
     CreateUserSerializer, ListProfileUserSerializer,
@@ -30,8 +30,7 @@ from .serializers import (
 
 from .models import User, ResetLink
 from .tokens import account_activation_token
-from .utils import generate_available_username_suggestions
-from .tasks import send_email
+from .utils import generate_available_username_suggestions, is_login_taken
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -155,39 +154,36 @@ class UserViewSet(viewsets.ModelViewSet):
 
         - ### Optionals:\n
             - `profile_img` (file): Profile image for the user.\n
-            - `birth_date` (str): User's date of birth.\n\n
+            - `birth_date` (str): User's date of birth.\n
+            - `notification_digest` (bool): Receive a daily email with the unread notifications.\n\n
 
         ### Response (Success):\n
         - 201 Created: User created successfully. An activation email will be sent to the user's email address.\n\n
 
         ### Response (Failure):\n
         - 400 Bad Request: Invalid input data. Check the response for details.\n
-        - 409 Conflict: Unable to send the activation email.
+        - 409 Conflict: Unable to queue the activation email, the user is not created.
         """
         user_serializer = self.serializer_class(data=request.data)
         if user_serializer.is_valid():
-            user = user_serializer.save()
-
             try:
+                with transaction.atomic():
+                    user = user_serializer.save()
 
-                transaction.on_commit(
-                    lambda: send_email.apply_async(
-                        args=[
-                            get_current_site(request).domain,
-                            request.is_secure(),
-                            user.username,
-                            user.email,
-                            "Welcome to Library Management System - Confirm sing up.",
-                            'email_confirmation_message.html'
-                        ],
-                        countdown=10
+                    outbox_task(
+                        'users.tasks.send_email',
+                        request_domain=get_current_site(request).domain,
+                        request_secure=request.is_secure(),
+                        username=user.username,
+                        to_email=user.email,
+                        mail_subject="Welcome to Library Management System - Confirm sing up.",
+                        template='email_confirmation_message.html'
                     )
-                )
 
                 return Response({'message': f'User created successfully. Check the inbox of {user.email} to activate your account.'}, status=status.HTTP_201_CREATED)
             except:
                 return Response(
-                    {'message': f'Impossible to send the email to {user.email}.'},
+                    {'message': f"Impossible to send the email to {user_serializer.validated_data['email']}."},
                     status=status.HTTP_409_CONFLICT
                 )
         else:
@@ -211,7 +207,8 @@ class UserViewSet(viewsets.ModelViewSet):
             - `first_name` (str): User's first name.\n
             - `last_name` (str): User's last name.\n
             - `profile_img` (file): Profile image for the user.\n
-            - `birth_date` (str): User's date of birth.\n\n
+            - `birth_date` (str): User's date of birth.\n
+            - `notification_digest` (bool): Receive a daily email with the unread notifications.\n\n
 
         ### Response (Success):\n
         - `200 OK`:
@@ -269,7 +266,8 @@ class UserViewSet(viewsets.ModelViewSet):
             - `email_substitute` (str): Substitute email address for communication.\n
             - `website` (str): User's website URL.\n
             - `location` (str): User's location.\n
-            - `birth_date` (str): User's date of birth.\n\n
+            - `birth_date` (str): User's date of birth.\n
+            - `notification_digest` (bool): Receive a daily email with the unread notifications.\n\n
 
         ### Response (Success):\n
         - `200 OK`:
@@ -401,9 +399,7 @@ class UserViewSet(viewsets.ModelViewSet):
         field_name = field_name.lower()
         if field_name in ['username', 'email']:
             value = value.lower()
-            data = {field_name: value}
-            try:
-                User.objects.get(**data)
+            if is_login_taken(field_name, value):
                 if field_name == 'email':
                     return Response(
                         {
@@ -420,7 +416,7 @@ class UserViewSet(viewsets.ModelViewSet):
                     },
                     status=status.HTTP_200_OK
                 )
-            except User.DoesNotExist:
+            else:
                 return Response({'available': True}, status=status.HTTP_200_OK)
         else:
             return Response({'field_name': 'Must be email or username.'}, status=status.HTTP_400_BAD_REQUEST)
@@ -534,18 +530,21 @@ class PasswordRecoveryViewSet(viewsets.ViewSet):
                 token = account_activation_token.make_token(user)
                 expiration_time = timezone.now() + timedelta(minutes=90)
 
-                ResetLink.objects.create(
-                    user=user, token=token, expiration_time=expiration_time)
-
-                send_email.delay(
-                    request_domain=get_current_site(request).domain,
-                    request_secure=request.is_secure(),
-                    username=user.username,
-                    to_email=email,
-                    mail_subject="Welcome to Library Management System - Confirm sing up.",
-                    template='email_confirmation_message.html',
-                    token=token
-                )
+                with transaction.atomic():
+                    reset_link = ResetLink.objects.create(
+                        user=user, token=token, expiration_time=expiration_time)
+
+                    outbox_task(
+                        'users.tasks.send_email',
+                        request_domain=get_current_site(request).domain,
+                        request_secure=request.is_secure(),
+                        username=user.username,
+                        to_email=email,
+                        mail_subject="Welcome to Library Management System - Confirm sing up.",
+                        template='email_confirmation_message.html',
+                        # The token is read from the link when sending.
+                        reset_link_id=reset_link.pk
+                    )
 
             return Response(
                 {'detail': f'Password reset link sent to {email}, if the email is linked to an account.'},